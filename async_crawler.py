@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Moteur de crawl asyncio pour CasalSport
+Remplace la boucle BFS bloquante (session.get + time.sleep) de find_product_links par
+plusieurs requêtes simultanées, limitées par un budget de politesse par hôte
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HostPoliteness:
+    """
+    Budget de politesse par hôte: débit maximal (requêtes/s) et nombre maximal de requêtes simultanées
+    Remplace le time.sleep global: les départs de requêtes vers un même hôte sont espacés de 1/rate
+    """
+
+    def __init__(self, rate: float, max_concurrent: int):
+        self.rate = rate
+        self.max_concurrent = max(1, max_concurrent)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    async def acquire(self, host: str) -> None:
+        """Attend un créneau libre pour l'hôte (concurrence puis espacement)"""
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.max_concurrent))
+        await semaphore.acquire()
+
+        if self.rate > 0:
+            # Réserve le prochain créneau de manière synchrone (boucle mono-thread, pas de verrou)
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1.0 / self.rate
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+    def release(self, host: str) -> None:
+        """Libère la place de concurrence prise par acquire()"""
+        self._semaphores[host].release()
+
+
+class ThroughputMeter:
+    """Mesure le débit soutenu en pages/s, global et sur une fenêtre glissante"""
+
+    def __init__(self, window: float = 30.0):
+        self.window = window
+        self.started_at = time.monotonic()
+        self.total = 0
+        self._recent = deque()
+
+    def record(self) -> None:
+        now = time.monotonic()
+        self.total += 1
+        self._recent.append(now)
+        while self._recent and now - self._recent[0] > self.window:
+            self._recent.popleft()
+
+    def overall_rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+    def window_rate(self) -> float:
+        if len(self._recent) < 2:
+            return 0.0
+        span = self._recent[-1] - self._recent[0]
+        return (len(self._recent) - 1) / span if span > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.total} pages en {time.monotonic() - self.started_at:.1f}s - "
+                f"{self.overall_rate():.2f} pages/s (moyenne), {self.window_rate():.2f} pages/s "
+                f"(sur {self.window:.0f}s)")
+
+
+class AsyncCrawlEngine:
+    """
+    Crawl concurrent qui conserve le comportement de find_product_links:
+    max_depth, should_ignore_url, classification pageGroup=Single et extraction immédiate
+
+    Les téléchargements et le parsing complet tournent dans un pool de threads; la classification,
+    l'extraction et la mise à jour de l'état du scraper restent sur la boucle d'événements
+    """
+
+    def __init__(self, scraper, concurrency: int = 8, per_host_rate: float = 0.0,
+                 per_host_concurrency: Optional[int] = None, report_every: float = 10.0):
+        self.scraper = scraper
+        self.concurrency = max(1, concurrency)
+        self.politeness = HostPoliteness(per_host_rate, per_host_concurrency or self.concurrency)
+        self.meter = ThroughputMeter()
+        self.report_every = report_every
+        self.pages_crawled = 0
+        self._last_report = time.monotonic()
+        self._sequence = count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._frontier: Dict[int, Tuple[str, int]] = {}  # En file ou en cours de traitement, par ordre d'arrivée
+        self._best_depth: Dict[str, int] = {}  # Profondeur minimale à laquelle chaque URL a été mise en file
+        self._start_url = ''
+        self._checkpoint_due = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Le pool de connexions doit suivre le nombre de requêtes en vol (sauf transport de rejeu déjà monté)
+        self.scraper.transport.ensure_pool_size(self.concurrency)
+
+    def run(self, start_url: str, max_depth: int = 3) -> None:
+        """Point d'entrée synchrone"""
+        asyncio.run(self.crawl(start_url, max_depth))
+
+    def enqueue(self, url: str, depth: int) -> None:
+        # Déduplication à l'insertion: une URL n'est remise en file que pour une profondeur plus faible
+        if self._best_depth.get(url, depth + 1) <= depth:
+            return
+        self._best_depth[url] = depth
+        # File à priorité sur la profondeur: l'ordre reste proche du BFS malgré la concurrence
+        sequence = next(self._sequence)
+        self._frontier[sequence] = (url, depth)
+        self._queue.put_nowait((depth, sequence, url))
+
+    def checkpoint(self, completed: bool = False) -> None:
+        """Checkpoint de la frontière courante (URLs en file et en vol)"""
+        pending = [self._frontier[key] for key in sorted(self._frontier)]
+        self.scraper.checkpoint_crawl(self._start_url, pending, self.pages_crawled, completed=completed)
+
+    async def crawl(self, start_url: str, max_depth: int = 3) -> None:
+        self._queue = asyncio.PriorityQueue()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl')
+        self.meter = ThroughputMeter()
+        self._frontier = {}
+        self._best_depth = {}
+        self._start_url = start_url
+        frontier, self.pages_crawled = self.scraper.start_crawl_frontier(start_url)
+        for url, depth in frontier:
+            self.enqueue(url, depth)
+
+        logger.info(f"🚀 Crawl asyncio: {self.concurrency} requêtes simultanées, "
+                    f"{self.politeness.rate or 'illimité'} req/s max par hôte")
+
+        workers = [asyncio.create_task(self._worker(max_depth)) for _ in range(self.concurrency)]
+        completed = False
+        try:
+            await self._queue.join()
+            completed = True
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._executor.shutdown(wait=False)
+            self.checkpoint(completed=completed)
+
+        logger.info(f"📈 Crawl terminé: {self.meter.summary()}")
+
+    async def _worker(self, max_depth: int) -> None:
+        while True:
+            depth, sequence, url = await self._queue.get()
+            try:
+                await self._process(url, depth, max_depth)
+                self._frontier.pop(sequence, None)
+                if self._checkpoint_due:
+                    self._checkpoint_due = False
+                    self.checkpoint()
+            except asyncio.CancelledError:
+                # Interruption: l'URL reste dans la frontière pour la reprise
+                raise
+            except Exception as e:
+                self._frontier.pop(sequence, None)
+                logger.error(f"Erreur lors du crawl de {url}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, current_url: str, depth: int, max_depth: int) -> None:
+        scraper = self.scraper
+
+        if current_url in scraper.visited_urls or depth > max_depth:
+            return
+
+        scraper.visited_urls.add(current_url)
+
+        # IGNORE les URLs de catégories (pas de crawl)
+        if scraper.should_ignore_url(current_url):
+            logger.info(f"🚫 URL ignorée: {current_url}")
+            return
+
+        # Produit déjà connu ou non-produit évident en bout de crawl: aucune requête
+        if scraper.can_skip_fetch(current_url, needs_links=depth < max_depth):
+            return
+
+        host = urlparse(current_url).netloc
+        with metrics.stage('politeness_wait'):
+            await self.politeness.acquire(host)
+        try:
+            loop = asyncio.get_running_loop()
+            page = await loop.run_in_executor(self._executor, scraper.get_page_document, current_url)
+        finally:
+            self.politeness.release(host)
+
+        self.meter.record()
+        self._maybe_report()
+        if page is None:
+            return
+
+        if scraper.confirm_product_page(current_url, page):
+            # L'arbre complet n'est construit que pour les pages produits, hors boucle d'événements
+            await loop.run_in_executor(self._executor, lambda: page.soup)
+            scraper.handle_product_page(current_url, page)
+            return
+
+        for clean_url in scraper.extract_page_links(current_url, page):
+            self.enqueue(clean_url, depth + 1)
+
+        self.pages_crawled += 1
+        logger.info(f"Page crawlée: {current_url} (depth: {depth})")
+        logger.info(f"Produits confirmés: {len(scraper.product_urls)}")
+        logger.info(f"Produits extraits: {len(scraper.products_data)}")
+        logger.info(f"Pages restantes à vérifier: {self._queue.qsize()}")
+
+        scraper.auto_save(self.pages_crawled)
+        if self.pages_crawled % scraper.checkpoint_every == 0:
+            self._checkpoint_due = True
+
+    def _maybe_report(self) -> None:
+        now = time.monotonic()
+        if now - self._last_report >= self.report_every:
+            self._last_report = now
+            logger.info(f"📈 Débit: {self.meter.summary()}")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai hors ligne des extractions CasalSport, sur un corpus enregistré (page_corpus.py)
+- bench: pages/s, temps par champ (médiane et total) et allocations (pic mémoire, blocs conservés)
+  pour CasalSportProductScraper (pages produits, champ par champ puis en une passe avec
+  extract_fields) et CasalSportCategoryScraper (autres pages)
+- snapshot: enregistre les valeurs extraites de chaque page comme référence
+- check: compare les extractions actuelles à la référence (régressions des extract_* et de
+  extract_fields), et vérifie que extract_fields donne les mêmes valeurs que les extract_*
+
+Usage: python bench_extraction.py bench|snapshot|check [--corpus corpus.jsonl.gz] [--limit N] [--json FICHIER]
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from html_parsing import PageDocument, default_backend, make_soup
+from page_corpus import DEFAULT_CORPUS, PageCorpus
+
+EXPECTED_FILE = "corpus_expected.json"
+
+
+def product_fields(extractor) -> Dict[str, Callable]:
+    return {
+        'breadcrumb': extractor.extract_breadcrumb_info,
+        'nom_produit': extractor.extract_product_name,
+        'prix': extractor.extract_price,
+        'imageurl': extractor.extract_image_url,
+        'shortdesc': extractor.extract_short_description,
+        'largedesc': extractor.extract_large_description,
+    }
+
+
+def single_pass_fields(extractor) -> Dict[str, Callable]:
+    """Tous les champs produit en un seul parcours (PRODUCT_SPEC), à comparer à la somme des extract_*"""
+    return {'extract_fields': lambda soup: extractor.extract_fields('', soup)}
+
+
+def category_fields(scraper) -> Dict[str, Callable]:
+    return {
+        'hero_image': scraper.extract_hero_image,
+        'seo_text': scraper.extract_seo_text,
+    }
+
+
+def load_pages(corpus_path: str, limit: int = 0) -> Tuple[List[Dict], List[Dict]]:
+    """(pages produits, autres pages) du corpus, dans un ordre stable"""
+    products, others = [], []
+    entries = sorted(PageCorpus(corpus_path).iter_html(), key=lambda entry: entry['url'])
+    for entry in entries[:limit or None]:
+        page = PageDocument(entry['url'], entry['text'])
+        (products if page.meta_content('pageGroup') == 'Single' else others).append(entry)
+    return products, others
+
+
+def make_extractors(base_url: str) -> Tuple[Dict[str, Callable], Dict[str, Callable], Dict[str, Callable]]:
+    from scar import ProductPageExtractor
+    from scrape_category_content import CasalSportCategoryScraper
+
+    extractor = ProductPageExtractor(base_url)
+    return (product_fields(extractor), single_pass_fields(extractor),
+            category_fields(CasalSportCategoryScraper(delay=0)))
+
+
+# ------------------------------------------------------------------ mesures
+
+def _measure_times(pages: List[Dict], fields: Dict[str, Callable], repeat: int) -> Dict[str, List[float]]:
+    timings = {'parse': [], **{name: [] for name in fields}}
+    for entry in pages:
+        best = {name: float('inf') for name in timings}
+        for _ in range(repeat):
+            started = time.perf_counter()
+            soup = make_soup(entry['text'])
+            best['parse'] = min(best['parse'], time.perf_counter() - started)
+            for name, extract in fields.items():
+                started = time.perf_counter()
+                extract(soup)
+                best[name] = min(best[name], time.perf_counter() - started)
+        for name, value in best.items():
+            timings[name].append(value)
+    return timings
+
+
+def _measure_allocations(pages: List[Dict], fields: Dict[str, Callable]) -> Dict[str, Dict[str, float]]:
+    """Pic mémoire et blocs encore alloués après l'appel (moyennes par page), via tracemalloc"""
+    totals = {name: {'peak_kib': 0.0, 'blocks': 0} for name in ['parse', *fields]}
+    tracemalloc.start()
+    try:
+        for entry in pages:
+            def traced(name: str, call: Callable):
+                before = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+                result = call()
+                _, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                totals[name]['peak_kib'] += (peak - base) / 1024
+                totals[name]['blocks'] += sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+                return result
+
+            soup = traced('parse', lambda: make_soup(entry['text']))
+            for name, extract in fields.items():
+                traced(name, lambda: extract(soup))
+    finally:
+        tracemalloc.stop()
+    count = max(1, len(pages))
+    return {name: {'peak_kib': values['peak_kib'] / count, 'blocks': values['blocks'] / count}
+            for name, values in totals.items()}
+
+
+def benchmark(pages: List[Dict], fields: Dict[str, Callable], repeat: int, allocations: bool) -> Dict:
+    if not pages:
+        return {'pages': 0}
+    timings = _measure_times(pages, fields, repeat)
+    per_page = [sum(values) for values in zip(*timings.values())]
+    result = {
+        'pages': len(pages),
+        'pages_per_sec': len(pages) / sum(per_page),
+        'fields': {name: {'median_ms': statistics.median(values) * 1000, 'total_ms': sum(values) * 1000}
+                   for name, values in timings.items()},
+    }
+    if allocations:
+        for name, values in _measure_allocations(pages, fields).items():
+            result['fields'][name].update(values)
+    return result
+
+
+def print_report(title: str, result: Dict) -> None:
+    if not result['pages']:
+        print(f"\n{title}: aucune page dans le corpus")
+        return
+    print(f"\n{title}: {result['pages']} pages, {result['pages_per_sec']:.1f} pages/s (parsing + extraction)")
+    print(f"   {'champ':<14} {'médiane ms':>11} {'total ms':>10} {'pic Kio':>9} {'blocs':>8}")
+    for name, values in result['fields'].items():
+        print(f"   {name:<14} {values['median_ms']:>11.3f} {values['total_ms']:>10.1f} "
+              f"{values.get('peak_kib', 0):>9.1f} {values.get('blocks', 0):>8.0f}")
+
+
+# ------------------------------------------------------------------ régressions
+
+def extract_all(pages: List[Dict], fields: Dict[str, Callable]) -> Dict[str, Dict]:
+    results = {}
+    for entry in pages:
+        soup = make_soup(entry['text'])
+        results[entry['url']] = {name: extract(soup) for name, extract in fields.items()}
+    # Tuples (breadcrumb) -> listes, comme après un aller-retour JSON
+    return json.loads(json.dumps(results, ensure_ascii=False))
+
+
+def check(expected: Dict[str, Dict], actual: Dict[str, Dict]) -> List[str]:
+    differences = []
+    for url, values in expected.items():
+        if url not in actual:
+            differences.append(f"{url}: page absente du corpus")
+            continue
+        for name, value in values.items():
+            if actual[url].get(name) != value:
+                differences.append(f"{url} [{name}]: {value!r} -> {actual[url].get(name)!r}")
+    return differences
+
+
+def check_single_pass(actual: Dict[str, Dict]) -> List[str]:
+    """Écarts entre le dictionnaire de extract_fields (production) et les extract_* de chaque page"""
+    differences = []
+    for url, values in actual.items():
+        fields = values.get('extract_fields')
+        if fields is None:
+            continue
+        subcategory, subsubcategory, _ = values['breadcrumb']
+        per_field = {name: values[name] for name in ('nom_produit', 'prix', 'imageurl', 'shortdesc', 'largedesc')}
+        per_field.update(subcategory=subcategory or "", subsubcategory=subsubcategory or "")
+        for name, value in per_field.items():
+            if fields.get(name) != value:
+                differences.append(f"{url} [extract_fields.{name}]: {value!r} -> {fields.get(name)!r}")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne des extractions CasalSport")
+    parser.add_argument('command', choices=['bench', 'snapshot', 'check'])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--base-url', default="https://www.casalsport.com/fr/cas/")
+    parser.add_argument('--limit', type=int, default=0, help="Nombre maximal de pages (0 = tout le corpus)")
+    parser.add_argument('--repeat', type=int, default=3, help="Répétitions par page (meilleur temps retenu)")
+    parser.add_argument('--no-alloc', action='store_true', help="Ne mesure pas les allocations (plus rapide)")
+    parser.add_argument('--json', metavar='FICHIER', help="Écrit aussi les résultats du bench en JSON")
+    parser.add_argument('--expected', default=EXPECTED_FILE)
+    args = parser.parse_args()
+
+    # Les extract_* journalisent chaque champ: le bench mesure l'extraction, pas la journalisation
+    logging.disable(logging.WARNING)
+    product_pages, other_pages = load_pages(args.corpus, args.limit)
+    product_extractors, single_pass_extractors, category_extractors = make_extractors(args.base_url)
+
+    if args.command == 'bench':
+        print(f"📊 Corpus {args.corpus}: {len(product_pages)} pages produits, {len(other_pages)} autres pages "
+              f"(backend: {default_backend()})")
+        results = {
+            'backend': default_backend(),
+            'products': benchmark(product_pages, product_extractors, args.repeat, not args.no_alloc),
+            'products_single_pass': benchmark(product_pages, single_pass_extractors, args.repeat, not args.no_alloc),
+            'categories': benchmark(other_pages, category_extractors, args.repeat, not args.no_alloc),
+        }
+        print_report("CasalSportProductScraper", results['products'])
+        print_report("CasalSportProductScraper (passe unique)", results['products_single_pass'])
+        print_report("CasalSportCategoryScraper", results['categories'])
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        return
+
+    # Le chemin de production (extract_fields) fait partie de la référence, à côté des extract_*
+    actual = {'products': extract_all(product_pages, {**product_extractors, **single_pass_extractors}),
+              'categories': extract_all(other_pages, category_extractors)}
+    if args.command == 'snapshot':
+        with open(args.expected, 'w', encoding='utf-8') as f:
+            json.dump(actual, f, indent=2, ensure_ascii=False)
+        print(f"✓ Référence écrite dans {args.expected} ({len(actual['products'])} produits, "
+              f"{len(actual['categories'])} autres pages)")
+        return
+
+    with open(args.expected, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    differences = check(expected.get('products', {}), actual['products'])
+    differences += check(expected.get('categories', {}), actual['categories'])
+    differences += check_single_pass(actual['products'])
+    for line in differences[:50]:
+        print(f"   ❌ {line}")
+    if differences:
+        print(f"❌ {len(differences)} différences avec {args.expected}")
+        sys.exit(1)
+    print(f"✅ Extractions identiques à {args.expected}")
+
+
+if __name__ == "__main__":
+    main()
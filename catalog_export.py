@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Export du catalogue CasalSport en flux, depuis le store produits (jamais chargé entièrement en mémoire)
+- CSV, JSON, JSONL, éventuellement compressés (gzip, ou zstd si zstandard est installé), en une passe
+  à mémoire constante, avec sélection des champs et filtre par subcategory
+- export typé et colonnaire (Parquet ou Arrow IPC) via pyarrow:
+  - price_cents: prix en centimes (int64), au lieu du texte "1 299,00 €"
+  - vrais nulls à la place des textes "Prix non disponible", "Image non disponible"...
+  - bullets: liste des puces au lieu du texte joint par " | "
+  - subcategory / subsubcategory: colonnes encodées en dictionnaire (une centaine de valeurs distinctes)
+  La conversion se fait par lots avec les noyaux pyarrow.compute, pas ligne par ligne;
+  le Parquet est écrit lot par lot (mémoire bornée)
+
+Le format et la compression se déduisent de l'extension (catalogue.csv.gz, catalogue.jsonl.zst...)
+
+Usage: python catalog_export.py [--source products_realtime.jsonl|debug_products.json] [--output FICHIER]
+                                [--format csv|json|jsonl|parquet|arrow] [--compress gzip|zstd]
+                                [--fields nom_produit,prix,...] [--subcategory NOM ...] [--batch-size N]
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from product_record import to_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    pa = pc = pq = None
+    HAS_PYARROW = False
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = "casalsport_products.parquet"
+
+# Textes de remplacement écrits par les extract_* quand un champ manque
+PLACEHOLDERS = {
+    'nom_produit': "Nom inconnu",
+    'prix': "Prix non disponible",
+    'imageurl': "Image non disponible",
+    'shortdesc': "Description courte non disponible",
+    'largedesc': "Description longue non disponible",
+}
+SOURCE_FIELDS = ['url', 'nom_produit', 'prix', 'imageurl', 'subcategory', 'subsubcategory', 'shortdesc', 'largedesc']
+CSV_FIELDS = ['nom_produit', 'prix', 'imageurl', 'subcategory', 'subsubcategory', 'shortdesc', 'largedesc']
+TEXT_FORMATS = ('csv', 'json', 'jsonl')
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def catalog_schema() -> 'pa.Schema':
+    return pa.schema([
+        pa.field('url', pa.string()),
+        pa.field('nom_produit', pa.string()),
+        pa.field('price_cents', pa.int64()),
+        pa.field('imageurl', pa.string()),
+        pa.field('subcategory', pa.dictionary(pa.int32(), pa.string())),
+        pa.field('subsubcategory', pa.dictionary(pa.int32(), pa.string())),
+        pa.field('shortdesc', pa.string()),
+        pa.field('bullets', pa.list_(pa.string())),
+    ], metadata={'currency': 'EUR', 'price_unit': 'cents'})
+
+
+def _require_pyarrow() -> None:
+    if not HAS_PYARROW:
+        raise RuntimeError("L'export Parquet/Arrow nécessite pyarrow (pip install pyarrow)")
+
+
+def _nullify(array: 'pa.Array', field: str) -> 'pa.Array':
+    """'' et texte de remplacement -> null"""
+    missing = pc.is_in(array, value_set=pa.array(['', PLACEHOLDERS.get(field, '')]))
+    return pc.if_else(missing, pa.scalar(None, pa.string()), array)
+
+
+def price_cents(prix: 'pa.Array') -> 'pa.Array':
+    """'1 299,00 €' -> 129900; null si aucun montant (premier montant si la page en affiche plusieurs)"""
+    digits = pc.replace_substring_regex(prix, pattern=r'[^\d,]', replacement='')
+    parts = pc.extract_regex(digits, pattern=r'^(?P<euros>\d+)(?:,(?P<cents>\d{1,2}))?')
+    euros = pc.cast(pc.struct_field(parts, 'euros'), pa.int64())
+    cents = pc.utf8_rpad(pc.fill_null(pc.struct_field(parts, 'cents'), ''), width=2, padding='0')
+    return pc.add(pc.multiply(euros, 100), pc.cast(cents, pa.int64()))
+
+
+def _columns_to_batch(columns: Dict[str, List], schema: 'pa.Schema') -> 'pa.RecordBatch':
+    """Un lot de colonnes texte brutes -> RecordBatch typé"""
+    raw = {field: _nullify(pa.array(values, type=pa.string()), field) for field, values in columns.items()}
+    arrays = [
+        raw['url'],
+        raw['nom_produit'],
+        price_cents(raw['prix']),
+        raw['imageurl'],
+        pc.dictionary_encode(raw['subcategory']),
+        pc.dictionary_encode(raw['subsubcategory']),
+        raw['shortdesc'],
+        pc.split_pattern(raw['largedesc'], pattern=' | '),
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_batches(products: Iterable[Dict], batch_size: int = 10000) -> Iterator['pa.RecordBatch']:
+    """Produits (dictionnaires du scraper) -> lots typés de batch_size lignes au plus"""
+    _require_pyarrow()
+    schema = catalog_schema()
+    columns: Dict[str, List] = {field: [] for field in SOURCE_FIELDS}
+    count = 0
+    for product in products:
+        for field in SOURCE_FIELDS:
+            columns[field].append(product.get(field) or None)
+        count += 1
+        if count == batch_size:
+            yield _columns_to_batch(columns, schema)
+            columns = {field: [] for field in SOURCE_FIELDS}
+            count = 0
+    if count:
+        yield _columns_to_batch(columns, schema)
+
+
+def export_catalog(products: Iterable[Dict], path: str = DEFAULT_OUTPUT, fmt: str = 'parquet',
+                   batch_size: int = 10000) -> int:
+    """Écrit le catalogue typé; retourne le nombre de produits exportés"""
+    _require_pyarrow()
+    schema = catalog_schema()
+    rows = 0
+    tmp_path = path + '.tmp'
+    if fmt == 'parquet':
+        with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+            for batch in iter_batches(products, batch_size):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    else:
+        # Le format fichier Arrow impose un dictionnaire unique par colonne: lots unifiés avant écriture
+        table = pa.Table.from_batches(list(iter_batches(products, batch_size)), schema=schema).unify_dictionaries()
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+            writer.write_table(table)
+        rows = table.num_rows
+    os.replace(tmp_path, path)
+    return rows
+
+
+# ------------------------------------------------------------------ formats texte en flux
+
+def detect_format(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """('csv' | 'json' | ... | None, 'gzip' | 'zstd' | None) d'après l'extension"""
+    base, suffix = os.path.splitext(path)
+    compression = COMPRESSION_SUFFIXES.get(suffix.lower())
+    if compression:
+        base, suffix = os.path.splitext(base)
+    fmt = suffix.lower().lstrip('.')
+    return (fmt if fmt in TEXT_FORMATS + COLUMNAR_FORMATS else None), compression
+
+
+def open_text_output(path: str, compression: Optional[str] = None) -> TextIO:
+    if compression == 'gzip':
+        # Niveau 6: l'export reste limité par le disque plutôt que par la compression
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    if compression == 'zstd':
+        if not HAS_ZSTD:
+            raise RuntimeError("La compression zstd nécessite zstandard (pip install zstandard)")
+        return zstandard.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def filter_products(products: Iterable[Dict], subcategories: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    if not subcategories:
+        yield from products
+        return
+    wanted = set(subcategories)
+    for product in products:
+        if product.get('subcategory') in wanted:
+            yield product
+
+
+def write_text(products: Iterable[Dict], out: TextIO, fmt: str, fields: Optional[Sequence[str]] = None) -> int:
+    """Écrit les produits un par un; retourne le nombre de produits écrits"""
+    count = 0
+    if fmt == 'csv':
+        fields = list(fields or CSV_FIELDS)
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        for product in products:
+            writer.writerow([product.get(field, '') for field in fields])
+            count += 1
+        return count
+
+    def record(product: Dict) -> str:
+        selected = {field: product.get(field) for field in fields} if fields else product
+        return json.dumps(selected, ensure_ascii=False, default=to_json)
+
+    if fmt == 'jsonl':
+        for product in products:
+            out.write(record(product) + '\n')
+            count += 1
+        return count
+
+    # JSON: même document que debug_products.json, le total étant écrit après le tableau
+    out.write('{"products": [')
+    for product in products:
+        out.write((',\n' if count else '\n') + record(product))
+        count += 1
+    out.write(f'\n], "total_products_extracted": {count}}}\n')
+    return count
+
+
+def export_products(products: Iterable[Dict], path: str, fmt: Optional[str] = None,
+                    fields: Optional[Sequence[str]] = None, subcategories: Optional[Sequence[str]] = None,
+                    compression: Optional[str] = None, batch_size: int = 10000) -> int:
+    """
+    Export en une passe vers path (format et compression déduits de l'extension si absents)
+    Écriture dans un fichier temporaire renommé à la fin: un export interrompu ne remplace rien
+    """
+    detected_format, detected_compression = detect_format(path)
+    fmt = fmt or detected_format or 'csv'
+    compression = compression or detected_compression
+    products = filter_products(products, subcategories)
+    if fmt in COLUMNAR_FORMATS:
+        return export_catalog(products, path, fmt=fmt, batch_size=batch_size)
+
+    tmp_path = path + '.tmp'
+    with open_text_output(tmp_path, compression) as out:
+        count = write_text(products, out, fmt, fields)
+    os.replace(tmp_path, path)
+    return count
+
+
+# ------------------------------------------------------------------ relecture
+
+def load_catalog(path: str) -> 'pa.Table':
+    """Relit un export Parquet ou Arrow"""
+    _require_pyarrow()
+    if path.endswith('.parquet'):
+        return pq.read_table(path)
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def iter_source(path: str) -> Iterator[Dict]:
+    """
+    Produits d'un document JSON {'products': [...]} (debug_products.json) ou du store produits,
+    lus au fil de l'eau dans les deux cas
+    """
+    from product_store import ProductStore
+    if path.endswith('.json'):
+        yield from ProductStore(snapshot_path=path).iter_snapshot()
+        return
+    yield from ProductStore(journal_path=path).iter_products()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export du catalogue CasalSport (CSV, JSON, JSONL, Parquet, Arrow)")
+    parser.add_argument('--source', default="products_realtime.jsonl",
+                        help="Journal produits (snapshot + journal) ou document JSON {'products': [...]}")
+    parser.add_argument('--output', default=None, help="Fichier de sortie (le format se déduit de l'extension)")
+    parser.add_argument('--format', choices=TEXT_FORMATS + COLUMNAR_FORMATS, default=None)
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], default=None,
+                        help="Compression des formats texte (déduite de .gz / .zst sinon)")
+    parser.add_argument('--fields', default=None,
+                        help="Champs exportés, séparés par des virgules (formats texte)")
+    parser.add_argument('--subcategory', action='append', default=None,
+                        help="N'exporte que cette subcategory (option répétable)")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    fmt = args.format or (detect_format(args.output)[0] if args.output else None) or 'parquet'
+    output = args.output
+    if output is None:
+        output = DEFAULT_OUTPUT if fmt == 'parquet' else f"casalsport_products.{fmt}"
+        output += {'gzip': '.gz', 'zstd': '.zst'}.get(args.compress, '')
+    fields = [field.strip() for field in args.fields.split(',')] if args.fields else None
+
+    started = time.perf_counter()
+    rows = export_products(iter_source(args.source), output, fmt=fmt, fields=fields,
+                           subcategories=args.subcategory, compression=args.compress, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"✓ {rows} produits exportés dans {output} ({os.path.getsize(output) / 1024:.0f} Kio) en {elapsed:.2f}s")
+
+    if fmt in COLUMNAR_FORMATS:
+        started = time.perf_counter()
+        table = load_catalog(output)
+        print(f"✓ Relu en {(time.perf_counter() - started) * 1000:.1f} ms: {table.num_rows} lignes, "
+              f"{table.column('price_cents').null_count} prix manquants")
+
+
+if __name__ == "__main__":
+    main()
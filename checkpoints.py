@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Checkpoints incrémentaux des produits CasalSport
+Remplace les auto_save_N.json (copie complète du catalogue toutes les 50 pages) par:
+- des fichiers delta JSONL qui ne contiennent que les produits ajoutés depuis le checkpoint précédent
+- un manifest.json qui permet de reconstruire l'état à n'importe quel checkpoint
+
+Les produits n'étant jamais réordonnés, l'état au checkpoint k correspond aux
+total_products premiers produits de la concaténation des segments. La compaction
+fusionne les anciens deltas dans un fichier de base sans perdre aucun checkpoint.
+
+Usage:
+  python checkpoints.py list
+  python checkpoints.py rebuild <id> [fichier_sortie.json]
+  python checkpoints.py import auto_save_*.json
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
+from product_record import to_json
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+class DeltaCheckpointer:
+    """Checkpoints delta + manifest dans un répertoire dédié"""
+
+    def __init__(self, directory: str = "checkpoints", keep_deltas: int = 10):
+        self.directory = directory
+        self.keep_deltas = keep_deltas
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self._manifest: Optional[Dict] = None
+
+    # ------------------------------------------------------------------ manifest
+
+    @property
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = self._empty_manifest()
+        return self._manifest
+
+    @staticmethod
+    def _empty_manifest() -> Dict:
+        return {'version': MANIFEST_VERSION, 'total_products': 0, 'last_url': None,
+                'next_id': 1, 'segments': [], 'checkpoints': []}
+
+    def _write_manifest(self) -> None:
+        self._atomic_write(self.manifest_path, json.dumps(self.manifest, indent=2, ensure_ascii=False))
+
+    @staticmethod
+    def _atomic_write(path: str, content: str) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # ------------------------------------------------------------------ écriture
+
+    def _continues(self, products: List[Dict]) -> bool:
+        """Vrai si products prolonge la séquence déjà enregistrée (même préfixe)"""
+        total = self.manifest['total_products']
+        if total == 0:
+            return True
+        if total > len(products):
+            return False
+        return products[total - 1].get('url') == self.manifest['last_url']
+
+    def save(self, products: List[Dict], pages_crawled: int) -> Dict:
+        """Enregistre un checkpoint: seuls les produits ajoutés depuis le précédent sont écrits"""
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = self.manifest
+
+        if not self._continues(products):
+            # Liste de produits sans rapport avec la séquence enregistrée: nouvelle séquence
+            logger.info("🔁 Séquence de produits différente, réinitialisation des checkpoints")
+            self.clear()
+            manifest = self.manifest
+
+        checkpoint_id = manifest['next_id']
+        start = manifest['total_products']
+        new_products = products[start:]
+
+        if new_products:
+            filename = f"delta_{checkpoint_id:06d}.jsonl"
+            lines = ''.join(json.dumps(p, ensure_ascii=False, default=to_json) + '\n' for p in new_products)
+            self._atomic_write(os.path.join(self.directory, filename), lines)
+            manifest['segments'].append({'file': filename, 'count': len(new_products)})
+            manifest['total_products'] = len(products)
+            manifest['last_url'] = products[-1].get('url')
+
+        checkpoint = {
+            'id': checkpoint_id,
+            'pages_crawled': pages_crawled,
+            'total_products': manifest['total_products'],
+            'new_products': len(new_products),
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        manifest['checkpoints'].append(checkpoint)
+        manifest['next_id'] = checkpoint_id + 1
+        self._write_manifest()
+
+        if len(manifest['segments']) > self.keep_deltas + 1:
+            self.compact()
+
+        logger.info(f"💾 Checkpoint #{checkpoint_id} ({pages_crawled} pages): "
+                    f"+{len(new_products)} produits, {manifest['total_products']} au total")
+        return checkpoint
+
+    def compact(self) -> None:
+        """Fusionne la base et les deltas les plus anciens dans un nouveau fichier de base"""
+        manifest = self.manifest
+        segments = manifest['segments']
+        to_merge = segments[:len(segments) - self.keep_deltas]
+        if len(to_merge) < 2:
+            return
+
+        base_name = f"base_{manifest['next_id'] - 1:06d}.jsonl"
+        base_path = os.path.join(self.directory, base_name)
+        tmp_path = base_path + '.tmp'
+        merged = 0
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for segment in to_merge:
+                with open(os.path.join(self.directory, segment['file']), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        out.write(line)
+                merged += segment['count']
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, base_path)
+
+        manifest['segments'] = [{'file': base_name, 'count': merged}] + segments[len(to_merge):]
+        self._write_manifest()
+
+        # Les anciens fichiers ne sont supprimés qu'une fois le manifest à jour
+        for segment in to_merge:
+            if segment['file'] != base_name:
+                path = os.path.join(self.directory, segment['file'])
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info(f"🗜️ Compaction des checkpoints: {len(to_merge)} segments fusionnés dans {base_name}")
+
+    def clear(self) -> None:
+        for segment in self.manifest['segments']:
+            path = os.path.join(self.directory, segment['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        self._manifest = self._empty_manifest()
+        self._write_manifest()
+
+    # ------------------------------------------------------------------ lecture
+
+    def iter_products(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        remaining = self.manifest['total_products'] if limit is None else limit
+        for segment in self.manifest['segments']:
+            if remaining <= 0:
+                return
+            with open(os.path.join(self.directory, segment['file']), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if remaining <= 0:
+                        return
+                    yield json.loads(line)
+                    remaining -= 1
+
+    def rebuild(self, checkpoint_id: Optional[int] = None) -> List[Dict]:
+        """Reconstruit la liste de produits telle qu'elle était au checkpoint demandé (dernier par défaut)"""
+        if checkpoint_id is None:
+            return list(self.iter_products())
+        for checkpoint in self.manifest['checkpoints']:
+            if checkpoint['id'] == checkpoint_id:
+                return list(self.iter_products(checkpoint['total_products']))
+        raise KeyError(f"Checkpoint {checkpoint_id} introuvable")
+
+    def import_legacy(self, filenames: List[str]) -> int:
+        """Convertit d'anciens auto_save_N.json (snapshots complets) en checkpoints delta"""
+        def pages_of(filename: str) -> int:
+            match = re.search(r'(\d+)', os.path.basename(filename))
+            return int(match.group(1)) if match else 0
+
+        imported = 0
+        for filename in sorted(filenames, key=pages_of):
+            with open(filename, 'r', encoding='utf-8') as f:
+                products = json.load(f).get('products', [])
+            self.save(products, pages_of(filename))
+            imported += 1
+        return imported
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    checkpointer = DeltaCheckpointer()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+
+    if command == 'list':
+        for checkpoint in checkpointer.manifest['checkpoints']:
+            print(f"#{checkpoint['id']:>4}  {checkpoint['pages_crawled']:>6} pages  "
+                  f"{checkpoint['total_products']:>6} produits (+{checkpoint['new_products']})  {checkpoint['created_at']}")
+    elif command == 'rebuild' and len(sys.argv) > 2:
+        products = checkpointer.rebuild(int(sys.argv[2]))
+        output = sys.argv[3] if len(sys.argv) > 3 else f"checkpoint_{sys.argv[2]}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'total_products_extracted': len(products), 'products': products}, f, indent=2, ensure_ascii=False)
+        print(f"✓ {len(products)} produits reconstruits dans {output}")
+    elif command == 'import' and len(sys.argv) > 2:
+        count = checkpointer.import_legacy(sys.argv[2:])
+        print(f"✓ {count} snapshots importés dans {checkpointer.directory}/")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
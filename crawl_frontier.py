@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Frontière de crawl compacte et dédupliquée pour CasalSport
+Une URL liée depuis des centaines de listings n'est mise en file qu'une seule fois, avec sa
+profondeur minimale. Les URLs sont stockées sous forme de suffixes internés relatifs à un
+préfixe commun (ex: https://www.casalsport.com/fr/cas/), partagés entre l'index et les files
+"""
+
+import sys
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class CrawlFrontier:
+    """
+    File BFS par niveaux de profondeur avec déduplication à l'insertion
+    - push(): ignore une URL déjà en file à une profondeur inférieure ou égale
+    - une profondeur plus faible déplace l'URL (l'ancienne entrée est ignorée au pop)
+    Mémoire et travail de pop proportionnels au nombre d'URLs distinctes, pas au nombre de liens vus
+    """
+
+    def __init__(self, prefix: str = '', entries: Iterable[Tuple[str, int]] = ()):
+        self.prefix = prefix
+        self._levels: List[deque] = []
+        self._depths: Dict[str, int] = {}
+        self._current_level = 0
+        self.pushed = 0
+        self.deduplicated = 0
+        for url, depth in entries:
+            self.push(url, depth)
+
+    def _key(self, url: str) -> str:
+        if self.prefix and url.startswith(self.prefix):
+            url = url[len(self.prefix):]
+        return sys.intern(url)
+
+    def _url(self, key: str) -> str:
+        return self.prefix + key if self.prefix and '://' not in key else key
+
+    def push(self, url: str, depth: int) -> bool:
+        """Ajoute une URL; retourne False si elle était déjà en file à une profondeur <= depth"""
+        self.pushed += 1
+        key = self._key(url)
+        queued_depth = self._depths.get(key)
+        if queued_depth is not None and queued_depth <= depth:
+            self.deduplicated += 1
+            return False
+
+        self._depths[key] = depth
+        while len(self._levels) <= depth:
+            self._levels.append(deque())
+        self._levels[depth].append(key)
+        self._current_level = min(self._current_level, depth)
+        return True
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """URL suivante (profondeur la plus faible d'abord, ordre d'arrivée ensuite)"""
+        while self._current_level < len(self._levels):
+            level = self._levels[self._current_level]
+            while level:
+                key = level.popleft()
+                # Entrée obsolète: l'URL a été déplacée vers un niveau plus faible et déjà sortie
+                if self._depths.get(key) != self._current_level:
+                    continue
+                del self._depths[key]
+                return self._url(key), self._current_level
+            self._current_level += 1
+        return None
+
+    def discard(self, url: str) -> None:
+        """Retire une URL de la file (entrée ignorée au pop)"""
+        self._depths.pop(self._key(url), None)
+
+    def __contains__(self, url: str) -> bool:
+        return self._key(url) in self._depths
+
+    def __len__(self) -> int:
+        return len(self._depths)
+
+    def __bool__(self) -> bool:
+        return bool(self._depths)
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        """URLs en attente dans l'ordre de sortie (pour les checkpoints)"""
+        for depth in range(self._current_level, len(self._levels)):
+            for key in self._levels[depth]:
+                if self._depths.get(key) == depth:
+                    yield self._url(key), depth
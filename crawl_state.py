@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+État de crawl durable pour CasalSport (SQLite)
+Sauvegarde la frontière (URL + profondeur), les URLs visitées et les URLs produits par
+checkpoints transactionnels, pour qu'un run interrompu reprenne exactement où il s'est arrêté
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS frontier (position INTEGER PRIMARY KEY, url TEXT NOT NULL, depth INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS product_urls (url TEXT PRIMARY KEY);
+"""
+
+
+class CrawlStateStore:
+    """
+    Checkpoints du crawl dans une base SQLite embarquée
+    - frontier: réécrite intégralement à chaque checkpoint (dans l'ordre de la file)
+    - visited / product_urls: uniquement les ajouts depuis le checkpoint précédent
+    Chaque checkpoint est une seule transaction: un arrêt brutal laisse le checkpoint précédent intact
+    """
+
+    def __init__(self, path: str = "crawl_state.sqlite3"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._persisted_visited: Set[str] = set()
+        self._persisted_products: Set[str] = set()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get_meta(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def has_resumable_crawl(self, start_url: str) -> bool:
+        """Vrai si un crawl non terminé depuis start_url a laissé une frontière"""
+        if not os.path.exists(self.path):
+            return False
+        meta = self.get_meta()
+        if meta.get('start_url') != start_url or meta.get('status') != 'running':
+            return False
+        return self.conn.execute("SELECT 1 FROM frontier LIMIT 1").fetchone() is not None
+
+    def load(self) -> Tuple[List[Tuple[str, int]], Set[str], Set[str], Dict[str, str]]:
+        """Retourne (frontière ordonnée, URLs visitées, URLs produits, méta)"""
+        frontier = [(url, depth) for url, depth in
+                    self.conn.execute("SELECT url, depth FROM frontier ORDER BY position")]
+        visited = {row[0] for row in self.conn.execute("SELECT url FROM visited")}
+        products = {row[0] for row in self.conn.execute("SELECT url FROM product_urls")}
+        self._persisted_visited = set(visited)
+        self._persisted_products = set(products)
+        return frontier, visited, products, self.get_meta()
+
+    def checkpoint(self, start_url: str, frontier: Iterable[Tuple[str, int]], visited: Set[str],
+                   product_urls: Set[str], pages_crawled: int, status: str = 'running') -> None:
+        """
+        Écrit un checkpoint transactionnel
+        Les URLs encore dans la frontière (y compris en cours de téléchargement) ne sont pas
+        marquées visitées, pour être retraitées à la reprise
+        """
+        frontier = list(frontier)
+        pending = {url for url, _ in frontier}
+        new_visited = [url for url in visited if url not in self._persisted_visited and url not in pending]
+        new_products = [url for url in product_urls if url not in self._persisted_products]
+
+        started = time.monotonic()
+        with self.conn:
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.executemany("INSERT INTO frontier (position, url, depth) VALUES (?, ?, ?)",
+                                  ((i, url, depth) for i, (url, depth) in enumerate(frontier)))
+            self.conn.executemany("INSERT OR IGNORE INTO visited (url) VALUES (?)", ((u,) for u in new_visited))
+            self.conn.executemany("INSERT OR IGNORE INTO product_urls (url) VALUES (?)", ((u,) for u in new_products))
+            self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ('start_url', start_url),
+                ('status', status),
+                ('pages_crawled', str(pages_crawled)),
+                ('updated_at', time.strftime('%Y-%m-%d %H:%M:%S')),
+            ])
+
+        self._persisted_visited.update(new_visited)
+        self._persisted_products.update(new_products)
+        logger.info(f"🧭 Checkpoint crawl: {len(frontier)} URLs en attente, +{len(new_visited)} visitées, "
+                    f"+{len(new_products)} produits ({(time.monotonic() - started) * 1000:.0f} ms)")
+
+    def reset(self) -> None:
+        """Efface l'état pour repartir d'un crawl neuf"""
+        with self.conn:
+            for table in ('frontier', 'visited', 'product_urls', 'meta'):
+                self.conn.execute(f"DELETE FROM {table}")
+        self._persisted_visited = set()
+        self._persisted_products = set()
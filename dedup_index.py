@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Index de doublons pour les produits CasalSport
+- NameIndex: clé de nom normalisée -> noms d'origine, vérification en O(1)
+- NearDuplicateDetector: détection de quasi-doublons (variantes de taille, couleur...) par
+  MinHash sur des shingles de caractères + LSH par bandes, sans parcours linéaire du catalogue
+  Index compact: shingles gardés en tableaux d'entiers 32 bits, bandes indexées par un hash entier
+"""
+
+import re
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_name(name: str) -> str:
+    """Même normalisation que la vérification historique (casse, espaces, tirets, underscores)"""
+    return name.lower().replace(' ', '').replace('-', '').replace('_', '')
+
+
+class NameIndex:
+    """Index des noms normalisés, tenu à jour à chaque ajout"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        # Tous les noms du catalogue par clé: le premier est celui retenu par find()
+        self._by_key: Dict[str, List[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str) -> None:
+        if name:
+            names = self._by_key.setdefault(normalize_name(name), [])
+            if name not in names:
+                names.append(name)
+
+    def discard(self, name: str) -> None:
+        """Retire un nom (produit supprimé du catalogue); la clé reste tant qu'un autre nom y correspond"""
+        key = normalize_name(name)
+        names = self._by_key.get(key)
+        if name and names and name in names:
+            names.remove(name)
+            if not names:
+                del self._by_key[key]
+
+    def find(self, name: str) -> Optional[str]:
+        """Nom existant ayant la même forme normalisée, s'il y en a un"""
+        names = self._by_key.get(normalize_name(name))
+        return names[0] if names else None
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+
+class NearDuplicateDetector:
+    """
+    MinHash + LSH sur les shingles de caractères des noms
+    Les candidats remontés par les bandes LSH sont confirmés par la similarité de Jaccard réelle
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 3):
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Permutations déterministes (a*x + b) mod p
+        seeds = [zlib.crc32(f"perm-{i}".encode()) for i in range(2 * num_perm)]
+        self._perms = [(seeds[2 * i] | 1, seeds[2 * i + 1]) for i in range(num_perm)]
+
+        self._buckets: List[Dict[int, List[str]]] = [{} for _ in range(bands)]
+        self._shingles: Dict[str, array] = {}  # nom -> shingles triés (array 'I', 4 octets par shingle)
+
+    def _shingle(self, text: str) -> Set[int]:
+        # Les espaces sont conservés pour que les mots restent séparés dans les shingles
+        text = ' '.join(re.sub(r'[-_]', ' ', text.lower()).split())
+        k = self.shingle_size
+        if len(text) <= k:
+            return {zlib.crc32(text.encode())}
+        return {zlib.crc32(text[i:i + k].encode()) for i in range(len(text) - k + 1)}
+
+    def _signature(self, shingles: Set[int]) -> List[int]:
+        return [min(((a * s + b) % _MERSENNE_PRIME) & _MAX_HASH for s in shingles) for a, b in self._perms]
+
+    def _band_keys(self, signature: List[int]) -> List[int]:
+        # Un entier par bande plutôt qu'un tuple: une collision ne fait qu'ajouter un candidat,
+        # écarté ensuite par la similarité de Jaccard
+        return [hash(tuple(signature[i * self.rows:(i + 1) * self.rows])) for i in range(self.bands)]
+
+    def add(self, name: str) -> None:
+        if not name or name in self._shingles:
+            return
+        shingles = self._shingle(name)
+        self._shingles[name] = array('I', sorted(shingles))
+        for band, key in zip(self._buckets, self._band_keys(self._signature(shingles))):
+            band.setdefault(key, []).append(name)
+
+    def discard(self, name: str) -> None:
+        shingles = self._shingles.pop(name, None)
+        if shingles is None:
+            return
+        for band, key in zip(self._buckets, self._band_keys(self._signature(set(shingles)))):
+            names = band.get(key)
+            if names is not None and name in names:
+                names.remove(name)
+                if not names:
+                    del band[key]
+
+    def query(self, name: str) -> Optional[Tuple[str, float]]:
+        """Nom existant le plus proche au-dessus du seuil, avec sa similarité de Jaccard"""
+        if not name:
+            return None
+        shingles = self._shingle(name)
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(self._signature(shingles))):
+            candidates.update(band.get(key, ()))
+
+        best = None
+        for candidate in candidates:
+            other = set(self._shingles[candidate])
+            similarity = len(shingles & other) / len(shingles | other)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def __len__(self) -> int:
+        return len(self._shingles)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Découverte ciblée des produits CasalSport
+Au lieu d'un BFS aveugle de profondeur 3 depuis la page d'accueil, part directement:
+- des URLs de listing connues (category_urls.json: catégories, sous-catégories, sous-sous-catégories)
+- du sitemap.xml (et des sitemaps déclarés dans robots.txt) quand il est disponible
+Chaque listing est suivi page par page (rel="next" ou ?page=N+1); seuls les liens candidats
+produits sont téléchargés, une fois chacun, puis classés et extraits avec le même document
+"""
+
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from typing import List, Optional, Set
+from urllib.parse import parse_qsl, urljoin, urlsplit, urlunsplit
+
+from html_parsing import PageDocument
+
+logger = logging.getLogger(__name__)
+
+PAGE_PARAMS = ('page', 'p')
+
+
+class SeededDiscovery:
+    """Découverte des produits à partir des listings connus et du sitemap"""
+
+    def __init__(self, scraper, category_file: str = 'category_urls.json', use_sitemap: bool = True,
+                 max_pages_per_listing: int = 50):
+        self.scraper = scraper
+        self.category_file = category_file
+        self.use_sitemap = use_sitemap
+        self.max_pages_per_listing = max_pages_per_listing
+
+        base = urlsplit(scraper.base_url)
+        self.scheme = base.scheme
+        self.netloc = base.netloc
+        self.listing_paths: Set[str] = set()
+        self.candidates: List[str] = []
+        self._candidate_set: Set[str] = set()
+        self.fetches = {'sitemap': 0, 'listing': 0, 'candidate': 0}
+
+    # ------------------------------------------------------------------ URLs
+
+    def rebase(self, url: str) -> str:
+        """Ramène une URL connue sur l'hôte du scraper (permet de tester contre un serveur local)"""
+        parts = urlsplit(url)
+        return urlunsplit((self.scheme, self.netloc, parts.path, parts.query, ''))
+
+    def is_listing(self, url: str) -> bool:
+        return urlsplit(url).path.rstrip('/') in self.listing_paths
+
+    def load_listing_urls(self) -> List[str]:
+        if not os.path.exists(self.category_file):
+            logger.warning(f"⚠️ {self.category_file} introuvable: aucun listing connu")
+            return []
+        with open(self.category_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        urls = data.get('flat_urls') or [entry['url'] for key in ('category_urls', 'subcategory_urls', 'subsubcategory_urls')
+                                         for entry in data.get(key, []) if entry.get('url')]
+        listings = [self.rebase(url) for url in urls]
+        self.listing_paths = {urlsplit(url).path.rstrip('/') for url in listings}
+        # La racine du catalogue n'est ni un listing à suivre ni un produit
+        self.listing_paths.add(urlsplit(self.scraper.base_url).path.rstrip('/'))
+        return listings
+
+    def add_candidate(self, url: str) -> None:
+        clean_url = url.split('#')[0].split('?')[0]
+        scraper = self.scraper
+        if (clean_url in self._candidate_set or self.is_listing(clean_url)
+                or not scraper.is_potential_product_url(clean_url) or scraper.is_brand_url(clean_url)):
+            return
+        self._candidate_set.add(clean_url)
+        self.candidates.append(clean_url)
+
+    # ------------------------------------------------------------------ sitemap
+
+    def sitemap_roots(self) -> List[str]:
+        roots = []
+        robots = self._fetch(f"{self.scheme}://{self.netloc}/robots.txt", 'sitemap')
+        if robots:
+            roots = [line.split(':', 1)[1].strip() for line in robots.splitlines()
+                     if line.lower().startswith('sitemap:')]
+        return roots or [f"{self.scheme}://{self.netloc}/sitemap.xml"]
+
+    def collect_from_sitemaps(self) -> int:
+        before = len(self.candidates)
+        pending = self.sitemap_roots()
+        seen = set()
+        while pending:
+            sitemap_url = self.rebase(pending.pop(0))
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            content = self._fetch(sitemap_url, 'sitemap')
+            if not content:
+                continue
+            try:
+                root = ET.fromstring(content.encode('utf-8'))
+            except ET.ParseError as e:
+                logger.warning(f"⚠️ Sitemap illisible {sitemap_url}: {e}")
+                continue
+            locs = [el.text.strip() for el in root.iter() if el.tag.endswith('loc') and el.text]
+            if root.tag.endswith('sitemapindex'):
+                pending.extend(locs)
+            else:
+                for loc in locs:
+                    self.add_candidate(self.rebase(loc))
+        found = len(self.candidates) - before
+        logger.info(f"🗺️ Sitemap: {found} URLs candidates")
+        return found
+
+    # ------------------------------------------------------------------ listings
+
+    @staticmethod
+    def _page_number(url: str) -> int:
+        for key, value in parse_qsl(urlsplit(url).query):
+            if key in PAGE_PARAMS and value.isdigit():
+                return int(value)
+        return 1
+
+    def next_page_url(self, url: str, page) -> Optional[str]:
+        """Page suivante d'un listing: rel="next", sinon lien vers ?page=N+1 du même chemin"""
+        for href in page.rel_links('next'):
+            return urljoin(url, href)
+
+        path = urlsplit(url).path
+        wanted = self._page_number(url) + 1
+        for href in page.hrefs():
+            absolute_url = urljoin(url, href)
+            parts = urlsplit(absolute_url)
+            if parts.path == path and self._page_number(absolute_url) == wanted:
+                return absolute_url
+        return None
+
+    def collect_from_listing(self, listing_url: str) -> int:
+        before = len(self.candidates)
+        url = listing_url
+        seen_pages = set()
+        while url and url not in seen_pages and len(seen_pages) < self.max_pages_per_listing:
+            seen_pages.add(url)
+            html = self._fetch(url, 'listing')
+            if not html:
+                break
+            page = PageDocument(url, html)
+            for href in page.hrefs():
+                self.add_candidate(urljoin(url, href))
+            url = self.next_page_url(url, page)
+        return len(self.candidates) - before
+
+    # ------------------------------------------------------------------ exécution
+
+    def _fetch(self, url: str, kind: str) -> Optional[str]:
+        self.fetches[kind] += 1
+        html = self.scraper.get_page_content(url)
+        self.scraper.pause()
+        return html
+
+    def discover(self) -> List[str]:
+        """Collecte les URLs candidates (sitemap puis listings), sans télécharger les pages produits"""
+        listings = self.load_listing_urls()
+        if self.use_sitemap:
+            self.collect_from_sitemaps()
+        logger.info(f"📚 {len(listings)} listings connus à parcourir")
+        for i, listing_url in enumerate(listings, 1):
+            found = self.collect_from_listing(listing_url)
+            logger.info(f"Listing {i}/{len(listings)}: {listing_url} (+{found} candidats, {len(self.candidates)} au total)")
+        return self.candidates
+
+    def verify_candidates(self, pending: List[str]) -> None:
+        """Télécharge chaque candidat, vérifie la meta pageGroup et extrait avec le même document"""
+        scraper = self.scraper
+        for i, url in enumerate(pending, 1):
+            scraper.visited_urls.add(url)
+            # Les liens des candidats ne sont pas suivis: un non-produit évident n'est pas téléchargé
+            if scraper.can_skip_fetch(url, needs_links=False):
+                continue
+            self.fetches['candidate'] += 1
+            page = scraper.get_page_document(url)
+            scraper.pause()
+            if page is None:
+                continue
+            if scraper.confirm_product_page(url, page):
+                scraper.handle_product_page(url, page)
+            if i % 50 == 0:
+                logger.info(f"📊 Candidats vérifiés: {i}/{len(pending)} - {len(scraper.products_data)} produits")
+
+    def verify_candidates_staged(self, pending: List[str]) -> None:
+        """Même vérification, téléchargements et parsing répartis entre threads et processus d'extraction"""
+        scraper = self.scraper
+        scraper.visited_urls.update(pending)
+        to_fetch = [url for url in pending if not scraper.can_skip_fetch(url, needs_links=False)]
+        self.fetches['candidate'] += len(to_fetch)
+        scraper.extract_urls_staged(to_fetch, check_product=True)
+
+    def run(self) -> None:
+        """Découverte puis extraction des candidats non encore connus"""
+        started = time.monotonic()
+        scraper = self.scraper
+        candidates = self.discover()
+        # Produits déjà au catalogue: confirmés sans requête, comme can_skip_fetch dans le crawl BFS
+        scraper.product_urls |= set(candidates) & scraper.existing_urls
+        pending = [url for url in candidates if url not in scraper.existing_urls and url not in scraper.visited_urls]
+        logger.info(f"🎯 {len(candidates)} candidats, {len(pending)} nouveaux à vérifier")
+
+        if scraper.extract_workers:
+            self.verify_candidates_staged(pending)
+        else:
+            self.verify_candidates(pending)
+
+        total = sum(self.fetches.values())
+        logger.info(f"✅ Découverte ciblée terminée en {time.monotonic() - started:.1f}s: {total} requêtes "
+                    f"({self.fetches['listing']} listings, {self.fetches['sitemap']} sitemap, "
+                    f"{self.fetches['candidate']} candidats), {len(scraper.product_urls)} produits confirmés")
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Crawl CasalSport réparti sur plusieurs processus (ou machines) autour d'un coordinateur SQLite
+- chaque URL découverte est insérée une seule fois dans la base (clé primaire) et rangée dans un
+  shard par hachage stable (crc32): le worker i prend d'abord les URLs du shard i, puis celles des
+  autres shards quand le sien est vide
+- les workers prennent des lots d'URLs en bail (lease) pour une durée limitée, renouvelée à chaque
+  page; un bail expiré (worker tué, machine perdue) remet ses URLs en attente
+- chaque worker écrit ses produits dans son propre journal JSONL (shards/products-<worker>.jsonl)
+  avant de valider l'URL; la validation n'est acceptée que si le worker détient encore le bail
+- la fusion ne garde, pour chaque URL, que le produit du worker qui l'a validée: une page
+  retraitée après un bail expiré n'est jamais extraite deux fois dans le catalogue
+- merge peut tourner pendant le crawl: chaque journal est repris à la position déjà fusionnée, et
+  n'est supprimé qu'une fois le crawl terminé
+
+Les workers d'une autre machine rejoignent le crawl avec la commande worker, sur la même base
+(SQLite en WAL suppose un système de fichiers local: sur plusieurs nœuds, un volume partagé
+qui respecte les verrous POSIX)
+
+Usage: python distributed_crawl.py run --workers 4
+       python distributed_crawl.py worker --index 2
+       python distributed_crawl.py status | merge
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+PRODUCT, LISTING, SKIPPED = 'product', 'listing', 'skipped'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    kind TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    done_by TEXT
+);
+CREATE INDEX IF NOT EXISTS urls_queue ON urls (state, shard, depth);
+CREATE TABLE IF NOT EXISTS merged (journal TEXT PRIMARY KEY, offset INTEGER NOT NULL);
+"""
+
+
+def shard_of(url: str, shards: int) -> int:
+    """Shard d'une URL: hachage stable d'un processus et d'une machine à l'autre (pas hash())"""
+    return zlib.crc32(url.encode('utf-8')) % shards
+
+
+class CrawlCoordinator:
+    """
+    File d'URLs partagée entre workers, dans une base SQLite (WAL)
+    Toutes les transitions d'état passent par des transactions BEGIN IMMEDIATE: deux workers ne
+    peuvent pas prendre la même URL, et complete() est refusé à un worker qui a perdu son bail
+    """
+
+    def __init__(self, path: str = "crawl_coordinator.sqlite3", lease_seconds: float = 120.0,
+                 max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts  # baux pris sans validation avant d'abandonner une URL
+        self._conn: Optional[sqlite3.Connection] = None
+        self._meta: Optional[Dict[str, str]] = None  # shards / max_depth, fixés au seed
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Transactions explicites (isolation_level=None); attente des verrous des autres workers
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ------------------------------------------------------------------ méta
+
+    def get_meta(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def set_meta(self, **values) -> None:
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [(key, str(value)) for key, value in values.items()])
+
+    @property
+    def shards(self) -> int:
+        if self._meta is None:
+            self._meta = self.get_meta()
+        return int(self._meta.get('shards', 1))
+
+    @property
+    def max_depth(self) -> int:
+        if self._meta is None:
+            self._meta = self.get_meta()
+        return int(self._meta.get('max_depth', 3))
+
+    def seed(self, start_urls: List[str], shards: int, max_depth: int = 3) -> bool:
+        """
+        Prépare un crawl depuis start_urls; reprend le crawl en cours s'il part des mêmes URLs
+        Le nombre de shards d'un crawl repris est conservé (l'affectation des URLs en dépend)
+        Retourne True en cas de reprise
+        """
+        meta = self.get_meta()
+        resumed = meta.get('status') == 'running' and meta.get('start_urls') == ' '.join(start_urls)
+        if resumed:
+            if int(meta['shards']) != shards:
+                logger.warning(f"⚠️ Crawl repris avec ses {meta['shards']} shards (et non {shards})")
+            logger.info(f"♻️ Reprise du crawl réparti: {self.stats()}")
+            return True
+
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM urls")
+            conn.execute("DELETE FROM meta")
+            conn.execute("DELETE FROM merged")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ('start_urls', ' '.join(start_urls)),
+                ('shards', str(shards)),
+                ('max_depth', str(max_depth)),
+                ('status', 'running'),
+                ('started_at', time.strftime('%Y-%m-%d %H:%M:%S')),
+            ])
+            self._insert(conn, ((url, 0) for url in start_urls), shards)
+        self._meta = None
+        logger.info(f"🌱 Crawl réparti: {len(start_urls)} URL(s) de départ, {shards} shards")
+        return False
+
+    # ------------------------------------------------------------------ file
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, entries: Iterable[Tuple[str, int]], shards: int) -> None:
+        """Insère les URLs nouvelles; une URL encore en attente garde sa profondeur minimale"""
+        conn.executemany(
+            "INSERT INTO urls (url, shard, depth) VALUES (?, ?, ?) "
+            "ON CONFLICT (url) DO UPDATE SET depth = excluded.depth "
+            "WHERE excluded.depth < urls.depth AND urls.state = 'pending'",
+            ((url, shard_of(url, shards), depth) for url, depth in entries))
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float) -> None:
+        """Remet en attente les URLs dont le bail a expiré (abandonnées après max_attempts baux)"""
+        failed = conn.execute("UPDATE urls SET state = 'failed', lease_owner = NULL, lease_expires = NULL "
+                              "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                              (now, self.max_attempts)).rowcount
+        requeued = conn.execute("UPDATE urls SET state = 'pending', lease_owner = NULL, lease_expires = NULL "
+                                "WHERE state = 'leased' AND lease_expires < ?", (now,)).rowcount
+        if failed or requeued:
+            metrics.inc('leases_expired', failed + requeued)
+            logger.warning(f"⏰ Baux expirés: {requeued} URL(s) remises en attente, {failed} abandonnée(s)")
+
+    def lease(self, owner: str, shard: int, batch_size: int = 10, steal: bool = True) -> List[Tuple[str, int]]:
+        """
+        Prend en bail jusqu'à batch_size URLs en attente, les moins profondes d'abord
+        Shard du worker en priorité; sinon (steal) celles des autres shards
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_expired(conn, now)
+            rows = conn.execute("SELECT url, depth FROM urls WHERE state = 'pending' AND shard = ? "
+                                "ORDER BY depth LIMIT ?", (shard, batch_size)).fetchall()
+            if not rows and steal:
+                rows = conn.execute("SELECT url, depth FROM urls WHERE state = 'pending' "
+                                    "ORDER BY depth LIMIT ?", (batch_size,)).fetchall()
+            conn.executemany("UPDATE urls SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                             "attempts = attempts + 1 WHERE url = ?",
+                             [(owner, now + self.lease_seconds, url) for url, _ in rows])
+        metrics.inc('urls_leased', len(rows))
+        return rows
+
+    def renew(self, owner: str) -> None:
+        """Prolonge les baux encore détenus par owner (appelé après chaque page)"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE urls SET lease_expires = ? WHERE state = 'leased' AND lease_owner = ?",
+                         (time.time() + self.lease_seconds, owner))
+
+    def complete(self, owner: str, url: str, kind: str, links: Iterable[str] = (), depth: int = 0) -> bool:
+        """
+        Valide une URL traitée et insère ses liens (profondeur depth + 1), en une transaction
+        Refusé (False) si le bail a expiré entre-temps: l'URL appartient alors à un autre worker
+        """
+        links = list(links)
+        with self._transaction() as conn:
+            updated = conn.execute("UPDATE urls SET state = 'done', kind = ?, done_by = ?, lease_owner = NULL, "
+                                   "lease_expires = NULL WHERE url = ? AND state = 'leased' AND lease_owner = ?",
+                                   (kind, owner, url, owner)).rowcount
+            if updated and links and depth + 1 <= self.max_depth:
+                self._insert(conn, ((link, depth + 1) for link in links), self.shards)
+        if not updated:
+            metrics.inc('completions_rejected')
+            logger.warning(f"⚠️ Bail perdu, résultat écarté: {url}")
+        return bool(updated)
+
+    def fail(self, owner: str, url: str) -> None:
+        """Échec de téléchargement: l'URL repart en attente, ou est abandonnée après max_attempts baux"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE urls SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                         "lease_owner = NULL, lease_expires = NULL "
+                         "WHERE url = ? AND state = 'leased' AND lease_owner = ?",
+                         (self.max_attempts, url, owner))
+
+    def release(self, owner: str) -> int:
+        """Rend les baux d'un worker qui s'arrête proprement (sans attendre leur expiration)"""
+        with self._transaction() as conn:
+            released = conn.execute("UPDATE urls SET state = 'pending', lease_owner = NULL, lease_expires = NULL, "
+                                    "attempts = attempts - 1 WHERE state = 'leased' AND lease_owner = ?",
+                                    (owner,)).rowcount
+        return released
+
+    def is_finished(self) -> bool:
+        """Plus aucune URL en attente ni en bail (un bail expiré compte: il sera repris)"""
+        return self.conn.execute("SELECT 1 FROM urls WHERE state IN ('pending', 'leased') LIMIT 1").fetchone() is None
+
+    def owner_of(self, url: str) -> Optional[str]:
+        """Worker dont l'extraction de url a été validée (None si l'URL n'est pas un produit validé)"""
+        row = self.conn.execute("SELECT done_by FROM urls WHERE url = ? AND state = 'done' AND kind = 'product'",
+                                (url,)).fetchone()
+        return row[0] if row else None
+
+    def merged_offset(self, journal: str) -> int:
+        """Octets d'un journal de worker déjà fusionnés dans le store principal"""
+        row = self.conn.execute("SELECT offset FROM merged WHERE journal = ?", (journal,)).fetchone()
+        return row[0] if row else 0
+
+    def set_merged_offset(self, journal: str, offset: int) -> None:
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO merged (journal, offset) VALUES (?, ?)", (journal, offset))
+
+    def clear_merged(self) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM merged")
+
+    def product_urls(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT url FROM urls WHERE state = 'done' AND kind = 'product'")]
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+        counts.update(self.conn.execute("SELECT kind, COUNT(*) FROM urls WHERE state = 'done' GROUP BY kind").fetchall())
+        return counts
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats.get(DONE, 0)} URLs traitées ({stats.get(PRODUCT, 0)} produits, {stats.get(LISTING, 0)} listings, "
+                f"{stats.get(SKIPPED, 0)} sans requête), {stats.get(PENDING, 0)} en attente, "
+                f"{stats.get(LEASED, 0)} en bail, {stats.get(FAILED, 0)} en échec")
+
+
+# ---------------------------------------------------------------------- workers
+
+def shard_path(shard_dir: str, owner: str) -> str:
+    return os.path.join(shard_dir, f"products-{owner}.jsonl")
+
+
+def run_worker(index: int, coordinator_path: str = "crawl_coordinator.sqlite3", shard_dir: str = "shards",
+               options: Optional[Dict] = None) -> Dict[str, int]:
+    """
+    Boucle d'un worker: bail d'un lot, traitement de chaque page comme find_product_links
+    (une requête, meta pageGroup, extraction immédiate ou liens), validation page par page
+    Les produits vont dans le journal propre au worker, synchronisé avant chaque validation
+    """
+    from http_transport import configure_transport
+    from product_store import ProductStore
+    from rate_limit import apply_rate_options
+    from scar import CasalSportProductScraper
+
+    options = options or {}
+    owner = f"w{index}-{socket.gethostname()}-{os.getpid()}"
+    coordinator = CrawlCoordinator(coordinator_path, lease_seconds=options.get('lease_seconds', 120.0))
+    shards, max_depth = coordinator.shards, coordinator.max_depth
+    shard = index % shards
+
+    configure_transport(pool_size=options.get('pool_size', 10), http2=options.get('http2', False))
+    # Le scraper charge le store principal (lecture seule): les produits déjà connus restent des doublons
+    scraper = CasalSportProductScraper(base_url=options.get('base_url', "https://www.casalsport.com/fr/cas/"),
+                                       delay=options.get('delay', 1.5), url_classifier=options.get('url_classifier', False))
+    apply_rate_options(scraper, adaptive=options.get('adaptive_rate', False),
+                       min_interval=options.get('min_interval', 0.2), max_retries=options.get('max_retries', 3))
+    os.makedirs(shard_dir, exist_ok=True)
+    output = shard_path(shard_dir, owner)
+    scraper.product_store = ProductStore(journal_path=output, snapshot_path=output[:-1])
+    counts = {'pages': 0, 'products': 0, 'rejected': 0}
+    logger.info(f"👷 Worker {owner}: shard {shard}/{shards}, sortie {output}")
+
+    def process(url: str, depth: int) -> Optional[Tuple[str, List[str]]]:
+        """(type de page, liens) ou None si la page n'a pas pu être téléchargée"""
+        if scraper.should_ignore_url(url):
+            return SKIPPED, []
+        if scraper.can_skip_fetch(url, needs_links=depth < max_depth):
+            # Produit déjà au catalogue (confirmé sans requête) ou non-produit évident
+            return (PRODUCT if url in scraper.product_urls else SKIPPED), []
+        page = scraper.get_page_document(url)
+        if page is None:
+            return None
+        scraper.visited_urls.add(url)
+        if scraper.confirm_product_page(url, page):
+            recorded = len(scraper.products_data)
+            scraper.handle_product_page(url, page)
+            if len(scraper.products_data) > recorded:
+                # Le produit doit être sur disque avant que l'URL soit validée
+                scraper.product_store.flush()
+                counts['products'] += 1
+            return PRODUCT, []
+        return LISTING, scraper.extract_page_links(url, page) if depth < max_depth else []
+
+    try:
+        while True:
+            batch = coordinator.lease(owner, shard, batch_size=options.get('batch_size', 10))
+            if not batch:
+                if coordinator.is_finished():
+                    break
+                time.sleep(options.get('poll_interval', 1.0))  # baux d'autres workers en cours
+                continue
+            for url, depth in batch:
+                result = process(url, depth)
+                if result is None:
+                    coordinator.fail(owner, url)
+                else:
+                    kind, links = result
+                    if not coordinator.complete(owner, url, kind, links, depth):
+                        counts['rejected'] += 1
+                    counts['pages'] += 1
+                    if kind == LISTING:
+                        scraper.pause()  # comme find_product_links: pas de pause après une page produit
+                coordinator.renew(owner)
+        logger.info(f"🏁 Worker {owner}: {counts['pages']} pages, {counts['products']} produits")
+    except KeyboardInterrupt:
+        logger.info(f"⚠️ Worker {owner} interrompu: baux rendus")
+    finally:
+        scraper.product_store.close()
+        coordinator.release(owner)
+        coordinator.close()
+    return counts
+
+
+def run_local_workers(workers: int, coordinator_path: str = "crawl_coordinator.sqlite3", shard_dir: str = "shards",
+                      options: Optional[Dict] = None) -> None:
+    """Lance un worker par processus (spawn: pas de fork d'un processus qui a déjà des threads)"""
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(index, coordinator_path, shard_dir, options),
+                                 name=f"crawl-worker-{index}") for index in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl-C atteint aussi les workers, qui rendent leurs baux avant de sortir
+        for process in processes:
+            process.join()
+        raise
+    crashed = [process.name for process in processes if process.exitcode]
+    if crashed:
+        logger.warning(f"⚠️ Workers arrêtés en erreur: {', '.join(crashed)} (leurs baux expireront)")
+
+
+# ---------------------------------------------------------------------- fusion
+
+def iter_new_lines(path: str, offset: int) -> Iterator[Tuple[Optional[Dict], int]]:
+    """
+    (produit, position après la ligne) pour chaque ligne complète écrite après offset
+    Une dernière ligne sans retour à la ligne est en cours d'écriture par le worker: elle attend la fusion suivante
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                return
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line), offset
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ Ligne illisible ignorée dans {path} (octet {offset - len(line)})")
+                yield None, offset
+
+
+def merge_shards(coordinator: CrawlCoordinator, scraper, shard_dir: str = "shards") -> Dict[str, int]:
+    """
+    Fusionne les journaux des workers dans le store du scraper (record_product: mêmes règles de doublons)
+    Seul le produit du worker qui a validé l'URL est retenu
+    Utilisable pendant le crawl: chaque journal n'est relu qu'à partir de la position déjà fusionnée
+    (enregistrée dans le coordinateur), et les journaux ne sont supprimés qu'une fois le crawl terminé,
+    quand plus aucun worker ne peut y écrire
+    """
+    counts = {'merged': 0, 'fenced': 0, 'duplicates': 0}
+    finished = coordinator.is_finished()  # avant la lecture: aucun produit ne peut arriver après
+    paths = sorted(glob.glob(os.path.join(shard_dir, 'products-*.jsonl')))
+    for path in paths:
+        journal = os.path.basename(path)
+        owner = journal[len('products-'):-len('.jsonl')]
+        start = offset = coordinator.merged_offset(journal)
+        for product, offset in iter_new_lines(path, start):
+            if product is None:
+                continue
+            url = product.get('url')
+            if coordinator.owner_of(url) != owner:
+                counts['fenced'] += 1  # page reprise par un autre worker après expiration du bail
+                continue
+            if scraper.is_duplicate_product(product):
+                counts['duplicates'] += 1
+                continue
+            scraper.record_product(product)
+            counts['merged'] += 1
+        if offset != start:
+            # Produits sur disque dans le store principal avant d'avancer la position fusionnée
+            scraper.product_store.flush()
+            coordinator.set_merged_offset(journal, offset)
+
+    scraper.product_urls.update(coordinator.product_urls())
+    scraper.extracted_urls.update(scraper.product_urls)
+    scraper.product_store.flush()
+    if finished:
+        coordinator.set_meta(status='completed', finished_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        for path in paths:
+            os.remove(path)
+        coordinator.clear_merged()
+    else:
+        logger.info("🧭 Crawl réparti en cours: journaux des workers conservés (fusion incrémentale)")
+    logger.info(f"🔀 Fusion de {len(paths)} journaux: {counts['merged']} produits, {counts['duplicates']} doublons, "
+                f"{counts['fenced']} extractions écartées (bail perdu)")
+    return counts
+
+
+def main():
+    from scar import CasalSportProductScraper
+
+    parser = argparse.ArgumentParser(description="Crawl CasalSport réparti (coordinateur SQLite à baux)")
+    parser.add_argument('command', choices=['run', 'worker', 'merge', 'status'])
+    parser.add_argument('--coordinator', default="crawl_coordinator.sqlite3", help="Base SQLite du coordinateur")
+    parser.add_argument('--shard-dir', default="shards", help="Répertoire des journaux produits des workers")
+    parser.add_argument('--base-url', default="https://www.casalsport.com/fr/cas/")
+    parser.add_argument('--workers', type=int, default=4, help="run: processus workers (et nombre de shards)")
+    parser.add_argument('--index', type=int, default=0, help="worker: numéro du worker (choisit son shard)")
+    parser.add_argument('--max-depth', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=1.5, help="Pause entre deux pages, par worker")
+    parser.add_argument('--lease-seconds', type=float, default=120.0, help="Durée d'un bail sans renouvellement")
+    parser.add_argument('--batch-size', type=int, default=10, help="URLs prises par bail")
+    parser.add_argument('--url-classifier', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    coordinator = CrawlCoordinator(args.coordinator, lease_seconds=args.lease_seconds)
+    options = {'base_url': args.base_url, 'delay': args.delay, 'lease_seconds': args.lease_seconds,
+               'batch_size': args.batch_size, 'url_classifier': args.url_classifier}
+    if args.command == 'status':
+        print(f"🧭 {coordinator.summary()}")
+        return
+    if args.command == 'worker':
+        run_worker(args.index, args.coordinator, args.shard_dir, options)
+        return
+    if args.command == 'run':
+        coordinator.seed([args.base_url], shards=args.workers, max_depth=args.max_depth)
+        run_local_workers(args.workers, args.coordinator, args.shard_dir, options)
+
+    scraper = CasalSportProductScraper(base_url=args.base_url, delay=args.delay)
+    try:
+        merge_shards(coordinator, scraper, args.shard_dir)
+    finally:
+        scraper.finalize_store()
+    print(f"🧭 {coordinator.summary()}")
+    print(f"✓ products_realtime.json: {len(scraper.products_data)} produits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Étage d'extraction multi-processus pour CasalSport
+Des threads de téléchargement passent le HTML brut à un ProcessPoolExecutor d'extracteurs
+(BeautifulSoup + extract_*) au travers d'une file bornée: le réseau et le parsing se recouvrent,
+et le parsing occupe tous les cœurs. Les produits sont rendus dans l'ordre des URLs
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+import metrics
+from html_parsing import PageDocument
+
+logger = logging.getLogger(__name__)
+
+_extractor = None  # ProductPageExtractor propre à chaque processus travailleur
+
+
+def _init_worker(base_url: str) -> None:
+    global _extractor
+    from scar import ProductPageExtractor
+    _extractor = ProductPageExtractor(base_url)
+
+
+def extract_page(url: str, html: str, check_product: bool = False) -> Tuple[bool, Optional[Dict]]:
+    """
+    Travailleur: (page produit ?, données produit)
+    Avec check_product, la meta pageGroup est vérifiée d'abord (parsing limité au <head>)
+    """
+    page = PageDocument(url, html)
+    if check_product and page.meta_content('pageGroup') != 'Single':
+        return False, None
+    try:
+        return True, _extractor.extract_fields(url, page.soup)
+    except Exception as e:
+        logger.error(f"Erreur extraction produit {url}: {e}")
+        return True, None
+
+
+class RequestSpacing:
+    """Intervalle minimal entre deux départs de requêtes, partagé par les threads de téléchargement"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            with metrics.stage('sleep'):
+                time.sleep(slot - now)
+
+
+class ExtractionPipeline:
+    """
+    Téléchargement (threads) -> extraction (processus), avec au plus max_pending pages en vol
+    Utilisation:
+        with ExtractionPipeline(scraper, workers=4) as pipeline:
+            for url, is_product, product_data in pipeline.run(urls):
+                ...
+    """
+
+    def __init__(self, scraper, workers: Optional[int] = None, fetchers: int = 4,
+                 max_pending: Optional[int] = None, request_interval: Optional[float] = None):
+        self.scraper = scraper
+        self.workers = workers or os.cpu_count() or 1
+        self.fetchers = max(1, fetchers)
+        # File bornée: limite le HTML gardé en mémoire quand les extracteurs prennent du retard
+        self.max_pending = max_pending or 2 * (self.workers + self.fetchers)
+        if request_interval is None:
+            # Le limiteur adaptatif du scraper (s'il existe) espace déjà chaque requête
+            request_interval = 0.0 if scraper.rate_limiter is not None else scraper.delay
+        self.spacing = RequestSpacing(request_interval)
+        self.stats = {'pages': 0, 'failed': 0, 'not_product': 0, 'extracted': 0}
+        self._stats_lock = threading.Lock()
+        self._fetch_pool: Optional[ThreadPoolExecutor] = None
+        self._extract_pool: Optional[ProcessPoolExecutor] = None
+        self._started = 0.0
+        self._waiting = 0.0
+
+    def __enter__(self) -> 'ExtractionPipeline':
+        self._fetch_pool = ThreadPoolExecutor(max_workers=self.fetchers, thread_name_prefix='fetch')
+        self._extract_pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.scraper.base_url,))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._fetch_pool.shutdown(wait=True, cancel_futures=True)
+        self._extract_pool.shutdown(wait=True, cancel_futures=True)
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _fetch(self, url: str, check_product: bool) -> Optional[Future]:
+        """Thread de téléchargement: récupère le HTML et le confie aux extracteurs"""
+        self.spacing.wait()
+        html = self.scraper.get_page_content(url)
+        self._count('pages')
+        if not html:
+            self._count('failed')
+            return None
+        return self._extract_pool.submit(extract_page, url, html, check_product)
+
+    def run(self, urls: Iterable[str], check_product: bool = False) -> Iterator[Tuple[str, bool, Optional[Dict]]]:
+        """(url, page produit ?, données) pour chaque URL, dans l'ordre d'entrée"""
+        self._started = time.monotonic()
+        url_iter = iter(urls)
+        in_flight: Deque[Tuple[str, Future]] = deque()
+
+        def submit_next() -> None:
+            url = next(url_iter, None)
+            if url is not None:
+                in_flight.append((url, self._fetch_pool.submit(self._fetch, url, check_product)))
+
+        for _ in range(self.max_pending):
+            submit_next()
+
+        while in_flight:
+            url, fetch_future = in_flight.popleft()
+            waiting_since = time.monotonic()
+            extract_future = fetch_future.result()
+            result = extract_future.result() if extract_future is not None else (False, None)
+            waited = time.monotonic() - waiting_since
+            self._waiting += waited
+            metrics.observe('extraction_wait', waited)
+            submit_next()
+
+            is_product, product_data = result
+            if extract_future is not None:
+                if not is_product:
+                    self._count('not_product')
+                elif product_data:
+                    self._count('extracted')
+            yield url, is_product, product_data
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        rate = self.stats['pages'] / elapsed if elapsed > 0 else 0.0
+        return (f"{self.stats['pages']} pages en {elapsed:.1f}s ({rate:.1f} pages/s, {self.fetchers} téléchargements "
+                f"/ {self.workers} extracteurs), {self.stats['extracted']} produits extraits, "
+                f"{self.stats['not_product']} non-produits, {self.stats['failed']} échecs; "
+                f"attente des résultats: {self._waiting:.1f}s")
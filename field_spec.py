@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Spécification déclarative des champs extraits d'une page, compilée en un seul parcours de l'arbre
+- Capture: sélecteurs CSS de repli (sous-ensemble: tag, .classe, #id, [attr], [attr=v], [attr^=v],
+  [attr*=v], :not([attr]) et combinateur descendant), valeur extraite, premier élément ou tous
+- within: la capture est limitée aux descendants de l'élément retenu par une autre capture
+  (ex. le <ul> du premier bloc de puces, pas n'importe quel <ul> sous un bloc de puces)
+- FieldSpec.extract(soup): un seul parcours de l'arbre; chaque balise n'est testée que contre les
+  sélecteurs de son nom, et les conditions d'ancêtres (combinateur descendant, within) sont des
+  compteurs d'éléments ouverts mis à jour à l'entrée et à la sortie de chaque balise, sans remonter
+  les parents. Ajouter un champ n'ajoute pas de parcours
+
+La sémantique suit BeautifulSoup: find() -> premier élément dans l'ordre du document, chaque sélecteur
+de repli retient son premier élément et le repli suivant n'est essayé que si celui-ci n'a pas de valeur.
+Sans valeur non vide, le résultat est la valeur du premier élément trouvé (éventuellement vide), sinon None
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from bs4 import BeautifulSoup, Tag
+
+_TOKEN = re.compile(r"""
+    (?P<tag>[a-zA-Z][\w-]*|\*)
+  | \.(?P<cls>[\w-]+)
+  | \#(?P<id>[\w-]+)
+  | :not\(\[(?P<absent>[\w-]+)\]\)
+  | \[(?P<attr>[\w-]+)(?:(?P<op>[\^*]?=)(?P<quote>["']?)(?P<value>.*?)(?P=quote))?\]
+""", re.VERBOSE)
+_COMPOUND = re.compile(r'(?:\[[^\]]*\]|[^\s\[])+')  # découpe sur les espaces hors [...]
+
+
+def text(tag: Tag) -> str:
+    return tag.get_text(strip=True)
+
+
+def attr(name: str, default=None) -> Callable[[Tag], object]:
+    return lambda tag: tag.get(name, default)
+
+
+class _Compound:
+    """Sélecteur simple compilé ('div.a[id^=x]'): nom de balise, classes requises, tests d'attributs"""
+
+    def __init__(self, compound: str):
+        self.tag_name: Optional[str] = None
+        self.classes: List[str] = []
+        self.tests: List[Tuple[str, str, Optional[str]]] = []  # (attribut, opérateur, valeur)
+        position = 0
+        while position < len(compound):
+            match = _TOKEN.match(compound, position)
+            if match is None:
+                raise ValueError(f"Sélecteur non supporté: {compound!r}")
+            position = match.end()
+            if match.group('tag'):
+                self.tag_name = None if match.group('tag') == '*' else match.group('tag').lower()
+            elif match.group('cls'):
+                self.classes.append(match.group('cls'))
+            elif match.group('id'):
+                self.tests.append(('id', '=', match.group('id')))
+            elif match.group('absent'):
+                self.tests.append((match.group('absent'), 'absent', None))
+            else:
+                self.tests.append((match.group('attr'), match.group('op') or 'exists', match.group('value')))
+
+    def matches(self, tag: Tag) -> bool:
+        attrs = tag.attrs
+        if self.classes:
+            classes = attrs.get('class')
+            if not classes:
+                return False
+            for cls in self.classes:
+                if cls not in classes:
+                    return False
+        for name, op, value in self.tests:
+            actual = attrs.get(name)
+            if op == 'absent':
+                if actual is not None:
+                    return False
+                continue
+            if actual is None:
+                return False
+            if isinstance(actual, list):  # attributs multi-valués (class...)
+                actual = ' '.join(actual)
+            if op == '=':
+                if actual != value:
+                    return False
+            elif op == '^=':
+                if not actual.startswith(value):
+                    return False
+            elif op == '*=':
+                if value not in actual:
+                    return False
+        return True
+
+
+class Capture:
+    """
+    Un élément (ou tous avec many=True) décrit par des sélecteurs de repli
+    value: fonction appliquée à l'élément retenu (None: l'élément lui-même, utile comme ancre de within)
+    """
+
+    def __init__(self, name: str, selectors: Union[str, Sequence[str]], value: Optional[Callable[[Tag], object]] = None,
+                 many: bool = False, within: Optional[str] = None):
+        self.name = name
+        self.selectors = [selectors] if isinstance(selectors, str) else list(selectors)
+        self.value = value
+        self.many = many
+        self.within = within
+        if many and len(self.selectors) > 1:
+            raise ValueError(f"{name}: many=True n'accepte qu'un sélecteur")
+
+
+class FieldSpec:
+    """
+    Ensemble de captures compilé en tables de règles indexées par nom de balise (ou par classe pour
+    les sélecteurs sans balise, ex. '.product-image')
+    Un sélecteur 'a b c' donne deux règles d'ancêtre (niveaux 'a' et 'a b') et une règle cible 'c';
+    chaque niveau compte ses éléments ouverts, la cible exige un élément ouvert au niveau précédent
+    """
+
+    def __init__(self, captures: Iterable[Capture]):
+        self.captures = list(captures)
+        names = {capture.name for capture in self.captures}
+        self._levels = 0
+        self._by_tag: Dict[str, List[Tuple]] = {}
+        self._by_class: Dict[str, List[Tuple]] = {}
+        self._any_tag: List[Tuple] = []
+        for capture in self.captures:
+            if capture.within is not None and capture.within not in names:
+                raise ValueError(f"{capture.name}: capture within inconnue {capture.within!r}")
+            for rank, selector in enumerate(capture.selectors):
+                compounds = [_Compound(compound) for compound in _COMPOUND.findall(selector)]
+                parent_level = None
+                for compound in compounds[:-1]:
+                    # Règle d'ancêtre: ouvre le niveau self._levels quand elle correspond
+                    self._add_rule(compound, (None, False, None, self._levels, parent_level, compound))
+                    parent_level = self._levels
+                    self._levels += 1
+                # Règle cible: (clé du premier élément, many, within, -, niveau requis, test)
+                target = compounds[-1]
+                self._add_rule(target, ((capture.name, rank), capture.many, capture.within, None, parent_level, target))
+
+    def _add_rule(self, compound: _Compound, rule: Tuple) -> None:
+        if compound.tag_name is not None:
+            self._by_tag.setdefault(compound.tag_name, []).append(rule)
+        elif compound.classes:
+            self._by_class.setdefault(compound.classes[0], []).append(rule)
+        else:
+            self._any_tag.append(rule)
+
+    @staticmethod
+    def _value(capture: Capture, tag: Tag):
+        return tag if capture.value is None else capture.value(tag)
+
+    def extract(self, soup: BeautifulSoup) -> Dict[str, object]:
+        """{nom de capture: valeur} en un seul parcours (None / [] si rien ne correspond)"""
+        firsts: Dict[Tuple[str, int], Tag] = {}  # premier élément de chaque sélecteur de repli
+        collected: Dict[str, List[Tag]] = {capture.name: [] for capture in self.captures if capture.many}
+        open_levels = [0] * self._levels  # éléments ouverts correspondant à chaque niveau d'ancêtre
+        open_anchors: Dict[str, bool] = {}  # captures within: élément retenu encore ouvert ?
+        by_tag, by_class, any_tag = self._by_tag, self._by_class, self._any_tag
+        no_rules: List[Tuple] = []
+
+        iterators = [iter(soup.contents)]
+        exits: List[Optional[List]] = [None]  # niveaux / ancres à refermer en sortant de chaque balise
+        while iterators:
+            node = next(iterators[-1], None)
+            if node is None:
+                iterators.pop()
+                self._close(exits.pop(), open_levels, open_anchors)
+                continue
+            if not isinstance(node, Tag):
+                continue
+
+            rules = by_tag.get(node.name, no_rules)
+            if by_class:
+                classes = node.attrs.get('class')
+                if classes:
+                    for cls in (dict.fromkeys(classes) if len(classes) > 1 else classes):
+                        class_rules = by_class.get(cls)
+                        if class_rules:
+                            rules = rules + class_rules
+            if any_tag:
+                rules = rules + any_tag
+
+            # Niveaux et ancres ouverts par cette balise ne valent que pour ses descendants
+            opened = None
+            for key, many, within, level, parent_level, compound in rules:
+                if parent_level is not None and not open_levels[parent_level]:
+                    continue
+                if key is None:
+                    if compound.matches(node):
+                        opened = (opened or []) + [level]
+                    continue
+                if not many and key in firsts:
+                    continue
+                if within is not None and not open_anchors.get(within):
+                    continue
+                if not compound.matches(node):
+                    continue
+                if many:
+                    collected[key[0]].append(node)
+                    continue
+                firsts[key] = node
+                if key[1] == 0:
+                    opened = (opened or []) + [key[0]]
+
+            for item in opened or ():
+                if isinstance(item, int):
+                    open_levels[item] += 1
+                else:
+                    open_anchors[item] = True
+            if node.contents:
+                iterators.append(iter(node.contents))
+                exits.append(opened)
+            elif opened is not None:
+                self._close(opened, open_levels, open_anchors)
+
+        results: Dict[str, object] = {}
+        for capture in self.captures:
+            if capture.many:
+                results[capture.name] = [self._value(capture, tag) for tag in collected[capture.name]]
+                continue
+            found = [self._value(capture, firsts[(capture.name, rank)])
+                     for rank in range(len(capture.selectors)) if (capture.name, rank) in firsts]
+            results[capture.name] = next((value for value in found if value), found[0] if found else None)
+        return results
+
+    @staticmethod
+    def _close(opened: Optional[List], open_levels: List[int], open_anchors: Dict[str, bool]) -> None:
+        for item in opened or ():
+            if isinstance(item, int):
+                open_levels[item] -= 1
+            else:
+                open_anchors[item] = False
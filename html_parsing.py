@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Couche de parsing HTML pour les scrapers CasalSport
+- make_soup(): BeautifulSoup avec html.parser, comme avant (lxml, plus rapide, sur demande)
+- PageDocument: HTML d'une page + parsings paresseux partagés. La classification (meta pageGroup)
+  et l'extraction de liens utilisent un parsing partiel (selectolax si installé, sinon
+  BeautifulSoup limité au <head> ou aux balises <a>); une meta absente du <head> est cherchée
+  dans tout le document. L'arbre complet n'est construit que si une extraction en a besoin
+- html_to_markdown(): texte d'un conteneur en blocs markdown, en un seul parcours de l'arbre
+
+Autre backend via la variable d'environnement CASAL_HTML_PARSER (lxml, html.parser, html5lib)
+
+Usage: python html_parsing.py bench <fichiers.html | répertoire> ...
+"""
+
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer, Tag
+
+import metrics
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+    HAS_SELECTOLAX = True
+except ImportError:
+    try:
+        # selectolax < 1.0: backend Modest
+        from selectolax.parser import HTMLParser as SelectolaxParser
+        HAS_SELECTOLAX = True
+    except ImportError:
+        SelectolaxParser = None
+        HAS_SELECTOLAX = False
+
+_HEAD_END = re.compile(r'</head\s*>', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+_LINE_BREAK = re.compile(r' ?\x00 ?')
+
+# Éléments qui délimitent un bloc de texte; les autres (a, span, strong...) restent dans la ligne
+BLOCK_TAGS = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'dd', 'details', 'div', 'dl', 'dt', 'fieldset', 'figcaption',
+    'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p',
+    'pre', 'section', 'summary', 'table', 'td', 'th', 'tr', 'ul',
+})
+SKIPPED_TAGS = frozenset({'script', 'style', 'noscript', 'template', 'svg', 'iframe'})
+HEADINGS = {f'h{level}': '#' * level + ' ' for level in range(1, 7)}
+
+
+def default_backend() -> str:
+    """
+    Backend BeautifulSoup utilisé pour l'arbre complet: html.parser sauf choix explicite
+    (lxml répare autrement le HTML mal formé: les champs extraits peuvent différer)
+    """
+    return os.environ.get('CASAL_HTML_PARSER') or 'html.parser'
+
+
+def make_soup(html: str, parse_only: Optional[SoupStrainer] = None, backend: Optional[str] = None) -> BeautifulSoup:
+    return BeautifulSoup(html, backend or default_backend(), parse_only=parse_only)
+
+
+def head_section(html: str) -> str:
+    """Portion du document jusqu'à </head> (tout le document si absent)"""
+    match = _HEAD_END.search(html)
+    return html[:match.end()] if match else html
+
+
+class PageDocument:
+    """
+    Document partagé par la classification, l'extraction et la recherche de liens
+    Chaque représentation n'est calculée qu'une fois, à la demande
+    """
+
+    def __init__(self, url: str, html: str, backend: Optional[str] = None):
+        self.url = url
+        self.html = html
+        self.backend = backend or default_backend()
+        self._soup: Optional[BeautifulSoup] = None
+        self._metas: Optional[List[Dict[str, str]]] = None
+        self._all_metas: Optional[List[Dict[str, str]]] = None
+        self._hrefs: Optional[List[str]] = None
+        self._rel_links: Optional[List[Dict[str, str]]] = None
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        """Arbre complet (construit une seule fois)"""
+        if self._soup is None:
+            with metrics.stage('parse_full'):
+                self._soup = make_soup(self.html, backend=self.backend)
+        return self._soup
+
+    @property
+    def is_parsed(self) -> bool:
+        return self._soup is not None
+
+    def metas(self, name: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Balises <meta> (attributs) - parsing limité au <head>
+        Si la meta name n'y est pas (placée dans le <body>, <head> mal fermé...), toutes celles du document
+        """
+        if self._metas is None:
+            with metrics.stage('parse_head'):
+                self._metas = self._parse_metas(head_section(self.html))
+        if name is None or any(attrs.get('name') == name for attrs in self._metas):
+            return self._metas
+        if self._all_metas is None:
+            with metrics.stage('parse_metas'):
+                self._all_metas = self._parse_metas(self.html)
+        return self._all_metas
+
+    def _parse_metas(self, html: str) -> List[Dict[str, str]]:
+        if self._soup is not None:
+            tags = [meta.attrs for meta in self._soup.find_all('meta')]
+        elif HAS_SELECTOLAX:
+            tags = [dict(node.attributes) for node in SelectolaxParser(html).css('meta')]
+        else:
+            tags = [meta.attrs for meta in make_soup(html, SoupStrainer('meta'), backend=self.backend).find_all('meta')]
+        return [{k: v or '' for k, v in attrs.items()} for attrs in tags]
+
+    def meta_content(self, name: str) -> Optional[str]:
+        for attrs in self.metas(name):
+            if attrs.get('name') == name:
+                return attrs.get('content')
+        return None
+
+    def hrefs(self) -> List[str]:
+        """Valeurs href des balises <a> - parsing limité aux liens"""
+        if self._hrefs is None:
+            with metrics.stage('parse_links'):
+                if self._soup is not None:
+                    self._hrefs = [a['href'] for a in self._soup.find_all('a', href=True)]
+                elif HAS_SELECTOLAX:
+                    self._hrefs = [node.attributes.get('href') or '' for node in SelectolaxParser(self.html).css('a[href]')]
+                else:
+                    strainer = SoupStrainer('a', href=True)
+                    self._hrefs = [a['href'] for a in make_soup(self.html, strainer, backend=self.backend).find_all('a', href=True)]
+        return self._hrefs
+
+    def rel_links(self, rel: str) -> List[str]:
+        """href des balises <a>/<link> portant rel=... (ex: pagination rel="next") - parsing limité"""
+        if self._rel_links is None:
+            if self._soup is not None:
+                tags = [tag.attrs for tag in self._soup.find_all(['a', 'link'], rel=True, href=True)]
+            elif HAS_SELECTOLAX:
+                tags = [dict(node.attributes) for node in SelectolaxParser(self.html).css('a[rel][href], link[rel][href]')]
+            else:
+                strainer = SoupStrainer(['a', 'link'], rel=True, href=True)
+                tags = [tag.attrs for tag in make_soup(self.html, strainer, backend=self.backend).find_all(['a', 'link'])]
+            self._rel_links = []
+            for attrs in tags:
+                rels = attrs.get('rel') or ''
+                rels = rels.split() if isinstance(rels, str) else list(rels)
+                self._rel_links.append({'rel': ' '.join(r.lower() for r in rels), 'href': attrs.get('href') or ''})
+        return [link['href'] for link in self._rel_links if rel in link['rel'].split()]
+
+
+def html_to_markdown(container: Tag, min_length: int = 0) -> str:
+    """
+    Texte d'un conteneur en markdown (titres '#', puces '- ', paragraphes séparés par une ligne vide)
+    Un seul parcours dans l'ordre du document: chaque nœud texte appartient au bloc ouvert le plus
+    interne et n'est émis qu'une fois; les espaces entre éléments en ligne sont conservés
+    ("gymnase <a>ou</a> locaux"), puis les suites d'espaces réduites à une seule
+    Les blocs de min_length caractères ou moins sont ignorés
+    """
+    lines: List[str] = []
+    parts: List[str] = []  # texte du bloc courant
+    # Préfixe markdown de chaque bloc ouvert: [préfixe, déjà utilisé, élément de liste]
+    prefixes: List[List] = []
+    list_depth = 0
+
+    def flush() -> None:
+        text = _LINE_BREAK.sub('\n', _SPACES.sub(' ', ''.join(parts))).strip()
+        parts.clear()
+        if not text or len(text) <= min_length:
+            return
+        prefix, is_item = '', False
+        # Le premier bloc d'un <li> ou d'un titre porte la puce / le niveau (ex. <li><p>...</p></li>)
+        for entry in reversed(prefixes):
+            if entry[0] and not entry[1]:
+                prefix, is_item = entry[0], entry[2]
+                entry[1] = True
+                break
+        if lines and not (is_item and lines[-1][1]):
+            lines.append(('', False))  # ligne vide entre deux blocs, sauf entre deux puces
+        lines.append((prefix + text, is_item))
+
+    iterators = [iter(container.contents)]
+    exits: List[Optional[Tag]] = [None]
+    while iterators:
+        node = next(iterators[-1], None)
+        if node is None:
+            iterators.pop()
+            tag = exits.pop()
+            if tag is not None:
+                flush()
+                prefixes.pop()
+                if tag.name in ('ul', 'ol'):
+                    list_depth -= 1
+            continue
+        if isinstance(node, Tag):
+            name = node.name
+            if name in SKIPPED_TAGS:
+                continue
+            if name == 'br':
+                parts.append('\x00')
+                continue
+            if name not in BLOCK_TAGS:
+                iterators.append(iter(node.contents))
+                exits.append(None)
+                continue
+            flush()  # texte qui précède le bloc imbriqué
+            if name in ('ul', 'ol'):
+                list_depth += 1
+                prefixes.append(['', True, False])
+            elif name == 'li':
+                prefixes.append(['  ' * max(0, list_depth - 1) + '- ', False, True])
+            else:
+                prefixes.append([HEADINGS.get(name, ''), False, False])
+            iterators.append(iter(node.contents))
+            exits.append(node)
+        elif type(node) is NavigableString:
+            # Les commentaires, CDATA, déclarations... sont des sous-classes de NavigableString
+            parts.append(node)
+    flush()
+    return '\n'.join(line for line, _ in lines)
+
+
+# ---------------------------------------------------------------------- benchmark
+
+def _collect_pages(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(('.html', '.htm')):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def benchmark_parsers(pages: List[str], repeat: int = 3) -> Dict[str, float]:
+    """Temps médian de parsing par page (ms) pour chaque stratégie disponible"""
+    strategies: Dict[str, Callable[[str], object]] = {
+        'html.parser (complet)': lambda html: make_soup(html, backend='html.parser'),
+        'html.parser (meta du <head>)': lambda html: make_soup(head_section(html), SoupStrainer('meta'), backend='html.parser'),
+        'html.parser (liens <a>)': lambda html: make_soup(html, SoupStrainer('a', href=True), backend='html.parser'),
+    }
+    if HAS_LXML:
+        strategies['lxml (complet)'] = lambda html: make_soup(html, backend='lxml')
+        strategies['lxml (liens <a>)'] = lambda html: make_soup(html, SoupStrainer('a', href=True), backend='lxml')
+    if HAS_SELECTOLAX:
+        strategies['selectolax (meta du <head>)'] = lambda html: SelectolaxParser(head_section(html)).css('meta')
+        strategies['selectolax (liens <a>)'] = lambda html: SelectolaxParser(html).css('a[href]')
+
+    results = {}
+    for name, parse in strategies.items():
+        timings = []
+        for html in pages:
+            best = min(_time_once(parse, html) for _ in range(repeat))
+            timings.append(best)
+        results[name] = statistics.median(timings) * 1000
+    return results
+
+
+def _time_once(parse: Callable[[str], object], html: str) -> float:
+    started = time.perf_counter()
+    parse(html)
+    return time.perf_counter() - started
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != 'bench':
+        print(__doc__)
+        return
+
+    files = _collect_pages(sys.argv[2:])
+    pages = []
+    for filename in files:
+        with open(filename, 'r', encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+    if not pages:
+        print("❌ Aucune page HTML trouvée")
+        return
+
+    print(f"📊 Benchmark parsing sur {len(pages)} pages (backend par défaut: {default_backend()}, "
+          f"selectolax: {'oui' if HAS_SELECTOLAX else 'non'})")
+    results = benchmark_parsers(pages)
+    reference = results['html.parser (complet)']
+    for name, ms in sorted(results.items(), key=lambda item: item[1]):
+        print(f"   {name:<32} {ms:8.2f} ms/page   x{reference / ms if ms else 0:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Cache HTTP sur disque pour les scrapers CasalSport
+- corps compressés (zlib) et adressés par contenu (sha256): deux URLs au même contenu partagent un fichier
+- index SQLite par URL normalisée avec ETag / Last-Modified
+- requêtes conditionnelles: sur 304 le corps stocké est réutilisé
+- TTL (pas de requête du tout si l'entrée est assez récente) et éviction LRU bornée en taille
+
+Usage: python http_cache.py stats | purge
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS objects (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_hash ON entries (content_hash);
+CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access);
+"""
+
+
+def normalize_url(url: str) -> str:
+    """Clé de cache: schéma/hôte en minuscules, sans fragment ni port par défaut, paramètres triés"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class HttpCache:
+    """Cache HTTP persistant, utilisable depuis plusieurs threads"""
+
+    def __init__(self, directory: str = "http_cache", ttl: float = 0.0, max_bytes: int = 500 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl  # secondes pendant lesquelles une entrée est servie sans revalidation
+        self.max_bytes = max_bytes
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    # ------------------------------------------------------------------ objets
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, 'objects', content_hash[:2], content_hash + '.z')
+
+    def _read_body(self, content_hash: str) -> Optional[str]:
+        try:
+            with open(self._object_path(content_hash), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            return None
+
+    def _write_body(self, body: str) -> str:
+        raw = body.encode('utf-8')
+        content_hash = hashlib.sha256(raw).hexdigest()
+        path = self._object_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zlib.compress(raw, 6)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            self._conn.execute("INSERT OR REPLACE INTO objects (content_hash, size) VALUES (?, ?)",
+                               (content_hash, len(compressed)))
+        return content_hash
+
+    # ------------------------------------------------------------------ entrées
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at FROM entries WHERE url_key = ?",
+                (normalize_url(url),)).fetchone()
+        if row is None:
+            return None
+        return {'content_hash': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return self.ttl > 0 and time.time() - entry['fetched_at'] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            content_hash = self._write_body(body)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (url_key, url, content_hash, etag, last_modified, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), url, content_hash, etag, last_modified, now, now))
+        self.evict()
+
+    def mark_revalidated(self, url: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE entries SET fetched_at = ?, last_access = ? WHERE url_key = ?",
+                               (now, now, normalize_url(url)))
+
+    def body_for(self, url: str, entry: Dict) -> Optional[str]:
+        body = self._read_body(entry['content_hash'])
+        if body is not None:
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE entries SET last_access = ? WHERE url_key = ?",
+                                   (time.time(), normalize_url(url)))
+        return body
+
+    # ------------------------------------------------------------------ requête
+
+    def fetch_text(self, session, url: str, timeout: float = 15, **kwargs) -> str:
+        """
+        GET avec cache (via une session requests ou un HttpTransport): entrée fraîche -> aucune requête;
+        sinon requête conditionnelle, le corps stocké est réutilisé sur 304. Lève les erreurs HTTP
+        comme raise_for_status()
+        """
+        entry = self.lookup(url)
+        if entry and self.is_fresh(entry):
+            body = self.body_for(url, entry)
+            if body is not None:
+                self.stats['fresh'] += 1
+                return body
+            entry = None  # Objet manquant: téléchargement complet
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.update(self.conditional_headers(entry))
+        response = session.get(url, headers=headers, timeout=timeout, **kwargs)
+
+        if response.status_code == 304 and entry:
+            body = self.body_for(url, entry)
+            if body is not None:
+                self.mark_revalidated(url)
+                self.stats['revalidated'] += 1
+                return body
+            # Objet perdu: nouvelle requête sans condition
+            response = session.get(url, timeout=timeout, **kwargs)
+
+        response.raise_for_status()
+        body = response.text
+        self.store(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        self.stats['downloaded'] += 1
+        return body
+
+    # ------------------------------------------------------------------ éviction
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def evict(self) -> int:
+        """Supprime les entrées les moins récemment utilisées tant que la taille dépasse max_bytes"""
+        removed = 0
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT url_key, content_hash FROM entries ORDER BY last_access").fetchall()
+            for url_key, content_hash in rows:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE url_key = ?", (url_key,))
+                removed += 1
+                still_used = self._conn.execute("SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1",
+                                                (content_hash,)).fetchone()
+                if still_used:
+                    continue
+                size_row = self._conn.execute("SELECT size FROM objects WHERE content_hash = ?", (content_hash,)).fetchone()
+                self._conn.execute("DELETE FROM objects WHERE content_hash = ?", (content_hash,))
+                try:
+                    os.remove(self._object_path(content_hash))
+                except OSError:
+                    pass
+                total -= size_row[0] if size_row else 0
+
+        if removed:
+            logger.info(f"🧹 Cache HTTP: {removed} entrées évincées ({total / 1024 / 1024:.1f} Mo restants)")
+        return removed
+
+    def purge(self) -> None:
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        self.evict()
+        self.max_bytes = max_bytes
+
+    def summary(self) -> str:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            objects = self._conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+        return (f"{entries} URLs, {objects} corps distincts, {self.total_bytes() / 1024 / 1024:.1f} Mo - "
+                f"{self.stats['fresh']} frais, {self.stats['revalidated']} revalidés (304), "
+                f"{self.stats['downloaded']} téléchargés")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    cache = HttpCache()
+    if command == 'purge':
+        cache.purge()
+    print(f"📦 Cache HTTP: {cache.summary()}")
+
+
+if __name__ == "__main__":
+    main()
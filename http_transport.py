@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Transport HTTP partagé des scrapers CasalSport
+- une seule session requests par processus (shared_transport()): en-têtes communs, connexions
+  keep-alive réutilisées par tous les scrapers et crawlers, pool de connexions dimensionnable
+- Accept-Encoding limité aux encodages réellement décodables (br seulement si brotli est installé)
+- HTTP/2 optionnel via httpx (pip install "httpx[http2]"), monté comme transport requests:
+  cache HTTP, corpus et reprises fonctionnent à l'identique
+- comptabilité par requête et par hôte: octets reçus sur le réseau, octets décodés, latence
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.response import BaseHTTPResponse
+from urllib3.util.request import ACCEPT_ENCODING
+
+import metrics
+
+try:
+    import httpx
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    httpx = None
+    HAS_HTTP2 = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
+    # urllib3 n'annonce br (et zstd) que si le décodeur correspondant est installé
+    'Accept-Encoding': ACCEPT_ENCODING.replace(',', ', '),
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'no-cache'
+}
+
+
+class Http2Adapter(BaseAdapter):
+    """Transport requests adossé à un client httpx HTTP/2 (multiplexage sur une connexion par hôte)"""
+
+    def __init__(self, max_connections: int = 10):
+        super().__init__()
+        self.client = httpx.Client(http2=True, limits=httpx.Limits(max_connections=max_connections,
+                                                                    max_keepalive_connections=max_connections))
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        try:
+            reply = self.client.request(request.method, request.url, headers=dict(request.headers),
+                                        content=request.body, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e), request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e), request=request)
+
+        response = requests.Response()
+        response.request = request
+        response.url = str(reply.url)
+        response.status_code = reply.status_code
+        response.reason = reply.reason_phrase
+        # Corps déjà décodé par httpx
+        response.headers = CaseInsensitiveDict({k: v for k, v in reply.headers.items()
+                                                if k.lower() not in ('content-encoding', 'content-length')})
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = reply.content
+        response.wire_bytes = reply.num_bytes_downloaded
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+def wire_bytes(response: requests.Response) -> int:
+    """Octets reçus sur le réseau (avant décompression) pour une réponse déjà lue"""
+    if isinstance(response.raw, BaseHTTPResponse):
+        return response.raw.tell()
+    return getattr(response, 'wire_bytes', None) or len(response.content or b'')
+
+
+class HttpTransport:
+    """Session requests partagée: pool de connexions, HTTP/2 optionnel et comptabilité par hôte"""
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, http2: bool = False,
+                 timeout: float = 15, headers: Optional[Dict[str, str]] = None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+        self.http2 = http2 and HAS_HTTP2
+        if http2 and not HAS_HTTP2:
+            logger.warning("⚠️ HTTP/2 demandé mais httpx[http2] n'est pas installé: HTTP/1.1 keep-alive")
+        self.pool_connections = pool_connections
+        self.pool_maxsize = 0
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self.ensure_pool_size(pool_maxsize)
+
+    def _mount(self, adapter: BaseAdapter) -> None:
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def ensure_pool_size(self, size: int) -> None:
+        """
+        Agrandit le pool de connexions par hôte (au moins une connexion par requête en vol)
+        Sans effet si un autre transport (rejeu d'un corpus...) a été monté sur la session
+        """
+        if size <= self.pool_maxsize:
+            return
+        current = self.session.get_adapter('https://')
+        if self.pool_maxsize and type(current) not in (HTTPAdapter, Http2Adapter):
+            return
+        self.pool_maxsize = size
+        if self.http2:
+            self._mount(Http2Adapter(max_connections=size))
+        else:
+            self._mount(HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=size))
+        if current is not None:
+            current.close()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """session.get() avec timeout par défaut et comptabilité (octets, latence, erreurs)"""
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('HEAD', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).netloc
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._account(host, time.perf_counter() - started, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        if kwargs.get('stream'):
+            # Corps pas encore lu: seule la latence jusqu'aux en-têtes est comptée
+            self._account(host, elapsed, error=response.status_code >= 400)
+        else:
+            self._account(host, elapsed, wire_bytes(response), len(response.content or b''),
+                          error=response.status_code >= 400)
+        return response
+
+    def _account(self, host: str, seconds: float, received: int = 0, decoded: int = 0, error: bool = False) -> None:
+        metrics.observe('http_request', seconds)
+        metrics.inc('http_requests')
+        metrics.inc('bytes_wire', received)
+        if error:
+            metrics.inc('http_errors')
+        with self._lock:
+            stats = self.stats.get(host)
+            if stats is None:
+                stats = self.stats[host] = {'requests': 0, 'errors': 0, 'wire_bytes': 0, 'body_bytes': 0,
+                                            'seconds': 0.0}
+            stats['requests'] += 1
+            stats['errors'] += error
+            stats['wire_bytes'] += received
+            stats['body_bytes'] += decoded
+            stats['seconds'] += seconds
+
+    def summary(self) -> str:
+        protocol = 'HTTP/2' if self.http2 else 'HTTP/1.1'
+        with self._lock:
+            hosts = [f"{host}: {s['requests']} requêtes ({s['errors']} erreurs), "
+                     f"{s['wire_bytes'] / 1024:.0f} Kio reçus / {s['body_bytes'] / 1024:.0f} Kio décodés, "
+                     f"latence moyenne {s['seconds'] / s['requests'] * 1000:.0f} ms"
+                     for host, s in self.stats.items()]
+        return f"{protocol}, pool {self.pool_maxsize} connexions/hôte; " + ('; '.join(hosts) or 'aucune requête')
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_shared: Optional[HttpTransport] = None
+_shared_lock = threading.Lock()
+
+
+def shared_transport() -> HttpTransport:
+    """Transport commun du processus (créé avec les réglages par défaut au premier appel)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HttpTransport()
+        return _shared
+
+
+def configure_transport(pool_size: int = 10, http2: bool = False) -> HttpTransport:
+    """Options --pool-size / --http2 communes aux scrapers; à appeler avant de créer les scrapers"""
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+        _shared = HttpTransport(pool_maxsize=pool_size, http2=http2)
+        return _shared
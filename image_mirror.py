@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Miroir des images produits CasalSport, en étage optionnel du scraper
+- les images des produits enregistrés sont téléchargées (ou seulement vérifiées par HEAD) par un pool
+  de threads, avec leur propre budget de débit: le crawl des pages ne les attend pas
+- stockage adressé par contenu (images/ab/abcdef....jpg, sha256 du corps): une image partagée par
+  plusieurs produits ou servie sous plusieurs URLs n'est écrite qu'une fois
+- index images/index.json: URL -> empreinte, taille, dimensions, ETag / Last-Modified
+- relance: une URL déjà dans l'index dont le fichier existe n'est pas redemandée (les URLs CDN sont
+  versionnées, ?frz-v=...); avec revalidate, requête conditionnelle (304 = image inchangée)
+- chaque produit reçoit un champ 'image': {'sha256', 'path', 'bytes', 'width', 'height'}
+  (HEAD: {'bytes', 'content_type'}; image absente du site: {'status': 404})
+
+Usage: python image_mirror.py [--source products_realtime.jsonl] [--mode download|head] [--directory images]
+                              [--workers N] [--interval S] [--adaptive-rate] [--revalidate]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+import metrics
+from extraction_pool import RequestSpacing
+from http_transport import HttpTransport, shared_transport
+from rate_limit import AdaptiveRateLimiter, fetch_with_retry
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD = 'download'
+HEAD = 'head'
+PRODUCT_KEYS = {DOWNLOAD: ('sha256', 'path', 'bytes', 'width', 'height'), HEAD: ('bytes', 'content_type')}
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """(largeur, hauteur) lue dans l'en-tête JPEG, PNG, GIF ou WebP; None si format inconnu"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', data[6:10])
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ' and len(data) >= 30:
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L' and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X' and len(data) >= 30:
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return None
+    if data[:2] == b'\xff\xd8':
+        position = 2
+        while position + 9 < len(data):
+            if data[position] != 0xFF:
+                position += 1
+                continue
+            marker = data[position + 1]
+            if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                position += 1 if marker == 0xFF else 2
+                continue
+            if marker in _JPEG_SOF:
+                height, width = struct.unpack('>HH', data[position + 5:position + 9])
+                return width, height
+            position += 2 + struct.unpack('>H', data[position + 2:position + 4])[0]
+    return None
+
+
+def _extension(url: str, content_type: str) -> str:
+    extension = mimetypes.guess_extension(content_type.split(';')[0].strip()) if content_type else None
+    if not extension:
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+    return {'.jpe': '.jpg', '.jpeg': '.jpg'}.get(extension, extension or '')
+
+
+class ImageMirror:
+    """
+    Pool de threads qui traite l'image de chaque produit soumis (une fois par URL et par passage)
+    on_result(product) est appelé quand le champ 'image' d'un produit change (ex. ProductStore.append)
+    Utilisation:
+        with ImageMirror(on_result=store.append) as mirror:
+            for product in products:
+                mirror.submit(product)
+    """
+
+    def __init__(self, directory: str = "images", transport: Optional[HttpTransport] = None, mode: str = DOWNLOAD,
+                 workers: int = 8, interval: float = 0.1, adaptive: bool = False, max_retries: int = 3,
+                 revalidate: bool = False, on_result: Optional[Callable[[Dict], None]] = None,
+                 save_every: int = 200):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.transport = transport or shared_transport()
+        self.transport.ensure_pool_size(workers)
+        self.mode = mode
+        self.workers = workers
+        self.max_retries = max_retries
+        self.revalidate = revalidate
+        self.on_result = on_result
+        self.save_every = save_every
+        # Budget de débit propre aux images, indépendant de celui des pages
+        self.limiter = AdaptiveRateLimiter(initial_interval=max(interval, 0.05),
+                                           min_interval=min(0.05, interval)) if adaptive else None
+        self.spacing = RequestSpacing(0.0 if adaptive else interval)
+        self.index = self.load_index()
+        self.stats = {'downloaded': 0, 'deduplicated': 0, 'checked': 0, 'unchanged': 0, 'skipped': 0,
+                      'missing': 0, 'failed': 0}
+        self._pending: Dict[str, Future] = {}
+        self._products: Dict[object, Dict] = {}  # URL produit -> enregistrement courant en attente de son image
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._since_save = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._started = 0.0
+
+    def __enter__(self) -> 'ImageMirror':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------ index
+
+    def load_index(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Index des images illisible ({e}), toutes les images seront revérifiées")
+            return {}
+
+    def save_index(self) -> None:
+        with self._save_lock:
+            with self._lock:
+                content = json.dumps(self.index, ensure_ascii=False)
+                self._since_save = 0
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.index_path)
+
+    def _record(self, url: str, entry: Dict, outcome: str) -> Dict:
+        with self._lock:
+            self.index[url] = entry
+            self.stats[outcome] += 1
+            self._since_save += 1
+            save = self._since_save >= self.save_every
+        metrics.inc(f'images_{outcome}')
+        if save:
+            self.save_index()
+        return entry
+
+    # ------------------------------------------------------------------ soumission
+
+    def submit(self, product: Dict) -> None:
+        """
+        Traite l'image du produit en arrière-plan; une URL déjà soumise n'est pas redemandée
+        Soumettre à nouveau un produit de même URL (version rafraîchie) remplace l'ancien enregistrement:
+        le résultat ne s'applique qu'au dernier soumis
+        """
+        url = product.get('imageurl') or ''
+        if not url.startswith(('http://', 'https://')):
+            self.discard(product.get('url'))
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image')
+                self._started = time.monotonic()
+            self._products[self._key(product)] = product
+            future = self._pending.get(url)
+            if future is None:
+                future = self._pending[url] = self._pool.submit(self._process, url)
+        future.add_done_callback(lambda done: self._attach(product, done))
+
+    def discard(self, product_url: Optional[str]) -> None:
+        """Produit retiré du catalogue: son image en cours n'est plus rattachée ni journalisée"""
+        if product_url:
+            with self._lock:
+                self._products.pop(product_url, None)
+
+    @staticmethod
+    def _key(product: Dict):
+        return product.get('url') or id(product)
+
+    def _attach(self, product: Dict, future: Future) -> None:
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error(f"Erreur image {product.get('imageurl')}: {future.exception()}")
+            return
+        entry = future.result()
+        keys = ('status',) if entry and 'status' in entry else PRODUCT_KEYS[self.mode]
+        info = {key: entry.get(key) for key in keys} if entry else None
+        # Sous le verrou: un remplacement (submit) ou un retrait (discard) est ordonné avant ou après ce
+        # rattachement, jamais au milieu; un enregistrement remplacé ou retiré n'est plus journalisé
+        with self._lock:
+            key = self._key(product)
+            if self._products.get(key) is not product:
+                return
+            del self._products[key]
+            if info is None or product.get('image') == info:
+                return
+            product['image'] = info
+            if self.on_result is not None:
+                self.on_result(product)
+
+    # ------------------------------------------------------------------ téléchargement
+
+    def _stored(self, entry: Optional[Dict]) -> bool:
+        """Entrée d'index réutilisable telle quelle pour le mode courant"""
+        if not entry or 'status' in entry:
+            return False
+        if self.mode == HEAD:
+            return True
+        return 'path' in entry and os.path.exists(os.path.join(self.directory, entry['path']))
+
+    def _process(self, url: str) -> Optional[Dict]:
+        previous = self.index.get(url)
+        if self._stored(previous) and not self.revalidate:
+            with self._lock:
+                self.stats['skipped'] += 1
+            return previous
+
+        headers = {}
+        if self._stored(previous):
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+
+        def fetch() -> requests.Response:
+            self.spacing.wait()
+            if self.mode == HEAD:
+                response = self.transport.head(url, headers=headers)
+            else:
+                response = self.transport.get(url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+
+        try:
+            with metrics.stage('image_fetch'):
+                response = fetch_with_retry(fetch, url, limiter=self.limiter, max_retries=self.max_retries)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in (404, 410):
+                logger.warning(f"🖼️ Image absente ({e.response.status_code}): {url}")
+                return self._record(url, {'status': e.response.status_code}, 'missing')
+            logger.error(f"Erreur image {url}: {e}")
+            with self._lock:
+                self.stats['failed'] += 1
+            return None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Erreur image {url}: {e}")
+            with self._lock:
+                self.stats['failed'] += 1
+            return None
+
+        if response.status_code == 304:
+            return self._record(url, previous, 'unchanged')
+
+        entry = {
+            'content_type': response.headers.get('Content-Type', ''),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        if self.mode == HEAD:
+            length = response.headers.get('Content-Length')
+            entry['bytes'] = int(length) if length and length.isdigit() else None
+            return self._record(url, entry, 'checked')
+
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        dimensions = image_dimensions(body)
+        entry.update({
+            'sha256': digest,
+            'path': f"{digest[:2]}/{digest}{_extension(url, entry['content_type'])}",
+            'bytes': len(body),
+            'width': dimensions[0] if dimensions else None,
+            'height': dimensions[1] if dimensions else None,
+        })
+        return self._record(url, entry, 'downloaded' if self._write(entry['path'], body) else 'deduplicated')
+
+    def _write(self, relative_path: str, body: bytes) -> bool:
+        """Écrit le fichier s'il n'existe pas déjà (même contenu = même chemin); False si déjà présent"""
+        path = os.path.join(self.directory, relative_path)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        metrics.inc('bytes_images', len(body))
+        return True
+
+    # ------------------------------------------------------------------ fin
+
+    def close(self, cancel: bool = False) -> None:
+        """Attend les images en cours (cancel: abandonne celles pas encore commencées) et enregistre l'index"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        pool.shutdown(wait=True, cancel_futures=cancel)
+        self.save_index()
+        self._pending.clear()
+        self._products.clear()
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        s = self.stats
+        fetched = s['downloaded'] + s['deduplicated'] + s['checked'] + s['unchanged']
+        rate = fetched / elapsed if elapsed > 0 else 0.0
+        return (f"{s['downloaded']} téléchargées, {s['deduplicated']} doublons de contenu, {s['checked']} vérifiées, "
+                f"{s['unchanged']} inchangées (304), {s['skipped']} déjà en miroir, {s['missing']} absentes, "
+                f"{s['failed']} échecs; {rate:.1f} images/s avec {self.workers} threads")
+
+
+def main():
+    from product_store import ProductStore
+
+    parser = argparse.ArgumentParser(description="Miroir des images produits CasalSport")
+    parser.add_argument('--source', default="products_realtime.jsonl", help="Journal du store produits")
+    parser.add_argument('--mode', choices=[DOWNLOAD, HEAD], default=DOWNLOAD)
+    parser.add_argument('--directory', default="images")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--interval', type=float, default=0.1, help="Secondes minimum entre deux requêtes d'image")
+    parser.add_argument('--adaptive-rate', action='store_true')
+    parser.add_argument('--revalidate', action='store_true',
+                        help="Requête conditionnelle même pour les images déjà en miroir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    store = ProductStore(journal_path=args.source)
+    products = store.load()
+    with ImageMirror(directory=args.directory, mode=args.mode, workers=args.workers, interval=args.interval,
+                     adaptive=args.adaptive_rate, revalidate=args.revalidate, on_result=store.append) as mirror:
+        for product in products:
+            mirror.submit(product)
+    store.compact(products)
+    print(f"🖼️ Images: {mirror.summary()}")
+
+
+if __name__ == "__main__":
+    main()
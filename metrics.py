@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Instrumentation des scrapers CasalSport
+- histogrammes de latence par étape (réseau, parsing, extraction, sauvegardes, pauses...)
+- compteurs (pages, octets, produits, doublons, erreurs...) et jauges (valeur courante: débit...)
+- export périodique dans un fichier JSON ou au format texte Prometheus (écriture atomique)
+
+Utilisation, à la manière du module logging:
+    import metrics
+    with metrics.stage('fetch'):
+        ...
+    metrics.inc('bytes', len(html))
+    metrics.start_dump('metrics.json', interval=30)
+
+Le coût d'une mesure est un perf_counter, une recherche dichotomique et un verrou: l'instrumentation
+peut rester active en production; sans start_dump() rien n'est écrit
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bornes supérieures des buckets (secondes), de 1 ms à 60 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Histogramme à buckets fixes (format Prometheus), avec somme, nombre et maximum"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # dernier bucket: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Quantile approché: borne supérieure du bucket qui le contient"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 6),
+            'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p90_ms': round(self.quantile(0.9) * 1000, 3),
+            'p99_ms': round(self.quantile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': {str(bound): count for bound, count in zip(self.bounds, self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """Compteurs et histogrammes partagés entre threads"""
+
+    def __init__(self, namespace: str = 'casal'):
+        self.namespace = namespace
+        self.started = time.time()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.stages: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._dump_thread: Optional[threading.Thread] = None
+        self._dump_stop = threading.Event()
+
+    # ------------------------------------------------------------------ mesures
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, stage_name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.stages.get(stage_name)
+            if histogram is None:
+                histogram = self.stages[stage_name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Mesure la durée du bloc (y compris quand il lève une exception)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed(self, name: str):
+        """Décorateur: mesure chaque appel de la fonction dans l'étape name"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ------------------------------------------------------------------ export
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            uptime = time.time() - self.started
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            stages = {name: histogram.to_dict() for name, histogram in self.stages.items()}
+        rates = {f"{name}_per_sec": round(value / uptime, 3) for name, value in counters.items() if uptime > 0}
+        return {
+            'updated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'uptime_seconds': round(uptime, 1),
+            'counters': counters,
+            'rates': rates,
+            'gauges': gauges,
+            'stages': stages,
+        }
+
+    def to_prometheus(self) -> str:
+        prefix = self.namespace
+        lines: List[str] = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+            for name, value in sorted(self.gauges.items()):
+                metric = f"{prefix}_{name}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+            metric = f"{prefix}_stage_seconds"
+            if self.stages:
+                lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {histogram.count}')
+            lines.append(f"# TYPE {prefix}_uptime_seconds gauge")
+            lines.append(f"{prefix}_uptime_seconds {time.time() - self.started:.1f}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str, fmt: str = 'json') -> None:
+        content = self.to_prometheus() if fmt == 'prometheus' else json.dumps(self.snapshot(), indent=2)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def start_dump(self, path: str, fmt: str = 'json', interval: float = 30.0) -> None:
+        """Export périodique en arrière-plan, plus un export final à la sortie de l'interpréteur"""
+        self.stop_dump()
+        self._dump_stop.clear()
+
+        def loop():
+            while not self._dump_stop.wait(interval):
+                try:
+                    self.dump(path, fmt)
+                except OSError as e:
+                    logger.warning(f"⚠️ Export des métriques impossible: {e}")
+
+        self._dump_thread = threading.Thread(target=loop, name='metrics-dump', daemon=True)
+        self._dump_thread.start()
+        atexit.register(self.dump, path, fmt)
+        logger.info(f"📈 Métriques exportées toutes les {interval:.0f}s dans {path} ({fmt})")
+
+    def stop_dump(self) -> None:
+        if self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+            self._dump_thread = None
+
+    def summary(self) -> str:
+        """Résumé lisible: temps total et latence médiane par étape, puis compteurs"""
+        data = self.snapshot()
+        parts = [f"{name}: {s['sum_seconds']:.1f}s ({s['count']} x, p50 {s['p50_ms']:.0f} ms)"
+                 for name, s in sorted(data['stages'].items(), key=lambda item: -item[1]['sum_seconds'])]
+        counters = ', '.join(f"{name}={value:g}" for name, value in sorted(data['counters'].items()))
+        return ' | '.join(parts) + (f" || {counters}" if counters else '')
+
+
+# Registre par défaut et raccourcis au niveau du module
+registry = MetricsRegistry()
+inc = registry.inc
+gauge = registry.gauge
+observe = registry.observe
+stage = registry.stage
+timed = registry.timed
+start_dump = registry.start_dump
+summary = registry.summary
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Corpus HTML enregistré pour les scrapers CasalSport
+- enregistrement: chaque réponse reçue par la session (URL, statut, en-têtes, corps) est ajoutée
+  à un fichier JSONL compressé (gzip, un membre par session d'enregistrement)
+- rejeu: un transport requests sert les réponses du corpus sans aucun accès réseau, ce qui
+  permet de comparer parsers et extractions sur des entrées identiques (bench_extraction.py)
+
+Usage: python page_corpus.py stats [corpus.jsonl.gz]
+"""
+
+import atexit
+import base64
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from http_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS = "corpus.jsonl.gz"
+
+# En-têtes sans objet pour un corps déjà décodé et rejoué tel quel
+_DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def _is_text(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return content_type.startswith('text/') or 'xml' in content_type or 'json' in content_type
+
+
+class PageCorpus:
+    """Fichier JSONL gzip de réponses HTTP: ajout thread-safe et lecture indexée par URL normalisée"""
+
+    def __init__(self, path: str = DEFAULT_CORPUS):
+        self.path = path
+        self.recorded = 0
+        self._writer: Optional[gzip.GzipFile] = None
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, bytes]] = None
+
+    # ------------------------------------------------------------------ enregistrement
+
+    def record(self, response: requests.Response) -> None:
+        """Ajoute une réponse au corpus (utilisable comme hook 'response' d'une session requests)"""
+        if response.status_code == 304:
+            return  # Revalidation du cache HTTP: pas de corps, l'entrée précédente reste valable
+        content_type = response.headers.get('Content-Type', '')
+        entry = {
+            'url': response.url,
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS},
+            'fetched_at': time.time(),
+        }
+        if _is_text(content_type):
+            entry['encoding'] = response.encoding or 'utf-8'
+            entry['text'] = response.text
+        else:
+            entry['base64'] = base64.b64encode(response.content).decode('ascii')
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+        with self._lock:
+            if self._writer is None:
+                # Un membre gzip par session: compression inter-pages, fichier concaténable
+                self._writer = gzip.open(self.path, 'ab')
+                atexit.register(self.close)
+            self._writer.write(line)
+            self.recorded += 1
+            if self.recorded % 50 == 0:
+                self._writer.flush()
+            if self._index is not None:
+                self._index[normalize_url(response.url)] = zlib.compress(line)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    # ------------------------------------------------------------------ lecture
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Entrées dans l'ordre d'enregistrement (une session interrompue est lue jusqu'à la coupure)"""
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, 'rb') as f:
+            try:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"⚠️ Entrée tronquée ignorée dans {self.path}")
+            except (EOFError, zlib.error, gzip.BadGzipFile):
+                logger.warning(f"⚠️ Fin de {self.path} incomplète (enregistrement interrompu)")
+
+    def _load_index(self) -> Dict[str, bytes]:
+        with self._lock:
+            if self._index is None:
+                # Entrées gardées compressées en mémoire; la plus récente l'emporte pour une même URL
+                index = {}
+                for entry in self:
+                    line = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+                    index[normalize_url(entry['url'])] = zlib.compress(line)
+                self._index = index
+            return self._index
+
+    def get(self, url: str) -> Optional[Dict]:
+        compressed = self._load_index().get(normalize_url(url))
+        return json.loads(zlib.decompress(compressed)) if compressed is not None else None
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    @staticmethod
+    def body(entry: Dict) -> bytes:
+        if 'text' in entry:
+            return entry['text'].encode(entry.get('encoding') or 'utf-8', errors='replace')
+        return base64.b64decode(entry.get('base64', ''))
+
+    def iter_html(self) -> Iterator[Dict]:
+        """Pages HTML en succès, une par URL"""
+        for url_key in self._load_index():
+            entry = self.get(url_key)
+            if entry and entry['status'] == 200 and 'text' in entry and \
+                    'html' in entry['headers'].get('Content-Type', 'text/html').lower():
+                yield entry
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport requests qui sert les réponses du corpus; une URL absente donne un 404 (X-Corpus-Miss)"""
+
+    def __init__(self, corpus: PageCorpus):
+        super().__init__()
+        self.corpus = corpus
+        self.hits = 0
+        self.misses = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        entry = self.corpus.get(request.url)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if entry is None:
+            self.misses += 1
+            response.status_code = 404
+            response.headers = CaseInsensitiveDict({'X-Corpus-Miss': '1'})
+            response._content = b''
+            response.reason = 'Not in corpus'
+            return response
+
+        self.hits += 1
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = PageCorpus.body(entry)
+        response.encoding = entry.get('encoding')
+        response.reason = 'Replayed'
+        return response
+
+    def close(self):
+        pass
+
+
+def attach_recorder(session: requests.Session, corpus: PageCorpus) -> None:
+    """Enregistre dans le corpus toutes les réponses reçues par la session"""
+    session.hooks.setdefault('response', []).append(lambda response, *args, **kwargs: corpus.record(response))
+
+
+def attach_replay(session: requests.Session, corpus: PageCorpus) -> ReplayAdapter:
+    """Remplace le transport réseau de la session par le rejeu du corpus"""
+    adapter = ReplayAdapter(corpus)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    logger.info(f"📼 Rejeu hors ligne depuis {corpus.path} ({len(corpus)} URLs)")
+    return adapter
+
+
+def apply_corpus_options(scraper, record: Optional[str] = None, replay: Optional[str] = None) -> None:
+    """Options --record-corpus / --replay-corpus communes aux scrapers (le rejeu se fait sans délai)"""
+    if replay:
+        attach_replay(scraper.session, PageCorpus(replay))
+        scraper.delay = 0
+    elif record:
+        attach_recorder(scraper.session, PageCorpus(record))
+        logger.info(f"📼 Enregistrement des pages dans {record}")
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'stats':
+        print(__doc__)
+        return
+    corpus = PageCorpus(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CORPUS)
+    html_pages = sum(1 for _ in corpus.iter_html())
+    size = os.path.getsize(corpus.path) if os.path.exists(corpus.path) else 0
+    print(f"📼 {corpus.path}: {len(corpus)} URLs ({html_pages} pages HTML), {size / 1024 / 1024:.1f} Mo compressés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Rafraîchissement incrémental des produits CasalSport connus
+Revisite uniquement les URLs du store produits au lieu d'un crawl complet:
+- empreinte du corps de page: identique au dernier passage -> inchangé, sans parsing
+- sinon extraction et empreinte des champs: identique -> inchangé, différente -> produit mis à jour
+- 404/410 ou page dont la meta pageGroup existe et n'est plus Single -> produit supprimé
+  (une page sans pageGroup - captcha, maintenance, corps tronqué - est un échec, pas une suppression)
+Chaque passage ajoute au flux de changements (product_changes.jsonl) les produits ajoutés,
+supprimés et modifiés, avec ancien et nouveau prix
+
+Usage: python price_refresh.py feed [N]   (N derniers changements)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from html_parsing import PageDocument
+from product_record import ProductRecord
+from rate_limit import fetch_with_retry
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = ('nom_produit', 'prix', 'imageurl', 'subcategory', 'subsubcategory', 'shortdesc', 'largedesc')
+
+# Résultat du téléchargement
+OK = 'ok'
+GONE = 'gone'
+FAILED = 'failed'
+
+# Résultat du rafraîchissement d'un produit
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+
+def field_fingerprint(product: Dict) -> str:
+    """Empreinte des champs extraits (l'URL et les champs de debug n'en font pas partie)"""
+    values = [product.get(field) or '' for field in TRACKED_FIELDS]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def body_fingerprint(html: str) -> str:
+    return hashlib.sha1(html.encode('utf-8')).hexdigest()
+
+
+class ProductRefresher:
+    """Revisite les produits connus d'un CasalSportProductScraper et publie les changements"""
+
+    def __init__(self, scraper, feed_path: str = "product_changes.jsonl",
+                 fingerprints_path: str = "product_fingerprints.json"):
+        self.scraper = scraper
+        self.feed_path = feed_path
+        self.fingerprints_path = fingerprints_path
+        self.fingerprints = self.load_fingerprints()
+        self.run_id = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.stats = {'unchanged_body': 0, 'unchanged_fields': 0, 'changed': 0, 'removed': 0,
+                      'added': 0, 'failed': 0}
+        self._changes: List[Dict] = []
+
+    # ------------------------------------------------------------------ empreintes
+
+    def load_fingerprints(self) -> Dict[str, Dict[str, str]]:
+        """URL -> {'body': empreinte du corps, 'fields': empreinte des champs} du dernier passage"""
+        if not os.path.exists(self.fingerprints_path):
+            return {}
+        try:
+            with open(self.fingerprints_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Empreintes illisibles ({e}), toutes les pages seront ré-extraites")
+            return {}
+
+    def save_fingerprints(self) -> None:
+        tmp_path = self.fingerprints_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.fingerprints, f)
+        os.replace(tmp_path, self.fingerprints_path)
+
+    # ------------------------------------------------------------------ flux de changements
+
+    def emit(self, change_type: str, url: str, old: Optional[Dict] = None, new: Optional[Dict] = None) -> None:
+        change = {'run': self.run_id, 'type': change_type, 'url': url,
+                  'nom_produit': (new or old or {}).get('nom_produit', '')}
+        if old is not None:
+            change['old_prix'] = old.get('prix')
+        if new is not None:
+            change['new_prix'] = new.get('prix')
+        if old is not None and new is not None:
+            change['fields'] = [field for field in TRACKED_FIELDS if old.get(field) != new.get(field)]
+        self._changes.append(change)
+        self.stats[change_type] += 1
+
+    def write_feed(self) -> None:
+        if not self._changes:
+            return
+        with open(self.feed_path, 'a', encoding='utf-8') as f:
+            for change in self._changes:
+                f.write(json.dumps(change, ensure_ascii=False) + '\n')
+        logger.info(f"📰 {len(self._changes)} changements ajoutés à {self.feed_path}")
+        self._changes = []
+
+    # ------------------------------------------------------------------ rafraîchissement
+
+    def fetch(self, url: str) -> Tuple[str, Optional[str]]:
+        """(statut, HTML): distingue une page disparue (404/410) d'un échec temporaire"""
+        scraper = self.scraper
+        
+        def fetch() -> str:
+            if scraper.http_cache is not None:
+                return scraper.http_cache.fetch_text(scraper.transport, url, timeout=15)
+            response = scraper.transport.get(url, timeout=15)
+            response.raise_for_status()
+            return response.text
+        
+        try:
+            return OK, fetch_with_retry(fetch, url, limiter=scraper.rate_limiter, max_retries=scraper.max_retries)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in (404, 410):
+                return GONE, None
+            logger.error(f"Erreur lors de la récupération de {url}: {e}")
+            return FAILED, None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Erreur lors de la récupération de {url}: {e}")
+            return FAILED, None
+
+    def refresh_product(self, product: Dict) -> Tuple[str, Optional[Dict]]:
+        """Revisite un produit: ('unchanged' | 'changed' | 'removed' | 'failed', nouvelle version si modifié)"""
+        url = product['url']
+        status, html = self.fetch(url)
+        if status == FAILED:
+            self.stats['failed'] += 1
+            return FAILED, None
+        if status == GONE:
+            self.remove(product)
+            return REMOVED, None
+
+        previous = self.fingerprints.get(url, {})
+        body_hash = body_fingerprint(html)
+        if previous.get('body') == body_hash:
+            self.stats['unchanged_body'] += 1
+            return UNCHANGED, None
+
+        page = PageDocument(url, html)
+        page_group = page.meta_content('pageGroup')
+        if page_group is None:
+            # Réponse 200 qui n'est pas une page du site (WAF, maintenance, corps tronqué): à revoir au prochain passage
+            logger.warning(f"⚠️ Meta pageGroup absente, produit conservé: {url}")
+            self.stats['failed'] += 1
+            return FAILED, None
+        if page_group != 'Single':
+            # Redirigé vers un listing ou page retirée du catalogue
+            self.remove(product)
+            return REMOVED, None
+
+        fresh = self.scraper.extract_fields(url, page.soup)
+        fields_hash = field_fingerprint(fresh)
+        self.fingerprints[url] = {'body': body_hash, 'fields': fields_hash}
+        if fields_hash == previous.get('fields', field_fingerprint(product)):
+            self.stats['unchanged_fields'] += 1
+            return UNCHANGED, None
+
+        # Les champs hors extraction (ajoutés par d'autres outils) sont conservés
+        updated = ProductRecord(product)
+        updated.update(fresh)
+        self.emit('changed', url, product, updated)
+        if product.get('prix') != updated.get('prix'):
+            logger.info(f"💶 {updated['nom_produit']}: {product.get('prix')} -> {updated.get('prix')}")
+        return CHANGED, updated
+
+    def remove(self, product: Dict) -> None:
+        url = product['url']
+        self.fingerprints.pop(url, None)
+        self.emit('removed', url, old=product)
+        logger.info(f"🗑️ Produit retiré du catalogue: {url}")
+
+    def forget(self, product: Dict) -> None:
+        """Retire un produit supprimé des index de doublons: revenu sous une autre URL, il sera accepté"""
+        scraper = self.scraper
+        scraper.existing_urls.discard(product['url'])
+        name = product.get('nom_produit')
+        if name:
+            scraper.existing_names.discard(name)
+            scraper.name_index.discard(name)
+            if scraper.near_duplicate_detector is not None:
+                scraper.near_duplicate_detector.discard(name)
+
+    def run(self, discover: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+        """
+        Rafraîchit tous les produits connus, puis lance éventuellement une découverte
+        (les produits qu'elle trouve sont publiés comme ajouts)
+        """
+        scraper = self.scraper
+        started = time.monotonic()
+        known = [p for p in scraper.products_data if p.get('url')]
+        known_urls = {p['url'] for p in known}
+        position = {id(p): i for i, p in enumerate(scraper.products_data)}
+        removed_urls = set()
+        logger.info(f"🔄 Rafraîchissement de {len(known)} produits connus")
+
+        try:
+            for i, product in enumerate(known, 1):
+                outcome, updated = self.refresh_product(product)
+                if outcome == CHANGED:
+                    scraper.products_data[position[id(product)]] = updated
+                    if scraper.image_mirror is not None:
+                        # Avant l'ajout au journal: une image en retard ne réécrira plus l'ancienne version
+                        scraper.image_mirror.submit(updated)
+                    scraper.product_store.append(updated)
+                elif outcome == REMOVED:
+                    removed_urls.add(product['url'])
+                    self.forget(product)
+                    if scraper.image_mirror is not None:
+                        scraper.image_mirror.discard(product['url'])
+                    scraper.product_store.remove(product['url'])
+
+                scraper.pause()
+                if i % 50 == 0:
+                    logger.info(f"📊 Rafraîchis: {i}/{len(known)} - {self.summary()}")
+                    self.save_fingerprints()
+
+            if discover is not None:
+                before = len(scraper.products_data)
+                discover()
+                for product in scraper.products_data[before:]:
+                    if product.get('url') and product['url'] not in known_urls:
+                        self.fingerprints[product['url']] = {'fields': field_fingerprint(product)}
+                        self.emit('added', product['url'], new=product)
+        finally:
+            if removed_urls:
+                scraper.products_data[:] = [p for p in scraper.products_data if p.get('url') not in removed_urls]
+            self.save_fingerprints()
+            self.write_feed()
+
+        logger.info(f"✅ Rafraîchissement terminé en {time.monotonic() - started:.1f}s: {self.summary()}")
+        return dict(self.stats)
+
+    def summary(self) -> str:
+        unchanged = self.stats['unchanged_body'] + self.stats['unchanged_fields']
+        return (f"{unchanged} inchangés ({self.stats['unchanged_body']} sans parsing), "
+                f"{self.stats['changed']} modifiés, {self.stats['removed']} supprimés, "
+                f"{self.stats['added']} ajoutés, {self.stats['failed']} échecs")
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'feed':
+        print(__doc__)
+        return
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    if not os.path.exists("product_changes.jsonl"):
+        print("Aucun changement enregistré")
+        return
+    with open("product_changes.jsonl", 'r', encoding='utf-8') as f:
+        changes = [json.loads(line) for line in f if line.strip()]
+    for change in changes[-limit:]:
+        if change['type'] == 'changed':
+            detail = f"{change.get('old_prix')} -> {change.get('new_prix')} ({', '.join(change.get('fields', []))})"
+        elif change['type'] == 'removed':
+            detail = f"{change.get('old_prix')}"
+        else:
+            detail = f"{change.get('new_prix')}"
+        print(f"{change['run']} {change['type']:<8} {change['nom_produit']}: {detail}")
+
+
+if __name__ == "__main__":
+    main()
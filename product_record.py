@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Représentation compacte des produits CasalSport gardés en mémoire pendant un crawl
+- ProductRecord: un objet à __slots__ par produit (pas de dictionnaire par instance), utilisable
+  comme un dictionnaire (product['prix'], product.get('url'), dict(product)...) par le code existant
+- subcategory / subsubcategory internées: une seule chaîne par catégorie pour tout le catalogue
+- les champs hors schéma (ajoutés par d'autres outils) sont conservés dans un dictionnaire annexe
+- to_json: hook default= de json.dump(s), la sérialisation reste celle d'un dictionnaire
+"""
+
+import sys
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, Mapping
+
+# Ordre des clés du snapshot historique (celui de extract_fields, l'URL en dernier)
+FIELDS = ('nom_produit', 'prix', 'imageurl', 'subcategory', 'subsubcategory', 'shortdesc', 'largedesc', 'url')
+INTERNED_FIELDS = frozenset({'subcategory', 'subsubcategory'})
+_FIELD_SET = frozenset(FIELDS)
+
+
+class ProductRecord(MutableMapping):
+    """
+    Produit à attributs fixes; un slot non renseigné équivaut à une clé absente
+    Environ 100 octets par produit hors chaînes, contre ~270 pour un dictionnaire à huit clés
+    """
+
+    __slots__ = FIELDS + ('_extra',)
+
+    def __init__(self, data: Mapping = (), **kwargs):
+        self._extra = None
+        self.update(data, **kwargs)
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'ProductRecord':
+        if isinstance(data, cls):
+            return data
+        record = cls.__new__(cls)
+        record._extra = None
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    def __getitem__(self, key: str):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key: str, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __setitem__(self, key: str, value) -> None:
+        if key in _FIELD_SET:
+            if key in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        if self._extra is None:
+            raise KeyError(key)
+        del self._extra[key]
+        if not self._extra:
+            self._extra = None
+
+    def __contains__(self, key) -> bool:
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for field in FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict:
+        data = {field: getattr(self, field) for field in FIELDS if hasattr(self, field)}
+        if self._extra is not None:
+            data.update(self._extra)
+        return data
+
+    def __getstate__(self) -> Dict:
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict) -> None:
+        self._extra = None
+        self.update(state)
+
+    def __repr__(self) -> str:
+        return f"ProductRecord({self.to_dict()!r})"
+
+
+def to_json(obj):
+    """json.dump(..., default=to_json): ProductRecord -> dictionnaire"""
+    if isinstance(obj, ProductRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def iter_records(products: Iterable[Mapping]) -> Iterator[ProductRecord]:
+    """Convertit un flux de produits (ProductStore.iter_products()...) au fil de l'eau"""
+    for product in products:
+        yield ProductRecord.from_dict(product)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Stockage des produits CasalSport en journal JSONL append-only
+Chaque nouveau produit est ajouté en une ligne par un thread d'écriture (fsync par lots);
+le document products_realtime.json n'est régénéré que lors d'une compaction à la demande
+
+Usage: python product_store.py compact
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from product_record import to_json
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+REMOVED_KEY = '_removed'  # Marqueur de suppression dans le journal (jamais écrit dans le snapshot)
+_PRODUCTS_ARRAY = re.compile(r'"products"\s*:\s*\[')
+_READ_CHUNK = 1 << 16
+
+
+class _SyncRequest:
+    """Marqueur placé dans la file: le writer fait un fsync puis signale l'évènement"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class ProductStore:
+    """
+    Journal JSONL des produits + snapshot JSON compacté
+    - append() est non bloquant: le produit est sérialisé et écrit par le thread d'écriture
+    - flush() attend que tout soit écrit et synchronisé sur disque
+    - compact() régénère le snapshot (format historique) et vide le journal
+    """
+
+    def __init__(self, journal_path: str = "products_realtime.jsonl",
+                 snapshot_path: str = "products_realtime.json",
+                 fsync_every: int = 50, fsync_interval: float = 2.0):
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._atexit_registered = False
+        self.appended = 0
+
+    # ------------------------------------------------------------------ lecture
+
+    def iter_snapshot(self) -> Iterator[Dict]:
+        """
+        Produits du snapshot compacté (products_realtime.json), lus au fil de l'eau:
+        le tableau "products" est décodé objet par objet, sans charger le document entier
+        """
+        if not os.path.exists(self.snapshot_path):
+            return
+        decoder = json.JSONDecoder()
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            buffer = f.read(_READ_CHUNK)
+            while True:
+                match = _PRODUCTS_ARRAY.search(buffer)
+                if match:
+                    break
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    return
+                buffer = buffer[-64:] + chunk  # la clé peut chevaucher deux blocs
+            position = match.end()
+            eof = False
+            while True:
+                # Séparateurs entre deux produits
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer) and buffer[position] == ']':
+                    return
+                if position >= len(buffer) - 1 and not eof:
+                    chunk = f.read(_READ_CHUNK)
+                    eof = not chunk
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                try:
+                    product, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        logger.warning(f"⚠️ Fin de {self.snapshot_path} illisible")
+                        return
+                    # Objet coupé en fin de bloc: on complète le tampon
+                    chunk = f.read(_READ_CHUNK)
+                    eof = not chunk
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                yield product
+
+    def iter_journal(self) -> Iterator[Dict]:
+        """Produits ajoutés au journal depuis la dernière compaction"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée après un arrêt brutal
+                    logger.warning(f"⚠️ Ligne {line_number} illisible ignorée dans {self.journal_path}")
+
+    def iter_products(self) -> Iterator[Dict]:
+        """
+        Snapshot puis journal, dédupliqués par URL (une compaction interrompue peut laisser des doublons)
+        Une entrée plus récente du journal remplace la précédente à sa place; une entrée _removed la supprime
+        Seul le journal est gardé en mémoire: le snapshot, unique par URL depuis compact(), est lu en flux
+        """
+        by_url: Dict[str, Optional[Dict]] = {}
+        journal_order: List = []
+        for product in self.iter_journal():
+            url = product.get('url')
+            if not url:
+                journal_order.append(product)
+                continue
+            if url not in by_url:
+                journal_order.append(url)
+            by_url[url] = None if product.get(REMOVED_KEY) else product
+
+        for product in self.iter_snapshot():
+            url = product.get('url')
+            if url and url in by_url:
+                # Version du journal, à la place du snapshot; elle n'est plus à émettre ensuite
+                product = by_url.pop(url)
+                if product is None:
+                    continue
+            yield product
+        for item in journal_order:
+            product = by_url.get(item) if isinstance(item, str) else item
+            if product is not None:
+                yield product
+
+    def load(self) -> List[Dict]:
+        return list(self.iter_products())
+
+    # ------------------------------------------------------------------ écriture
+
+    def start(self) -> None:
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name='product-store-writer', daemon=True)
+            self._writer.start()
+            # Le thread est daemon: les produits en file sont écrits à la sortie de l'interpréteur
+            # (un seul handler par store, même si le writer redémarre après compact() ou close())
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def append(self, product: Dict) -> None:
+        """Ajoute un produit au journal (hors du thread appelant); remplace un produit de même URL"""
+        self.start()
+        self._queue.put(product)
+        self.appended += 1
+
+    def remove(self, url: str) -> None:
+        """Marque un produit comme supprimé (appliqué au chargement et à la compaction)"""
+        self.append({'url': url, REMOVED_KEY: True})
+
+    def flush(self) -> None:
+        """Bloque jusqu'à ce que tous les produits en attente soient écrits et fsyncés"""
+        if self._writer is None or not self._writer.is_alive():
+            return
+        request = _SyncRequest()
+        self._queue.put(request)
+        request.done.wait()
+
+    def close(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._writer = None
+
+    def _write_loop(self) -> None:
+        pending = 0
+        last_sync = time.monotonic()
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.fsync_interval)
+                except queue.Empty:
+                    item = None
+
+                if item is None or item is _STOP or isinstance(item, _SyncRequest):
+                    if pending:
+                        self._sync(f)
+                        pending = 0
+                        last_sync = time.monotonic()
+                    if isinstance(item, _SyncRequest):
+                        item.done.set()
+                    if item is _STOP:
+                        return
+                    continue
+
+                f.write(json.dumps(item, ensure_ascii=False, default=to_json))
+                f.write('\n')
+                pending += 1
+
+                if pending >= self.fsync_every or time.monotonic() - last_sync >= self.fsync_interval:
+                    self._sync(f)
+                    pending = 0
+                    last_sync = time.monotonic()
+
+    @staticmethod
+    def _sync(f) -> None:
+        f.flush()
+        os.fsync(f.fileno())
+
+    # ------------------------------------------------------------------ compaction
+
+    def compact(self, products: Optional[List[Dict]] = None) -> int:
+        """
+        Régénère products_realtime.json (même format qu'avant) puis vide le journal
+        Sans liste fournie, relit snapshot + journal depuis le disque
+        """
+        self.flush()
+        if products is None:
+            products = self.load()
+
+        snapshot = {
+            'total_products_extracted': len(products),
+            'products': products
+        }
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2, ensure_ascii=False, default=to_json)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Le writer rouvrira le journal en mode append au prochain ajout
+        self.close()
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+
+        logger.info(f"🗜️ Compaction: {len(products)} produits écrits dans {self.snapshot_path}")
+        return len(products)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2 or sys.argv[1] != 'compact':
+        print("Usage: python product_store.py compact")
+        return
+    total = ProductStore().compact()
+    print(f"✓ products_realtime.json régénéré avec {total} produits")
+
+
+if __name__ == "__main__":
+    main()
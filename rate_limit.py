@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Limitation de débit adaptative et reprises pour les scrapers CasalSport
+- AdaptiveRateLimiter: débit ajusté en continu (AIMD). Tant que latence et taux d'erreur restent
+  sains, le débit augmente d'un pas fixe à chaque succès; sur 429/503 il est divisé par deux, et un
+  Retry-After suspend toutes les requêtes jusqu'à l'échéance demandée par le serveur
+- fetch_with_retry(): reprises des échecs transitoires (connexion, timeout, 429, 5xx) avec
+  backoff exponentiel à gigue complète, en respectant Retry-After
+"""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, TypeVar
+
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+THROTTLE_STATUS = frozenset({429, 503})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After en secondes (nombre de secondes ou date HTTP), None si absent ou illisible"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class AdaptiveRateLimiter:
+    """
+    Espacement adaptatif des requêtes, partagé entre threads
+    - succès sain (erreurs récentes <= max_error_rate, latence proche de la référence): débit + rate_step
+    - latence dégradée ou autre erreur serveur: débit x 0.75; 429/503: débit / 2 (+ Retry-After)
+    """
+
+    def __init__(self, initial_interval: float = 1.5, min_interval: float = 0.2, max_interval: float = 60.0,
+                 rate_step: float = 0.1, error_window: int = 20, max_error_rate: float = 0.1):
+        self.interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate_step = rate_step  # requêtes/s gagnées par succès
+        self.max_error_rate = max_error_rate
+        self._outcomes = deque(maxlen=error_window)  # True = erreur
+        self._latency_ewma: Optional[float] = None
+        self._latency_baseline: Optional[float] = None
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Bloque jusqu'au prochain créneau de requête (intervalle courant et Retry-After)"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            with metrics.stage('sleep'):
+                time.sleep(slot - now)
+
+    def _set_interval(self, interval: float) -> None:
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        metrics.gauge('request_interval_seconds', self.interval)
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            self._outcomes.append(False)
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            if self._latency_baseline is None or self._latency_ewma < self._latency_baseline:
+                self._latency_baseline = self._latency_ewma
+
+            if self._latency_ewma > 2 * self._latency_baseline + 0.1:
+                # Le serveur ralentit: on relâche avant qu'il ne rejette
+                self._set_interval(self.interval / 0.75)
+            elif self.error_rate <= self.max_error_rate:
+                self._set_interval(1.0 / (1.0 / self.interval + self.rate_step))
+
+    def on_error(self, status: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self._outcomes.append(True)
+            previous = self.interval
+            self._set_interval(self.interval * (2.0 if status in THROTTLE_STATUS else 1 / 0.75))
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        if status in THROTTLE_STATUS:
+            metrics.inc('throttled')
+            logger.warning(f"🐢 Serveur saturé ({status}): intervalle {previous:.2f}s -> {self.interval:.2f}s"
+                           + (f", pause de {retry_after:.0f}s (Retry-After)" if retry_after else ""))
+
+    def summary(self) -> str:
+        latency = f"{self._latency_ewma * 1000:.0f} ms" if self._latency_ewma is not None else "n/a"
+        return (f"intervalle {self.interval:.2f}s ({1 / self.interval:.2f} req/s), latence lissée {latency}, "
+                f"erreurs récentes {self.error_rate * 100:.0f}%")
+
+
+def fetch_with_retry(fetch: Callable[[], T], url: str, limiter: Optional[AdaptiveRateLimiter] = None,
+                     max_retries: int = 3, backoff_base: float = 1.0, backoff_cap: float = 60.0) -> T:
+    """
+    Exécute fetch() (qui lève les erreurs requests, raise_for_status compris) avec reprises
+    Les erreurs non transitoires (404...) et la dernière tentative sont relevées telles quelles
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        started = time.perf_counter()
+        try:
+            result = fetch()
+        except requests.exceptions.RequestException as e:
+            response = getattr(e, 'response', None)
+            status = response.status_code if response is not None else None
+            transient = status in RETRYABLE_STATUS or isinstance(
+                e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+
+            # Seules les erreurs du site (connexion, timeout, 429/5xx) ralentissent le limiteur: une URL
+            # invalide ou une boucle de redirections ne dit rien de sa charge
+            if limiter is not None and transient:
+                limiter.on_error(status, retry_after)
+            if not transient or attempt == max_retries:
+                raise
+
+            # Backoff exponentiel à gigue complète; Retry-After est un minimum
+            delay = random.uniform(0, min(backoff_cap, backoff_base * (2 ** attempt)))
+            if retry_after is not None and limiter is None:
+                delay = max(delay, retry_after)
+            metrics.inc('retries')
+            logger.warning(f"🔁 {url}: {status or type(e).__name__}, nouvelle tentative "
+                           f"{attempt + 1}/{max_retries} dans {delay:.1f}s")
+            with metrics.stage('retry_backoff'):
+                time.sleep(delay)
+            continue
+
+        if limiter is not None:
+            limiter.on_success(time.perf_counter() - started)
+        return result
+
+
+def apply_rate_options(scraper, adaptive: bool = False, min_interval: float = 0.2, max_retries: int = 3) -> None:
+    """
+    Options --adaptive-rate / --min-interval / --max-retries communes aux scrapers
+    Le limiteur part de scraper.delay et remplace les pauses fixes (pause(), espacement des pipelines)
+    """
+    scraper.max_retries = max_retries
+    if adaptive and scraper.delay > 0:
+        scraper.rate_limiter = AdaptiveRateLimiter(initial_interval=scraper.delay,
+                                                   min_interval=min(min_interval, scraper.delay))
+        logger.info(f"🎚️ Débit adaptatif: départ à {scraper.delay}s entre requêtes, plancher {min_interval}s, "
+                    f"{max_retries} reprises max")
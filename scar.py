@@ -8,182 +8,86 @@ import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import time
-import csv
 import json
 import re
-from collections import deque
 import logging
 from typing import List, Dict, Optional, Tuple
 import os
+import argparse
+
+from checkpoints import DeltaCheckpointer
+from catalog_export import CSV_FIELDS, export_products
+from crawl_frontier import CrawlFrontier
+from crawl_state import CrawlStateStore
+from dedup_index import NameIndex, NearDuplicateDetector
+from field_spec import Capture, FieldSpec, attr, text
+import metrics
+from html_parsing import PageDocument
+from http_cache import HttpCache
+from http_transport import configure_transport, shared_transport
+from page_corpus import apply_corpus_options
+from product_record import ProductRecord, iter_records, to_json
+from product_store import ProductStore
+from rate_limit import apply_rate_options, fetch_with_retry
+from url_classifier import NON_PRODUCT, UNCERTAIN, UrlClassifier
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class CasalSportProductScraper:
-    def __init__(self, base_url="https://www.casalsport.com/fr/cas/", delay=1.5):
-        self.base_url = base_url
-        self.base_domain = urlparse(base_url).netloc
-        self.delay = delay
-        self.visited_urls = set()
-        self.product_urls = set()
-        self.products_data = []
-        self.session = requests.Session()
-        
-        # URLs de catégories à ignorer
-        self.category_urls_to_ignore = set()
-        self.load_category_urls()
-        
-        # Charge les produits existants pour éviter les doublons
-        self.load_existing_products()
-        
-        # Headers pour éviter d'être bloqué
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'no-cache'
-        })
+# Image principale puis sélecteurs de repli, dans l'ordre de préférence
+IMAGE_SELECTORS = [
+    'img#productMainImage',
+    'img.product-image-main',
+    'img[alt*="product"]',
+    '.product-image img',
+    '.ProductGallery img',
+    'img[src*="product"]'
+]
 
-    def load_category_urls(self):
-        """Charge les URLs de catégories depuis le fichier JSON généré par le script JS"""
-        try:
-            if os.path.exists('category_urls.json'):
-                with open('category_urls.json', 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.category_urls_to_ignore = set(data.get('flat_urls', []))
-                    logger.info(f"✅ {len(self.category_urls_to_ignore)} URLs de catégories chargées et ignorées")
-            else:
-                logger.warning("⚠️ Fichier category_urls.json non trouvé - toutes les URLs seront crawlées")
-        except Exception as e:
-            logger.error(f"❌ Erreur lors du chargement des URLs de catégories: {e}")
-
-    def load_existing_products(self):
-        """Charge les produits existants depuis le fichier JSON pour éviter les doublons"""
-        try:
-            if os.path.exists('products_realtime.json'):
-                with open('products_realtime.json', 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    existing_products = data.get('products', [])
-                    
-                    # Ajoute les produits existants à la liste
-                    self.products_data = existing_products
-                    
-                    # Crée un set des URLs et noms existants pour vérification rapide
-                    self.existing_urls = {p.get('url', '') for p in existing_products if p.get('url')}
-                    self.existing_names = {p.get('nom_produit', '') for p in existing_products if p.get('nom_produit')}
-                    
-                    logger.info(f"✅ {len(existing_products)} produits existants chargés pour éviter les doublons")
-                    logger.info(f"   URLs existantes: {len(self.existing_urls)}")
-                    logger.info(f"   Noms existants: {len(self.existing_names)}")
-            else:
-                self.existing_urls = set()
-                self.existing_names = set()
-                logger.info("📝 Aucun fichier existant trouvé, démarrage avec une liste vide")
-        except Exception as e:
-            logger.error(f"❌ Erreur lors du chargement des produits existants: {e}")
-            self.existing_urls = set()
-            self.existing_names = set()
-
-    def is_category_url(self, url: str) -> bool:
-        """Vérifie si une URL est une URL de catégorie à ignorer"""
-        return url in self.category_urls_to_ignore
-
-    def is_brand_url(self, url: str) -> bool:
-        """Vérifie si une URL est une URL de marque à ignorer"""
-        return '/brand/' in url
-
-    def should_ignore_url(self, url: str) -> bool:
-        """Vérifie si une URL doit être ignorée (catégorie ou marque)"""
-        return self.is_category_url(url) or self.is_brand_url(url)
-
-    def is_product_page(self, html_content: str) -> bool:
-        """
-        Détermine si une page est une page produit unique via la meta pageGroup
-        Recherche: <meta name="pageGroup" content="Single">
-        """
-        try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Cherche la meta balise pageGroup avec content="Single"
-            pagegroup_meta = soup.find('meta', {'name': 'pageGroup', 'content': 'Single'})
-            
-            # DEBUG: Affiche toutes les meta balises pour comprendre la structure
-            if not pagegroup_meta:
-                all_meta = soup.find_all('meta')
-                meta_info = []
-                for meta in all_meta:
-                    name = meta.get('name', '')
-                    content = meta.get('content', '')
-                    if name and content:
-                        meta_info.append(f"{name}={content}")
-                
-                if meta_info:
-                    logger.info(f"Meta balises trouvées: {', '.join(meta_info[:10])}")  # Limite à 10 pour éviter le spam
-                else:
-                    logger.info("Aucune meta balise trouvée")
-            
-            return pagegroup_meta is not None
-            
-        except Exception as e:
-            logger.error(f"Erreur vérification page produit: {e}")
-            return False
-
-    def is_potential_product_url(self, url: str) -> bool:
-        """Vérifie si une URL pourrait être un produit (filtre rapide avant vérification complète)"""
-        try:
-            parsed = urlparse(url)
-            return (parsed.netloc == self.base_domain and 
-                    parsed.path.startswith('/fr/cas/') and
-                    parsed.scheme in ['http', 'https'])
-        except:
-            return False
+# Champs d'une page produit, extraits en un seul parcours de l'arbre (field_spec.py)
+PRODUCT_SPEC = FieldSpec([
+    Capture('breadcrumb', 'span.breadcrumb-text', value=text, many=True),
+    Capture('positions', 'meta[itemprop="position"]', value=attr('content', 0), many=True),
+    Capture('title', 'h1[class="t4 title"]', value=text),
+    Capture('price_block', 'div.ProductPagePaymentBlock-InsidePrice'),
+    Capture('price', 'div:not([class])', value=text, within='price_block'),
+    Capture('image', IMAGE_SELECTORS, value=attr('src')),
+    Capture('shortdesc', 'h3[id^="product_shortdescription_"]', value=text),
+    Capture('bullet_block', 'div[id^="productBulletText_"]'),
+    Capture('bullet_list', 'ul', within='bullet_block'),
+    Capture('bullets', 'li', value=text, many=True, within='bullet_list'),
+])
 
-    def is_valid_category_url(self, url: str) -> bool:
-        """Vérifie si l'URL est une page de catégorie valide à crawler"""
-        try:
-            parsed = urlparse(url)
-            return (parsed.netloc == self.base_domain and 
-                    parsed.path.startswith('/fr/cas/') and
-                    parsed.scheme in ['http', 'https'])
-        except:
-            return False
+class ProductPageExtractor:
+    """
+    Extraction des champs d'une page produit (breadcrumb, nom, prix, image, descriptions)
+    Sans état réseau: utilisable dans les processus de l'étage d'extraction (extraction_pool.py)
+    """
 
-    def get_page_content(self, url: str) -> Optional[str]:
-        """Récupère le contenu d'une page avec gestion d'erreurs robuste"""
-        try:
-            logger.info(f"Récupération de: {url}")
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur lors de la récupération de {url}: {e}")
-            return None
+    def __init__(self, base_url="https://www.casalsport.com/fr/cas/"):
+        self.base_url = base_url
 
     def extract_breadcrumb_info(self, soup: BeautifulSoup) -> Tuple[Optional[str], Optional[str], str]:
         """
         Extrait les informations du breadcrumb pour déterminer subcategory/subsubcategory
         Retourne: (subcategory, subsubcategory, product_name)
         """
+        # Trouve tous les éléments breadcrumb, et les positions pour confirmer la structure
+        breadcrumb_texts = [item.get_text(strip=True) for item in soup.find_all('span', class_='breadcrumb-text')]
+        positions = [meta.get('content', 0) for meta in soup.find_all('meta', {'itemprop': 'position'})]
+        return self.breadcrumb_levels(breadcrumb_texts, positions)
+
+    def breadcrumb_levels(self, breadcrumb_texts: List[str], positions: List) -> Tuple[Optional[str], Optional[str], str]:
+        """(subcategory, subsubcategory, product_name) à partir des textes et positions du breadcrumb"""
         try:
-            # Trouve tous les éléments breadcrumb
-            breadcrumb_items = soup.find_all('span', class_='breadcrumb-text')
-            
-            if not breadcrumb_items:
+            if not breadcrumb_texts:
                 logger.warning("Aucun breadcrumb trouvé")
                 return None, None, "Nom inconnu"
             
-            # Extrait les textes du breadcrumb
-            breadcrumb_texts = [item.get_text(strip=True) for item in breadcrumb_items]
-            
-            # Trouve aussi les positions pour confirmer la structure
-            position_metas = soup.find_all('meta', {'itemprop': 'position'})
             max_position = 0
-            if position_metas:
-                max_position = max([int(meta.get('content', 0)) for meta in position_metas])
+            if positions:
+                max_position = max([int(position) for position in positions])
             
             logger.info(f"Breadcrumb: {' > '.join(breadcrumb_texts)} (position max: {max_position})")
             
@@ -250,10 +154,7 @@ class CasalSportProductScraper:
             # Cherche une div sans classe dans cette div parent
             price_div = price_block.find('div', class_=False)
             if price_div:
-                price_text = price_div.get_text(strip=True)
-                # Nettoie le texte du prix
-                price_clean = re.sub(r'[^\d,€\s]', '', price_text).strip()
-                return price_clean if price_clean else "Prix non disponible"
+                return self.clean_price(price_div.get_text(strip=True))
             
             return "Prix non disponible"
             
@@ -261,6 +162,12 @@ class CasalSportProductScraper:
             logger.error(f"Erreur extraction prix: {e}")
             return "Prix non disponible"
 
+    @staticmethod
+    def clean_price(price_text: Optional[str]) -> str:
+        """Nettoie le texte du prix (chiffres, virgule, €)"""
+        price_clean = re.sub(r'[^\d,€\s]', '', price_text or '').strip()
+        return price_clean if price_clean else "Prix non disponible"
+
     def extract_image_url(self, soup: BeautifulSoup) -> str:
         """Extrait l'URL de l'image principale depuis <img id="productMainImage">"""
         try:
@@ -272,15 +179,7 @@ class CasalSportProductScraper:
                 return urljoin(self.base_url, img_url)
             
             # Fallback: autres sélecteurs possibles
-            selectors = [
-                'img.product-image-main',
-                'img[alt*="product"]',
-                '.product-image img',
-                '.ProductGallery img',
-                'img[src*="product"]'
-            ]
-            
-            for selector in selectors:
+            for selector in IMAGE_SELECTORS[1:]:
                 img = soup.select_one(selector)
                 if img and img.get('src'):
                     img_url = img['src']
@@ -327,57 +226,344 @@ class CasalSportProductScraper:
             if not li_elements:
                 return "Description longue non disponible"
             
-            # Joint toutes les descriptions avec des separateurs
-            descriptions = []
-            for li in li_elements:
-                desc_text = li.get_text(strip=True)
-                if desc_text:
-                    descriptions.append(desc_text)
-            
-            if descriptions:
-                return " | ".join(descriptions)  # Sépare avec |
-            else:
-                return "Description longue non disponible"
+            return self.join_bullets([li.get_text(strip=True) for li in li_elements])
                 
         except Exception as e:
             logger.error(f"Erreur extraction description longue: {e}")
             return "Description longue non disponible"
 
-    def extract_product_data(self, url: str) -> Optional[Dict]:
-        """Extrait toutes les données d'un produit"""
+    @staticmethod
+    def join_bullets(bullet_texts: List[str]) -> str:
+        """Joint les puces non vides avec des séparateurs |"""
+        descriptions = [desc_text for desc_text in bullet_texts if desc_text]
+        return " | ".join(descriptions) if descriptions else "Description longue non disponible"
+
+    def extract_fields(self, url: str, soup: BeautifulSoup) -> Dict:
+        """
+        Construit le dictionnaire produit à partir de l'arbre d'une page produit
+        Tous les champs viennent d'un seul parcours (PRODUCT_SPEC), mêmes résultats que les extract_*
+        """
+        fields = PRODUCT_SPEC.extract(soup)
+        subcategory, subsubcategory, breadcrumb_name = self.breadcrumb_levels(fields['breadcrumb'], fields['positions'])
+        
+        # Préfère le nom du H1 au breadcrumb
+        final_name = fields['title'] if fields['title'] is not None else breadcrumb_name
+        
+        if fields['price_block'] is None or fields['price'] is None:
+            price = "Prix non disponible"
+        else:
+            price = self.clean_price(fields['price'])
+        image_url = urljoin(self.base_url, fields['image']) if fields['image'] else "Image non disponible"
+        short_desc = fields['shortdesc'] or "Description courte non disponible"
+        if fields['bullet_list'] is None:
+            large_desc = "Description longue non disponible"
+        else:
+            large_desc = self.join_bullets(fields['bullets'])
+        
+        product_data = {
+            'nom_produit': final_name,
+            'prix': price,
+            'imageurl': image_url,
+            'subcategory': subcategory or "",
+            'subsubcategory': subsubcategory or "",
+            'shortdesc': short_desc,
+            'largedesc': large_desc,
+            'url': url  # Pour debug
+        }
+        return product_data
+
+
+class CasalSportProductScraper(ProductPageExtractor):
+    def __init__(self, base_url="https://www.casalsport.com/fr/cas/", delay=1.5, near_duplicates=False, http_cache=None,
+                 url_classifier=False, extract_workers=0, transport=None):
+        super().__init__(base_url)
+        self.base_domain = urlparse(base_url).netloc
+        self.delay = delay
+        self.near_duplicates = near_duplicates  # Détection optionnelle des variantes (taille, couleur...)
+        self.near_duplicate_threshold = 0.8
+        self.visited_urls = set()
+        self.product_urls = set()
+        self.extracted_urls = set()  # URLs déjà passées par l'extraction (succès ou doublon)
+        self.products_data = []
+        self.product_store = ProductStore()
+        self.crawl_state = CrawlStateStore()
+        self.checkpointer = DeltaCheckpointer()
+        self.checkpoint_every = 25  # pages de listing entre deux checkpoints de la frontière
+        self.transport = transport or shared_transport()  # session et pool de connexions communs (http_transport.py)
+        self.session = self.transport.session
+        self.http_cache = http_cache  # HttpCache optionnel (requêtes conditionnelles entre deux runs)
+        self.rate_limiter = None  # AdaptiveRateLimiter optionnel: remplace la pause fixe self.delay
+        self.max_retries = 3  # reprises des échecs transitoires (connexion, 429, 5xx)
+        self.extract_workers = extract_workers  # > 0: extraction dans un pool de processus (extraction_pool.py)
+        self.image_mirror = None  # ImageMirror optionnel: images des produits en arrière-plan (image_mirror.py)
+        
+        # URLs de catégories à ignorer
+        self.category_urls_to_ignore = set()
+        self.load_category_urls()
+        
+        # Charge les produits existants pour éviter les doublons
+        self.load_existing_products()
+        
+        # Classifieur d'URLs optionnel, entraîné sur les produits connus et category_urls.json
+        self.url_classifier = None
+        self._url_labels = {}  # URL -> décision du classifieur, comparée ensuite à la meta pageGroup
+        if url_classifier:
+            self.enable_url_classifier()
+
+    def load_category_urls(self):
+        """Charge les URLs de catégories depuis le fichier JSON généré par le script JS"""
+        try:
+            if os.path.exists('category_urls.json'):
+                with open('category_urls.json', 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    self.category_urls_to_ignore = set(data.get('flat_urls', []))
+                    logger.info(f"✅ {len(self.category_urls_to_ignore)} URLs de catégories chargées et ignorées")
+            else:
+                logger.warning("⚠️ Fichier category_urls.json non trouvé - toutes les URLs seront crawlées")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement des URLs de catégories: {e}")
+
+    def load_existing_products(self):
+        """
+        Charge les produits existants (snapshot JSON + journal JSONL) pour éviter les doublons
+        Lecture en flux: chaque produit est converti en ProductRecord compact dès sa lecture, et les
+        sets de doublons référencent les chaînes des enregistrements (pas de copie)
+        """
+        try:
+            self.products_data = []
+            self.existing_urls = set()
+            self.existing_names = set()
+            for record in iter_records(self.product_store.iter_products()):
+                self.products_data.append(record)
+                if record.get('url'):
+                    self.existing_urls.add(record['url'])
+                if record.get('nom_produit'):
+                    self.existing_names.add(record['nom_produit'])
+            self.build_name_indexes()
+            
+            if self.products_data:
+                logger.info(f"✅ {len(self.products_data)} produits existants chargés pour éviter les doublons")
+                logger.info(f"   URLs existantes: {len(self.existing_urls)}")
+                logger.info(f"   Noms existants: {len(self.existing_names)}")
+            else:
+                logger.info("📝 Aucun fichier existant trouvé, démarrage avec une liste vide")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement des produits existants: {e}")
+            self.existing_urls = set()
+            self.existing_names = set()
+            self.build_name_indexes()
+
+    def build_name_indexes(self):
+        """Construit l'index des noms normalisés (et le détecteur de quasi-doublons si activé)"""
+        self.name_index = NameIndex(self.existing_names)
+        self.near_duplicate_detector = None
+        if self.near_duplicates:
+            self.near_duplicate_detector = NearDuplicateDetector(threshold=self.near_duplicate_threshold)
+            for name in self.existing_names:
+                self.near_duplicate_detector.add(name)
+
+    def record_product(self, product_data: Dict) -> None:
+        """
+        Ajoute un nouveau produit: liste en mémoire, sets de doublons (mise à jour incrémentale)
+        et journal JSONL écrit en arrière-plan
+        """
+        metrics.inc('products_recorded')
+        product_data = ProductRecord.from_dict(product_data)
+        self.products_data.append(product_data)
+        if product_data.get('url'):
+            self.existing_urls.add(product_data['url'])
+        if product_data.get('nom_produit'):
+            self.existing_names.add(product_data['nom_produit'])
+            self.name_index.add(product_data['nom_produit'])
+            if self.near_duplicate_detector is not None:
+                self.near_duplicate_detector.add(product_data['nom_produit'])
+        self.product_store.append(product_data)
+        if self.image_mirror is not None:
+            self.image_mirror.submit(product_data)
+
+    @metrics.timed('compact_store')
+    def finalize_store(self) -> None:
+        """Vide le journal et régénère products_realtime.json (compaction)"""
+        self.product_store.compact(self.products_data)
+
+    def is_category_url(self, url: str) -> bool:
+        """Vérifie si une URL est une URL de catégorie à ignorer"""
+        return url in self.category_urls_to_ignore
+
+    def is_brand_url(self, url: str) -> bool:
+        """Vérifie si une URL est une URL de marque à ignorer"""
+        return '/brand/' in url
+
+    def should_ignore_url(self, url: str) -> bool:
+        """Vérifie si une URL doit être ignorée (catégorie ou marque)"""
+        return self.is_category_url(url) or self.is_brand_url(url)
+
+    @metrics.timed('classify')
+    def is_product_page(self, page) -> bool:
+        """
+        Détermine si une page est une page produit unique via la meta pageGroup
+        Recherche: <meta name="pageGroup" content="Single">
+        Accepte le HTML brut, un PageDocument (parsing limité au <head>, tout le document si la meta
+        n'y est pas) ou un arbre déjà parsé
+        """
+        try:
+            if isinstance(page, BeautifulSoup):
+                metas = [meta.attrs for meta in page.find_all('meta')]
+            else:
+                if not isinstance(page, PageDocument):
+                    page = PageDocument('', page)
+                metas = page.metas('pageGroup')
+            
+            # Cherche la meta balise pageGroup avec content="Single"
+            is_single = any(meta.get('name') == 'pageGroup' and meta.get('content') == 'Single' for meta in metas)
+            
+            # DEBUG: Affiche toutes les meta balises pour comprendre la structure
+            if not is_single:
+                meta_info = []
+                for meta in metas:
+                    name = meta.get('name', '')
+                    content = meta.get('content', '')
+                    if name and content:
+                        meta_info.append(f"{name}={content}")
+                
+                if meta_info:
+                    logger.info(f"Meta balises trouvées: {', '.join(meta_info[:10])}")  # Limite à 10 pour éviter le spam
+                else:
+                    logger.info("Aucune meta balise trouvée")
+            
+            return is_single
+            
+        except Exception as e:
+            logger.error(f"Erreur vérification page produit: {e}")
+            return False
+
+    def enable_url_classifier(self) -> None:
+        """Entraîne le classifieur d'URLs produit / non-produit sur le store et category_urls.json"""
+        self.url_classifier = UrlClassifier.from_files(self.product_store)
+        if self.url_classifier is None:
+            logger.warning("⚠️ Classifieur d'URLs désactivé: pas assez de produits ou de listings connus")
+            return
+        logger.info(f"🧠 Classifieur d'URLs entraîné ({len(self.existing_urls)} produits connus, "
+                    f"{len(self.category_urls_to_ignore)} listings)")
+
+    def can_skip_fetch(self, url: str, needs_links: bool) -> bool:
+        """
+        Décide à partir de la seule URL si la page peut ne pas être téléchargée:
+        - produit déjà connu: confirmé sans requête
+        - non-produit à haute confiance dont les liens ne seront pas suivis
+        Les URLs incertaines (ou sans classifieur) sont téléchargées et vérifiées via la meta pageGroup
+        """
+        classifier = self.url_classifier
+        if classifier is None:
+            return False
+        if url in self.existing_urls:
+            self.product_urls.add(url)
+            classifier.stats['known'] += 1
+            return True
+        
+        label, probability = classifier.classify(url)
+        self._url_labels[url] = label
+        if label == NON_PRODUCT and not needs_links:
+            classifier.stats['skipped'] += 1
+            logger.info(f"⏭️ Non-produit d'après l'URL (P(produit)={probability:.4f}): {url}")
+            return True
+        return False
+
+    def confirm_product_page(self, url: str, page) -> bool:
+        """Meta pageGroup, comparée à la décision du classifieur d'URLs pour mesurer son taux d'erreur"""
+        is_product = self.is_product_page(page)
+        self.audit_url_label(url, is_product)
+        return is_product
+
+    def audit_url_label(self, url: str, is_product: bool) -> None:
+        if self.url_classifier is None:
+            return
+        label = self._url_labels.pop(url, UNCERTAIN)
+        self.url_classifier.record_audit(label, is_product)
+        if label != UNCERTAIN and (label == NON_PRODUCT) == is_product:
+            logger.warning(f"⚠️ Classifieur d'URLs contredit par la meta pageGroup: {url}")
+
+    def pause(self) -> None:
+        """Pause de politesse entre deux requêtes (comptée dans l'étape 'sleep')"""
+        # Avec le débit adaptatif, l'espacement est fait par le limiteur avant chaque requête
+        if self.delay and self.rate_limiter is None:
+            with metrics.stage('sleep'):
+                time.sleep(self.delay)
+
+    def is_potential_product_url(self, url: str) -> bool:
+        """Vérifie si une URL pourrait être un produit (filtre rapide avant vérification complète)"""
+        try:
+            parsed = urlparse(url)
+            return (parsed.netloc == self.base_domain and 
+                    parsed.path.startswith('/fr/cas/') and
+                    parsed.scheme in ['http', 'https'])
+        except:
+            return False
+
+    def is_valid_category_url(self, url: str) -> bool:
+        """Vérifie si l'URL est une page de catégorie valide à crawler"""
+        try:
+            parsed = urlparse(url)
+            return (parsed.netloc == self.base_domain and 
+                    parsed.path.startswith('/fr/cas/') and
+                    parsed.scheme in ['http', 'https'])
+        except:
+            return False
+
+    def get_page_content(self, url: str) -> Optional[str]:
+        """Récupère le contenu d'une page avec gestion d'erreurs robuste et reprises (rate_limit.py)"""
+        def fetch() -> str:
+            with metrics.stage('fetch'):
+                if self.http_cache is not None:
+                    return self.http_cache.fetch_text(self.transport, url, timeout=15)
+                response = self.transport.get(url, timeout=15)
+                response.raise_for_status()
+                return response.text
+        
+        try:
+            logger.info(f"Récupération de: {url}")
+            html = fetch_with_retry(fetch, url, limiter=self.rate_limiter, max_retries=self.max_retries)
+            metrics.inc('pages_fetched')
+            metrics.inc('bytes_downloaded', len(html))
+            return html
+        except requests.exceptions.RequestException as e:
+            metrics.inc('fetch_errors')
+            logger.error(f"Erreur lors de la récupération de {url}: {e}")
+            return None
+
+    def get_page_document(self, url: str) -> Optional[PageDocument]:
+        """
+        Télécharge une page une seule fois
+        Le document retourné est partagé par la classification, l'extraction et la recherche de liens;
+        chaque parsing (meta, liens, arbre complet) n'est fait qu'une fois et seulement si nécessaire
+        """
         html_content = self.get_page_content(url)
         if not html_content:
             return None
+        return PageDocument(url, html_content)
+
+    def extract_product_data(self, url: str, page=None) -> Optional[Dict]:
+        """
+        Extrait toutes les données d'un produit
+        Si le document est déjà téléchargé (crawl), il est réutilisé sans nouvelle requête
+        """
+        if page is None:
+            page = self.get_page_document(url)
+            if page is None:
+                return None
         
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Extrait toutes les informations
-            subcategory, subsubcategory, breadcrumb_name = self.extract_breadcrumb_info(soup)
-            product_name = self.extract_product_name(soup)
-            price = self.extract_price(soup)
-            image_url = self.extract_image_url(soup)
-            short_desc = self.extract_short_description(soup)
-            large_desc = self.extract_large_description(soup)
-            
-            # Préfère le nom du H1 au breadcrumb
-            final_name = product_name if product_name != "Nom inconnu" else breadcrumb_name
-            
-            product_data = {
-                'nom_produit': final_name,
-                'prix': price,
-                'imageurl': image_url,
-                'subcategory': subcategory or "",
-                'subsubcategory': subsubcategory or "",
-                'shortdesc': short_desc,
-                'largedesc': large_desc,
-                'url': url  # Pour debug
-            }
-            
-            logger.info(f"Produit extrait: {final_name}")
+            soup = page.soup if isinstance(page, PageDocument) else page
+            
+            with metrics.stage('extract'):
+                product_data = self.extract_fields(url, soup)
+            
+            self.extracted_urls.add(url)
+            logger.info(f"Produit extrait: {product_data['nom_produit']}")
             return product_data
             
         except Exception as e:
+            metrics.inc('extraction_errors')
             logger.error(f"Erreur extraction produit {url}: {e}")
             return None
 
@@ -396,113 +582,295 @@ class CasalSportProductScraper:
             logger.info(f"🚫 Doublon détecté (nom): {name}")
             return True
         
-        # Vérifie les variations de nom (espaces, tirets, etc.)
-        normalized_name = name.lower().replace(' ', '').replace('-', '').replace('_', '')
-        for existing_name in self.existing_names:
-            normalized_existing = existing_name.lower().replace(' ', '').replace('-', '').replace('_', '')
-            if normalized_name == normalized_existing:
-                logger.info(f"🚫 Doublon détecté (nom normalisé): {name} = {existing_name}")
+        # Vérifie les variations de nom (espaces, tirets, etc.) via l'index normalisé
+        existing_name = self.name_index.find(name)
+        if existing_name is not None:
+            logger.info(f"🚫 Doublon détecté (nom normalisé): {name} = {existing_name}")
+            return True
+        
+        # Quasi-doublons (variantes de taille, couleur...) si la détection est activée
+        if self.near_duplicate_detector is not None:
+            match = self.near_duplicate_detector.query(name)
+            if match:
+                logger.info(f"🚫 Quasi-doublon détecté: {name} ≈ {match[0]} (similarité {match[1]:.2f})")
                 return True
         
         return False
 
-    def find_product_links(self, start_url: str, max_depth: int = 3) -> None:
-        """Trouve tous les liens de produits en crawlant le site et vérifiant la meta pageGroup"""
-        queue = deque([(start_url, 0)])
-        pages_crawled = 0
+    def handle_product_page(self, url: str, page: PageDocument) -> None:
+        """Enregistre une page produit confirmée et l'extrait immédiatement depuis le même document"""
+        self.product_urls.add(url)
+        logger.info(f"✓ Produit confirmé: {url}")
         
-        while queue:
-            current_url, depth = queue.popleft()
-            
-            if current_url in self.visited_urls or depth > max_depth:
-                continue
-                
-            self.visited_urls.add(current_url)
-            
-            # IGNORE les URLs de catégories (pas de log, pas de crawl)
-            if self.should_ignore_url(current_url):
-                logger.info(f"🚫 URL ignorée: {current_url}")
-                continue
+        # EXTRACTION IMMÉDIATE du produit trouvé (même document)
+        product_data = self.extract_product_data(url, page)
+        if product_data:
+            self.accept_product(url, product_data)
+
+    def accept_product(self, url: str, product_data: Dict) -> None:
+        """Vérifie les doublons puis enregistre un produit extrait (ici ou par l'étage d'extraction)"""
+        self.extracted_urls.add(url)
+        if self.is_duplicate_product(product_data):
+            metrics.inc('duplicates')
+            logger.info(f"🚫 Produit ignoré (doublon): {url}")
+            return
+        
+        # SAUVEGARDE IMMÉDIATE après chaque produit (ajout au journal, hors boucle de crawl)
+        self.record_product(product_data)
+        logger.info(f"✅ PRODUIT EXTRACTÉ: {product_data['nom_produit']}")
+        logger.info(f"   Prix: {product_data['prix']}")
+        logger.info(f"   Catégorie: {product_data['subcategory']}")
+        logger.info(f"💾 Journal mis à jour avec {len(self.products_data)} produits")
+        
+        # Affiche le produit en temps réel
+        print(f"\n🎯 PRODUIT {len(self.products_data)} EXTRACTÉ:")
+        print(f"   Nom: {product_data['nom_produit']}")
+        print(f"   Prix: {product_data['prix']}")
+        print(f"   Image: {product_data['imageurl']}")
+        print(f"   Catégorie: {product_data['subcategory']}")
+        print(f"   Sous-catégorie: {product_data['subsubcategory']}")
+        print(f"   Description courte: {product_data['shortdesc'][:100]}...")
+        print(f"   Description longue: {product_data['largedesc'][:100]}...")
+        print(f"   URL: {url}")
+        print("-" * 80)
+
+    @metrics.timed('links')
+    def extract_page_links(self, current_url: str, page: PageDocument) -> List[str]:
+        """Extrait les liens candidats (nettoyés, non ignorés, non visités) d'une page de catégorie"""
+        links = []
+        for href in page.hrefs():
+            absolute_url = urljoin(current_url, href)
+            clean_url = absolute_url.split('#')[0].split('?')[0]  # Supprime fragments et params
             
-            html_content = self.get_page_content(current_url)
-            if not html_content:
+            # IGNORE les URLs de catégories dans les liens trouvés
+            if self.should_ignore_url(clean_url):
                 continue
             
-            # Vérifie si la page actuelle est un produit via la meta pageGroup
-            if self.is_product_page(html_content):
-                self.product_urls.add(current_url)
-                logger.info(f"✓ Produit confirmé: {current_url}")
+            if self.is_potential_product_url(clean_url) and clean_url not in self.visited_urls:
+                links.append(clean_url)
+        return links
+
+    @metrics.timed('checkpoint_products')
+    def auto_save(self, pages_crawled: int) -> None:
+        """Sauvegarde automatique toutes les 50 pages (checkpoint delta: seuls les nouveaux produits sont écrits)"""
+        if pages_crawled % 50 == 0:
+            logger.info(f"💾 Sauvegarde automatique après {pages_crawled} pages...")
+            if self.product_urls:
+                self.checkpointer.save(self.products_data, pages_crawled)
+                logger.info(f"✓ Sauvegarde automatique effectuée - {len(self.products_data)} produits")
+
+    def start_crawl_frontier(self, start_url: str) -> Tuple[List[Tuple[str, int]], int]:
+        """
+        Frontière initiale du crawl: reprend le dernier checkpoint si le crawl précédent
+        depuis start_url n'est pas terminé, sinon repart de start_url
+        Retourne (frontière, pages déjà crawlées)
+        """
+        if self.crawl_state.has_resumable_crawl(start_url):
+            frontier, visited, product_urls, meta = self.crawl_state.load()
+            self.visited_urls |= visited
+            self.product_urls |= product_urls
+            pages_crawled = int(meta.get('pages_crawled', 0))
+            logger.info(f"♻️ Reprise du crawl ({meta.get('updated_at')}): {len(frontier)} URLs en attente, "
+                        f"{len(visited)} déjà visitées, {len(product_urls)} produits confirmés")
+            return frontier, pages_crawled
+        
+        self.crawl_state.reset()
+        return [(start_url, 0)], 0
+
+    @metrics.timed('checkpoint_crawl')
+    def checkpoint_crawl(self, start_url: str, frontier, pages_crawled: int, completed: bool = False) -> None:
+        """Checkpoint transactionnel de la frontière, des URLs visitées et des URLs produits"""
+        try:
+            # Les produits extraits avant ce checkpoint doivent être sur disque
+            self.product_store.flush()
+            self.crawl_state.checkpoint(start_url, frontier, self.visited_urls, self.product_urls,
+                                        pages_crawled, status='completed' if completed else 'running')
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du checkpoint du crawl: {e}")
+
+    def find_product_links(self, start_url: str, max_depth: int = 3) -> None:
+        """Trouve tous les liens de produits en crawlant le site et vérifiant la meta pageGroup"""
+        frontier, pages_crawled = self.start_crawl_frontier(start_url)
+        # File dédupliquée: chaque URL n'y figure qu'une fois, à sa profondeur minimale
+        queue = CrawlFrontier(prefix=self.base_url, entries=frontier)
+        in_progress = None  # Page retirée de la file mais pas encore traitée
+        completed = False
+        
+        try:
+            while queue:
+                current_url, depth = queue.pop()
                 
-                # EXTRACTION IMMÉDIATE du produit trouvé
-                product_data = self.extract_product_data(current_url)
-                if product_data:
-                    if not self.is_duplicate_product(product_data):
-                        self.products_data.append(product_data)
-                        logger.info(f"✅ PRODUIT EXTRACTÉ: {product_data['nom_produit']}")
-                        logger.info(f"   Prix: {product_data['prix']}")
-                        logger.info(f"   Catégorie: {product_data['subcategory']}")
-                        
-                        # SAUVEGARDE IMMÉDIATE après chaque produit
-                        self.save_debug_data("products_realtime.json")
-                        logger.info(f"💾 JSON mis à jour avec {len(self.products_data)} produits")
-                        
-                        # Affiche le produit en temps réel
-                        print(f"\n🎯 PRODUIT {len(self.products_data)} EXTRACTÉ:")
-                        print(f"   Nom: {product_data['nom_produit']}")
-                        print(f"   Prix: {product_data['prix']}")
-                        print(f"   Image: {product_data['imageurl']}")
-                        print(f"   Catégorie: {product_data['subcategory']}")
-                        print(f"   Sous-catégorie: {product_data['subsubcategory']}")
-                        print(f"   Description courte: {product_data['shortdesc'][:100]}...")
-                        print(f"   Description longue: {product_data['largedesc'][:100]}...")
-                        print(f"   URL: {current_url}")
-                        print("-" * 80)
-                    else:
-                        logger.info(f"🚫 Produit ignoré (doublon): {current_url}")
+                if current_url in self.visited_urls or depth > max_depth:
+                    continue
+                    
+                self.visited_urls.add(current_url)
                 
-                continue  # Si c'est un produit, pas besoin de chercher des liens dedans
+                # IGNORE les URLs de catégories (pas de log, pas de crawl)
+                if self.should_ignore_url(current_url):
+                    logger.info(f"🚫 URL ignorée: {current_url}")
+                    continue
                 
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Extrait tous les liens de cette page de catégorie
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                absolute_url = urljoin(current_url, href)
-                clean_url = absolute_url.split('#')[0].split('?')[0]  # Supprime fragments et params
+                # Produit déjà connu ou non-produit évident en bout de crawl: aucune requête
+                if self.can_skip_fetch(current_url, needs_links=depth < max_depth):
+                    continue
                 
-                # IGNORE les URLs de catégories dans les liens trouvés
-                if self.should_ignore_url(clean_url):
+                in_progress = (current_url, depth)
+                
+                # Un seul téléchargement et un seul parsing par page
+                page = self.get_page_document(current_url)
+                if page is None:
+                    in_progress = None
                     continue
                 
-                if self.is_potential_product_url(clean_url) and clean_url not in self.visited_urls:
-                    queue.append((clean_url, depth + 1))
-            
-            pages_crawled += 1
-            time.sleep(self.delay)
-            logger.info(f"Page crawlée: {current_url} (depth: {depth})")
-            logger.info(f"Produits confirmés: {len(self.product_urls)}")
-            logger.info(f"Produits extraits: {len(self.products_data)}")
-            logger.info(f"Pages restantes à vérifier: {len(queue)}")
-            
-            # Sauvegarde automatique toutes les 50 pages
-            if pages_crawled % 50 == 0:
-                logger.info(f"💾 Sauvegarde automatique après {pages_crawled} pages...")
-                if self.product_urls:
-                    self.save_debug_data(f"auto_save_{pages_crawled}.json")
-                    logger.info(f"✓ Sauvegarde automatique effectuée - {len(self.products_data)} produits")
+                # Vérifie si la page actuelle est un produit via la meta pageGroup
+                if self.confirm_product_page(current_url, page):
+                    self.handle_product_page(current_url, page)
+                    in_progress = None
+                    continue  # Si c'est un produit, pas besoin de chercher des liens dedans
+                
+                # Extrait tous les liens de cette page de catégorie
+                for clean_url in self.extract_page_links(current_url, page):
+                    queue.push(clean_url, depth + 1)
+                in_progress = None
+                
+                pages_crawled += 1
+                self.pause()
+                logger.info(f"Page crawlée: {current_url} (depth: {depth})")
+                logger.info(f"Produits confirmés: {len(self.product_urls)}")
+                logger.info(f"Produits extraits: {len(self.products_data)}")
+                logger.info(f"Pages restantes à vérifier: {len(queue)}")
+                
+                self.auto_save(pages_crawled)
+                if pages_crawled % self.checkpoint_every == 0:
+                    self.checkpoint_crawl(start_url, queue, pages_crawled)
+            
+            completed = True
+            logger.info(f"🧮 Frontière: {queue.pushed} liens vus, {queue.deduplicated} doublons écartés à l'insertion")
+        finally:
+            # Sur interruption, la page en cours est remise en tête de frontière
+            pending = ([in_progress] if in_progress else []) + list(queue)
+            self.checkpoint_crawl(start_url, pending, pages_crawled, completed=completed)
+
+    def find_product_links_async(self, start_url: str, max_depth: int = 3, concurrency: int = 8,
+                                 per_host_rate: Optional[float] = None, per_host_concurrency: Optional[int] = None) -> None:
+        """
+        Variante asyncio de find_product_links: plusieurs requêtes en vol, budget de politesse par hôte
+        Par défaut le débit par hôte reste celui de self.delay (1 / delay requêtes par seconde),
+        ou celui du limiteur adaptatif s'il est actif
+        """
+        from async_crawler import AsyncCrawlEngine
+        
+        if per_host_rate is None:
+            per_host_rate = 1.0 / self.delay if self.delay > 0 and self.rate_limiter is None else 0.0
+        engine = AsyncCrawlEngine(self, concurrency=concurrency, per_host_rate=per_host_rate,
+                                  per_host_concurrency=per_host_concurrency or concurrency)
+        engine.run(start_url, max_depth=max_depth)
+
+    def find_product_links_distributed(self, start_url: str, max_depth: int = 3, workers: int = 4,
+                                       lease_seconds: float = 120.0) -> None:
+        """
+        Variante multi-processus de find_product_links: URLs réparties par hachage entre workers,
+        distribuées en baux par un coordinateur SQLite, puis journaux des workers fusionnés ici
+        Chaque worker garde le délai de politesse self.delay (le débit total est multiplié par workers)
+        """
+        from distributed_crawl import CrawlCoordinator, merge_shards, run_local_workers
+
+        coordinator = CrawlCoordinator(lease_seconds=lease_seconds)
+        coordinator.seed([start_url], shards=workers, max_depth=max_depth)
+        options = {'base_url': self.base_url, 'delay': self.delay, 'lease_seconds': lease_seconds,
+                   'url_classifier': self.url_classifier is not None, 'adaptive_rate': self.rate_limiter is not None,
+                   'max_retries': self.max_retries, 'pool_size': self.transport.pool_maxsize,
+                   'http2': self.transport.http2}
+        try:
+            run_local_workers(workers, options=options)
+        finally:
+            # Même interrompu, les produits déjà validés rejoignent le store principal
+            merge_shards(coordinator, self)
+            logger.info(f"🧭 Crawl réparti: {coordinator.summary()}")
+            coordinator.close()
+
+    def discover_products_seeded(self, use_sitemap: bool = True) -> None:
+        """Découverte ciblée: listings connus (category_urls.json) + sitemap, au lieu du BFS depuis l'accueil"""
+        from discovery import SeededDiscovery
+        
+        SeededDiscovery(self, use_sitemap=use_sitemap).run()
+
+    def extract_urls_staged(self, urls: List[str], check_product: bool = False) -> None:
+        """
+        Télécharge et extrait des URLs via l'étage multi-processus (threads réseau + processus d'extraction)
+        Avec check_product, seules les pages dont la meta pageGroup vaut Single sont retenues
+        """
+        from extraction_pool import ExtractionPipeline
+        
+        with ExtractionPipeline(self, workers=self.extract_workers) as pipeline:
+            for i, (url, is_product, product_data) in enumerate(pipeline.run(urls, check_product), 1):
+                if check_product:
+                    self.audit_url_label(url, is_product)
+                    if not is_product:
+                        continue
+                    self.product_urls.add(url)
+                if product_data:
+                    self.accept_product(url, product_data)
+                else:
+                    logger.warning(f"❌ Échec extraction: {url}")
+                if i % 50 == 0:
+                    logger.info(f"📊 Étage d'extraction: {i}/{len(urls)} - {pipeline.summary()}")
+        logger.info(f"⚙️ Étage d'extraction terminé: {pipeline.summary()}")
+
+    def refresh_known_products(self, discover_new: bool = False, use_sitemap: bool = True) -> Dict[str, int]:
+        """
+        Mode rafraîchissement: revisite les produits connus et écrit le flux de changements
+        (product_changes.jsonl); avec discover_new, une découverte ciblée cherche ensuite les nouveaux produits
+        """
+        from price_refresh import ProductRefresher
+        
+        discover = (lambda: self.discover_products_seeded(use_sitemap=use_sitemap)) if discover_new else None
+        refresher = ProductRefresher(self)
+        stats = refresher.run(discover=discover)
+        print(f"📰 Changements: {refresher.summary()}")
+        return stats
+
+    def enable_image_mirror(self, **options) -> None:
+        """
+        Étage images optionnel: chaque produit enregistré voit son image vérifiée ou téléchargée en
+        arrière-plan; les produits déjà connus sont soumis aussi (sans requête si déjà en miroir)
+        Le champ 'image' mis à jour est réécrit dans le journal (version courante du produit seulement)
+        """
+        from image_mirror import ImageMirror
+        
+        self.image_mirror = ImageMirror(transport=self.transport, on_result=self.product_store.append, **options)
+        for product in self.products_data:
+            self.image_mirror.submit(product)
+
+    def finish_images(self, cancel: bool = False) -> None:
+        """Attend la fin de l'étage images (avant sauvegarde et compaction); cancel: abandonne la file"""
+        mirror, self.image_mirror = self.image_mirror, None
+        if mirror is not None:
+            mirror.close(cancel=cancel)
+            print(f"🖼️ Images: {mirror.summary()}")
+
+    def pending_product_urls(self) -> List[str]:
+        """URLs produits confirmées mais jamais extraites (ni pendant le crawl, ni lors d'un run précédent)"""
+        return sorted(self.product_urls - self.extracted_urls - self.existing_urls)
 
     def scrape_all_products(self):
-        """Scrape tous les produits trouvés"""
-        total_products = len(self.product_urls)
-        logger.info(f"Début extraction de {total_products} produits")
+        """Scrape les produits trouvés qui n'ont pas encore été extraits"""
+        pending_urls = self.pending_product_urls()
+        total_products = len(pending_urls)
+        logger.info(f"Début extraction de {total_products} produits "
+                    f"({len(self.product_urls) - total_products} déjà extraits pendant le crawl)")
+        
+        if self.extract_workers:
+            self.extract_urls_staged(pending_urls)
+            return len(self.products_data)
         
-        for i, product_url in enumerate(self.product_urls, 1):
+        for i, product_url in enumerate(pending_urls, 1):
             logger.info(f"Extraction produit {i}/{total_products}: {product_url}")
             
             product_data = self.extract_product_data(product_url)
             if product_data:
                 if not self.is_duplicate_product(product_data):
-                    self.products_data.append(product_data)
+                    self.record_product(product_data)
                     logger.info(f"✓ Produit ajouté: {product_data['nom_produit']}")
                 else:
                     logger.info(f"🚫 Produit ignoré (doublon): {product_url}")
@@ -514,29 +882,35 @@ class CasalSportProductScraper:
                 success_rate = len(self.products_data) / i * 100
                 logger.info(f"📊 Progression: {i}/{total_products} ({success_rate:.1f}% succès)")
             
-            time.sleep(self.delay)
+            self.pause()
 
+    @metrics.timed('save_csv')
     def save_to_csv(self, filename: str = "casalsport_products.csv"):
         """Sauvegarde les données en CSV"""
         if not self.products_data:
             logger.warning("Aucune donnée de produit à sauvegarder")
             return
         
-        fieldnames = ['nom_produit', 'prix', 'imageurl', 'subcategory', 'subsubcategory', 'shortdesc', 'largedesc']
-        
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for product in self.products_data:
-                # Supprime l'URL de debug avant sauvegarde
-                row = {k: v for k, v in product.items() if k in fieldnames}
-                writer.writerow(row)
+        # Écriture en flux, sans copie des produits; l'URL de debug n'est pas exportée
+        export_products(self.products_data, filename, fmt='csv', fields=CSV_FIELDS)
         
         logger.info(f"Données sauvegardées dans {filename}")
         print(f"\n✓ CSV généré: {filename}")
         print(f"✓ {len(self.products_data)} produits extraits")
 
+    @metrics.timed('save_parquet')
+    def save_to_parquet(self, filename: str = "casalsport_products.parquet", fmt: str = 'parquet'):
+        """Export typé et colonnaire (prix en centimes, nulls, puces en liste), voir catalog_export.py"""
+        from catalog_export import export_catalog
+        
+        if not self.products_data:
+            logger.warning("Aucune donnée de produit à sauvegarder")
+            return
+        
+        rows = export_catalog(self.products_data, filename, fmt=fmt)
+        print(f"✓ Export typé généré: {filename} ({rows} produits)")
+
+    @metrics.timed('save_debug')
     def save_debug_data(self, filename: str = "debug_products.json"):
         """Sauvegarde les données complètes pour debug"""
         debug_data = {
@@ -545,15 +919,11 @@ class CasalSportProductScraper:
         }
         
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(debug_data, f, indent=2, ensure_ascii=False)
-        
-        # Met à jour les sets de vérification des doublons
-        self.existing_urls = {p.get('url', '') for p in self.products_data if p.get('url')}
-        self.existing_names = {p.get('nom_produit', '') for p in self.products_data if p.get('nom_produit')}
+            json.dump(debug_data, f, indent=2, ensure_ascii=False, default=to_json)
         
+        # Les sets de vérification des doublons sont tenus à jour par record_product
         logger.info(f"💾 JSON sauvegardé: {filename} avec {len(self.products_data)} produits")
         logger.info(f"📊 Produits extraits: {len(self.products_data)}")
-        logger.info(f"🔄 Sets de vérification mis à jour: {len(self.existing_urls)} URLs, {len(self.existing_names)} noms")
         
         # Affiche un aperçu des produits sauvegardés
         if self.products_data:
@@ -571,6 +941,8 @@ class CasalSportProductScraper:
         print(f"URLs de produits trouvées: {len(self.product_urls)}")
         print(f"Produits extraits avec succès: {len(self.products_data)}")
         print(f"Taux de succès: {len(self.products_data)/len(self.product_urls)*100:.1f}%" if self.product_urls else "N/A")
+        if self.url_classifier is not None:
+            print(f"Classifieur d'URLs: {self.url_classifier.summary()}")
         
         if self.products_data:
             categories = set()
@@ -593,16 +965,16 @@ class CasalSportProductScraper:
         for i, url in enumerate(self.product_urls, 1):
             logger.info(f"Extraction forcée {i}/{len(self.product_urls)}: {url}")
             
-            # Vérifie si c'est vraiment une page produit
-            html_content = self.get_page_content(url)
-            if not html_content:
+            # Un seul téléchargement: le document est passé directement à l'extraction
+            page = self.get_page_document(url)
+            if page is None:
                 continue
                 
             # Extrait les données même sans vérification meta
-            product_data = self.extract_product_data(url)
+            product_data = self.extract_product_data(url, page)
             if product_data:
                 if not self.is_duplicate_product(product_data):
-                    self.products_data.append(product_data)
+                    self.record_product(product_data)
                     logger.info(f"✅ Produit extrait: {product_data['nom_produit']}")
                     
                     # Sauvegarde après chaque produit
@@ -614,46 +986,149 @@ class CasalSportProductScraper:
             else:
                 logger.warning(f"❌ Échec extraction: {url}")
             
-            time.sleep(self.delay)
+            self.pause()
         
         logger.info(f"🎯 Extraction forcée terminée: {len(self.products_data)} produits extraits")
         return len(self.products_data)
 
 
-def main():
+def parse_args(argv=None):
+    """Options de ligne de commande"""
+    parser = argparse.ArgumentParser(description="Scraper avancé CasalSport")
+    parser.add_argument('--base-url', default="https://www.casalsport.com/fr/cas/",
+                        help="URL de départ (permet de viser un serveur de test local)")
+    parser.add_argument('--discovery', choices=['crawl', 'seeded'], default='crawl',
+                        help="crawl: BFS depuis l'accueil; seeded: listings connus + sitemap")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Revisite seulement les produits connus et écrit le flux de changements "
+                             "(avec --discovery seeded: cherche aussi les nouveaux produits)")
+    parser.add_argument('--no-sitemap', action='store_true',
+                        help="En mode seeded, n'utilise pas sitemap.xml")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Requêtes simultanées pendant la phase 1 (1 = crawl séquentiel historique)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processus de crawl coordonnés par baux (distributed_crawl.py; 1 = un seul processus)")
+    parser.add_argument('--host-rate', type=float, default=None,
+                        help="Requêtes/s maximum par hôte en mode concurrent (défaut: 1/delay)")
+    parser.add_argument('--pool-size', type=int, default=10,
+                        help="Connexions keep-alive gardées par hôte (transport HTTP partagé)")
+    parser.add_argument('--http2', action='store_true',
+                        help="HTTP/2 via httpx[http2] si installé (sinon HTTP/1.1 keep-alive)")
+    parser.add_argument('--adaptive-rate', action='store_true',
+                        help="Débit adaptatif: accélère tant que le site répond bien, ralentit sur 429/5xx et Retry-After")
+    parser.add_argument('--min-interval', type=float, default=0.2,
+                        help="Intervalle minimal entre deux requêtes en débit adaptatif (secondes)")
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help="Reprises d'une requête en échec transitoire (connexion, timeout, 429, 5xx)")
+    parser.add_argument('--near-duplicates', action='store_true',
+                        help="Ignore aussi les quasi-doublons (variantes de taille, couleur...) via MinHash/LSH")
+    parser.add_argument('--url-classifier', action='store_true',
+                        help="Classe les URLs évidentes (produit / non-produit) sans les télécharger")
+    parser.add_argument('--extract-workers', type=int, default=0,
+                        help="Processus d'extraction en parallèle du réseau (0 = extraction dans le thread du crawl)")
+    parser.add_argument('--metrics-file', metavar='FICHIER',
+                        help="Exporte périodiquement les métriques (latences par étape, compteurs)")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json')
+    parser.add_argument('--metrics-interval', type=float, default=30.0,
+                        help="Secondes entre deux exports des métriques")
+    parser.add_argument('--record-corpus', metavar='FICHIER',
+                        help="Archive les pages reçues (URL, en-têtes, corps) dans un corpus compressé")
+    parser.add_argument('--replay-corpus', metavar='FICHIER',
+                        help="Rejoue un corpus enregistré au lieu d'accéder au site")
+    parser.add_argument('--parquet', metavar='FICHIER', nargs='?', const="casalsport_products.parquet",
+                        help="Exporte aussi le catalogue typé (Parquet, ou Arrow si FICHIER finit par .arrow)")
+    parser.add_argument('--images', choices=['download', 'head'], default=None,
+                        help="Étage images: téléchargement dédupliqué par contenu (images/) ou simple vérification HEAD")
+    parser.add_argument('--image-workers', type=int, default=8,
+                        help="Requêtes d'images simultanées")
+    parser.add_argument('--image-interval', type=float, default=0.1,
+                        help="Secondes minimum entre deux requêtes d'image (budget propre aux images)")
+    parser.add_argument('--image-revalidate', action='store_true',
+                        help="Revalide aussi les images déjà en miroir (requête conditionnelle)")
+    parser.add_argument('--http-cache', action='store_true',
+                        help="Cache HTTP sur disque (http_cache/) avec revalidation ETag/Last-Modified")
+    parser.add_argument('--cache-ttl', type=float, default=0.0,
+                        help="Secondes pendant lesquelles une page en cache est servie sans requête")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Fonction principale"""
+    args = parse_args(argv)
     print("🚀 Démarrage du scraper avancé CasalSport...")
     print("📋 Extraction: nom_produit, prix, imageurl, subcategory, subsubcategory, shortdesc, largedesc")
     
     # Initialise le scraper
-    scraper = CasalSportProductScraper(delay=1.5)
+    configure_transport(pool_size=args.pool_size, http2=args.http2)
+    http_cache = HttpCache(ttl=args.cache_ttl) if args.http_cache else None
+    scraper = CasalSportProductScraper(base_url=args.base_url, delay=1.5, near_duplicates=args.near_duplicates,
+                                       http_cache=http_cache, url_classifier=args.url_classifier,
+                                       extract_workers=args.extract_workers)
+    apply_corpus_options(scraper, record=args.record_corpus, replay=args.replay_corpus)
+    apply_rate_options(scraper, adaptive=args.adaptive_rate, min_interval=args.min_interval,
+                       max_retries=args.max_retries)
+    if args.metrics_file:
+        metrics.start_dump(args.metrics_file, fmt=args.metrics_format, interval=args.metrics_interval)
+    if args.images:
+        scraper.enable_image_mirror(mode=args.images, workers=args.image_workers, interval=args.image_interval,
+                                    adaptive=args.adaptive_rate, max_retries=args.max_retries,
+                                    revalidate=args.image_revalidate)
     
     try:
-        # Phase 1: Trouve tous les liens produits
-        print("\n🔍 Phase 1: Recherche des produits...")
-        scraper.find_product_links(scraper.base_url, max_depth=3)
-        
-        if not scraper.product_urls:
-            print("❌ Aucun produit trouvé!")
-            print("🔍 Vérifiez que les balises meta sont correctes...")
-            return
+        if args.refresh:
+            # Rafraîchissement: seules les URLs du store sont revisitées, les changements vont au flux
+            print("\n🔄 Phase 1: Rafraîchissement des produits connus (prix, descriptions)...")
+            scraper.refresh_known_products(discover_new=args.discovery == 'seeded',
+                                           use_sitemap=not args.no_sitemap)
+        else:
+            # Phase 1: Trouve tous les liens produits
+            print("\n🔍 Phase 1: Recherche des produits...")
+            if args.discovery == 'seeded':
+                scraper.discover_products_seeded(use_sitemap=not args.no_sitemap)
+            elif args.workers > 1:
+                scraper.find_product_links_distributed(scraper.base_url, max_depth=3, workers=args.workers)
+            elif args.concurrency > 1:
+                scraper.find_product_links_async(scraper.base_url, max_depth=3, concurrency=args.concurrency,
+                                                 per_host_rate=args.host_rate)
+            else:
+                scraper.find_product_links(scraper.base_url, max_depth=3)
+            
+            if not scraper.product_urls:
+                print("❌ Aucun produit trouvé!")
+                print("🔍 Vérifiez que les balises meta sont correctes...")
+                return
+            
+            # Phase 2: Extrait uniquement les produits non extraits pendant le crawl
+            pending_urls = scraper.pending_product_urls()
+            if pending_urls:
+                print(f"\n📦 Phase 2: Extraction de {len(pending_urls)} produits restants...")
+                scraper.scrape_all_products()
+            else:
+                print("\n📦 Phase 2: Tous les produits ont déjà été extraits pendant le crawl")
         
-        # Phase 2: Extrait les données de chaque produit
-        print(f"\n📦 Phase 2: Extraction de {len(scraper.product_urls)} produits...")
-        scraper.scrape_all_products()
+        scraper.finish_images()
         
         # Phase 3: Sauvegarde
         print("\n💾 Phase 3: Sauvegarde des données...")
         scraper.save_to_csv()
         scraper.save_debug_data()
+        if args.parquet:
+            scraper.save_to_parquet(args.parquet, fmt='arrow' if args.parquet.endswith('.arrow') else 'parquet')
         
         # Résumé final
         scraper.print_summary()
+        print(f"⏱️ Temps par étape: {metrics.summary()}")
+        print(f"🔌 Transport: {scraper.transport.summary()}")
+        if scraper.rate_limiter is not None:
+            print(f"🎚️ Débit adaptatif: {scraper.rate_limiter.summary()}")
+        if http_cache is not None:
+            print(f"📦 Cache HTTP: {http_cache.summary()}")
         
         print("\n🎉 Scraping terminé avec succès!")
         print("📁 Fichiers générés:")
         print("  - casalsport_products.csv (données principales)")
         print("  - debug_products.json (données complètes + debug)")
+        print("  - products_realtime.json (catalogue compacté depuis products_realtime.jsonl)")
         
     except KeyboardInterrupt:
         print("\n⚠️ Scraping interrompu par l'utilisateur")
@@ -683,6 +1158,11 @@ def main():
             if scraper.products_data:
                 scraper.save_to_csv("error_products.csv")
             print("✓ Données sauvegardées dans les fichiers d'erreur")
+    
+    finally:
+        # Compaction du journal JSONL: régénère products_realtime.json une seule fois
+        scraper.finish_images(cancel=True)
+        scraper.finalize_store()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,14 @@
 """
 Scraper simple pour CasalSport - Extraction des images et textes des pages catégories
 Extrait: imageUrl depuis <div class="hero-block"> et categoryText depuis <div class="seo-container">
+
+- par défaut: les 13 catégories de category_scraping_urls.json; --tree: les 467 URLs de category_urls.json
+  (catégories, sous-catégories, sous-sous-catégories)
+- --concurrency N: N pages en vol, l'espacement des requêtes restant partagé (delay, --host-rate
+  ou --adaptive-rate); débit par défaut: une requête toutes les 2 s, 4 requêtes/s avec --tree
+- résultats indexés par URL dans un seul fichier JSONL (category_content.jsonl) complété à chaque page;
+  la relance d'un run interrompu saute les URLs déjà scrapées avec succès (--refresh pour tout
+  reprendre), un run terminé normalement est suivi d'un run complet
 """
 
 import requests
@@ -9,40 +17,147 @@ from bs4 import BeautifulSoup
 import json
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional
 import os
+import argparse
+
+import metrics
+from extraction_pool import RequestSpacing
+from html_parsing import html_to_markdown, make_soup
+from http_cache import HttpCache
+from http_transport import configure_transport, shared_transport
+from page_corpus import apply_corpus_options
+from rate_limit import apply_rate_options, fetch_with_retry
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Clés de category_urls.json recopiées dans les résultats (niveau et parents de la page)
+TREE_FIELDS = (('type', 'category_type'), ('parentCategory', 'parent_category'),
+               ('parentSubcategory', 'parent_subcategory'))
+
+# Débit par défaut de --tree (requêtes/s, partagé par les threads): 467 pages en deux minutes environ
+TREE_HOST_RATE = 4.0
+
+
+def load_category_tree(urls_file: str = "category_urls.json") -> List[Dict]:
+    """Toutes les pages de l'arbre (catégories puis sous-catégories puis sous-sous-catégories), sans doublon d'URL"""
+    if not os.path.exists(urls_file):
+        return []
+    with open(urls_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    entries = {}
+    for key in ('category_urls', 'subcategory_urls', 'subsubcategory_urls'):
+        for entry in data.get(key, []):
+            if entry.get('url'):
+                entries.setdefault(entry['url'], entry)
+    return list(entries.values())
+
+
+class CategoryResultStore:
+    """
+    Résultats indexés par URL dans un seul fichier JSONL, complété d'une ligne par page scrapée
+    (la ligne la plus récente l'emporte au chargement); compact() réécrit une ligne par URL
+    """
+
+    def __init__(self, path: str = "category_content.jsonl"):
+        self.path = path
+        self.results: Dict[str, Dict] = self.load()
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        results = {}
+        if not os.path.exists(self.path):
+            return results
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée après un arrêt brutal
+                    logger.warning(f"⚠️ Ligne {line_number} illisible ignorée dans {self.path}")
+                    continue
+                results[result['url']] = result
+        if results:
+            logger.info(f"📂 {len(results)} pages déjà scrapées chargées depuis {self.path}")
+        return results
+
+    def succeeded(self, url: str, since: str = '') -> bool:
+        """Page réussie (depuis since, date au format de scraped_at)"""
+        result = self.results.get(url, {})
+        return result.get('status') == 'success' and result.get('scraped_at', '') >= since
+
+    def put(self, result: Dict) -> None:
+        line = json.dumps(result, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.results[result['url']] = result
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def begin_run(self) -> Optional[str]:
+        """
+        Marque un run en cours; si le précédent a été interrompu, retourne sa date de début (reprise)
+        Une reprise elle-même interrompue garde la date du run d'origine
+        """
+        marker = self.path + '.running'
+        if os.path.exists(marker):
+            with open(marker, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        with open(marker, 'w', encoding='utf-8') as f:
+            f.write(time.strftime('%Y-%m-%d %H:%M:%S'))
+        return None
+
+    def end_run(self) -> None:
+        """Run mené à son terme: le suivant rescrape toutes les pages"""
+        if os.path.exists(self.path + '.running'):
+            os.remove(self.path + '.running')
+
+    def compact(self) -> None:
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for result in self.results.values():
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.path)
+
+
 class CasalSportCategoryScraper:
-    def __init__(self, delay=2.0):
+    def __init__(self, delay=2.0, http_cache=None, transport=None):
         self.delay = delay
-        self.session = requests.Session()
-        
-        # Headers pour éviter d'être bloqué
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'no-cache'
-        })
+        self.transport = transport or shared_transport()  # session et pool de connexions communs (http_transport.py)
+        self.session = self.transport.session
+        self.http_cache = http_cache  # HttpCache optionnel (requêtes conditionnelles entre deux runs)
+        self.rate_limiter = None  # AdaptiveRateLimiter optionnel: remplace la pause fixe self.delay
+        self.max_retries = 3  # reprises des échecs transitoires (connexion, 429, 5xx)
 
     def get_page_content(self, url: str) -> Optional[str]:
-        """Récupère le contenu d'une page avec gestion d'erreurs"""
+        """Récupère le contenu d'une page avec gestion d'erreurs et reprises (rate_limit.py)"""
+        def fetch() -> str:
+            with metrics.stage('fetch'):
+                if self.http_cache is not None:
+                    return self.http_cache.fetch_text(self.transport, url, timeout=15)
+                response = self.transport.get(url, timeout=15)
+                response.raise_for_status()
+                return response.text
+        
         try:
             logger.info(f"Récupération de: {url}")
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            return response.text
+            html = fetch_with_retry(fetch, url, limiter=self.rate_limiter, max_retries=self.max_retries)
+            metrics.inc('pages_fetched')
+            metrics.inc('bytes_downloaded', len(html))
+            return html
         except requests.exceptions.RequestException as e:
+            metrics.inc('fetch_errors')
             logger.error(f"Erreur lors de la récupération de {url}: {e}")
             return None
 
+    @metrics.timed('extract_hero')
     def extract_hero_image(self, soup: BeautifulSoup) -> Optional[str]:
         """Extrait l'image du hero depuis <div class="hero-block">"""
         try:
@@ -75,8 +190,13 @@ class CasalSportCategoryScraper:
             logger.error(f"Erreur lors de l'extraction de l'image hero: {e}")
             return None
 
+    @metrics.timed('extract_seo')
     def extract_seo_text(self, soup: BeautifulSoup) -> Optional[str]:
-        """Extrait tout le texte depuis <div class="seo-container">"""
+        """
+        Extrait le texte de <div class="seo-container"> en markdown (html_parsing.html_to_markdown):
+        un seul parcours, chaque bloc une fois (les div/span imbriqués ne répètent plus le texte
+        de leurs descendants), espaces entre éléments en ligne conservés
+        """
         try:
             # Cherche la div seo-container
             seo_container = soup.find('div', class_='seo-container')
@@ -84,28 +204,11 @@ class CasalSportCategoryScraper:
                 logger.warning("Aucune div seo-container trouvée")
                 return None
             
-            # Extrait tous les éléments textuels
-            text_elements = []
-            
-            # Parcourt tous les éléments enfants
-            for element in seo_container.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div', 'span', 'li']):
-                text = element.get_text(strip=True)
-                if text and len(text) > 10:  # Filtre les textes trop courts
-                    # Détermine le type d'élément
-                    tag_name = element.name
-                    if tag_name.startswith('h'):
-                        text_elements.append(f"## {text}")
-                    elif tag_name == 'p':
-                        text_elements.append(text)
-                    elif tag_name == 'li':
-                        text_elements.append(f"• {text}")
-                    else:
-                        text_elements.append(text)
-            
-            if text_elements:
-                # Joint tous les textes avec des sauts de ligne
-                full_text = '\n\n'.join(text_elements)
-                logger.info(f"Texte SEO extrait: {len(text_elements)} éléments, {len(full_text)} caractères")
+            # Les blocs trop courts (10 caractères ou moins) sont filtrés
+            full_text = html_to_markdown(seo_container, min_length=10)
+            if full_text:
+                blocks = full_text.count('\n\n') + 1
+                logger.info(f"Texte SEO extrait: {blocks} blocs, {len(full_text)} caractères")
                 return full_text
             else:
                 logger.warning("Aucun texte trouvé dans seo-container")
@@ -127,7 +230,8 @@ class CasalSportCategoryScraper:
             }
         
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            with metrics.stage('parse_full'):
+                soup = make_soup(html_content)
             
             # Extrait l'image hero
             hero_image = self.extract_hero_image(soup)
@@ -144,6 +248,7 @@ class CasalSportCategoryScraper:
                 'scraped_at': time.strftime('%Y-%m-%d %H:%M:%S')
             }
             
+            metrics.inc('categories_scraped')
             logger.info(f"✅ Page scrapée avec succès: {category_name}")
             if hero_image:
                 logger.info(f"   Image: {hero_image}")
@@ -153,6 +258,7 @@ class CasalSportCategoryScraper:
             return result
             
         except Exception as e:
+            metrics.inc('category_errors')
             logger.error(f"Erreur lors du scraping de {url}: {e}")
             return {
                 'url': url,
@@ -161,56 +267,86 @@ class CasalSportCategoryScraper:
                 'error': str(e)
             }
 
-    def scrape_all_categories(self, input_file: str = "category_scraping_urls.json"):
-        """Scrape toutes les catégories depuis le fichier JSON"""
-        try:
-            # Vérifie si le fichier d'entrée existe
-            if not os.path.exists(input_file):
-                logger.error(f"❌ Fichier {input_file} non trouvé!")
-                logger.info("💡 Lancez d'abord le script JavaScript: node generate_category_urls_simple.js")
-                return
-            
-            # Lit le fichier d'entrée
-            with open(input_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            scraping_urls = data.get('scraping_urls', [])
-            total_categories = len(scraping_urls)
-            
-            logger.info(f"🚀 Début du scraping de {total_categories} catégories...")
-            
-            results = []
-            
-            for i, category_data in enumerate(scraping_urls, 1):
-                logger.info(f"\n📊 Progression: {i}/{total_categories}")
-                logger.info(f"🎯 Scraping: {category_data['name']}")
-                
-                # Scrape la page
-                result = self.scrape_category_page(category_data['url'], category_data['name'])
-                results.append(result)
-                
-                # Sauvegarde progressive
-                if i % 5 == 0:
-                    self.save_results(results, f"scraping_progress_{i}.json")
-                    logger.info(f"💾 Sauvegarde progressive effectuée ({i}/{total_categories})")
-                
-                # Pause entre les requêtes
-                if i < total_categories:
-                    logger.info(f"⏳ Pause de {self.delay}s...")
-                    time.sleep(self.delay)
-            
-            # Sauvegarde finale
-            self.save_results(results, "category_scraping_results.json")
-            
-            # Résumé
-            self.print_summary(results)
+    def scrape_all_categories(self, input_file: str = "category_scraping_urls.json", concurrency: int = 1,
+                              refresh: bool = False, store: Optional['CategoryResultStore'] = None,
+                              output_file: str = "category_scraping_results.json") -> List[Dict]:
+        """Scrape les catégories listées dans category_scraping_urls.json (13 catégories de premier niveau)"""
+        # Vérifie si le fichier d'entrée existe
+        if not os.path.exists(input_file):
+            logger.error(f"❌ Fichier {input_file} non trouvé!")
+            logger.info("💡 Lancez d'abord le script JavaScript: node generate_category_urls_simple.js")
+            return []
+        with open(input_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f).get('scraping_urls', [])
+        return self.scrape_entries(entries, concurrency=concurrency, refresh=refresh, store=store,
+                                   output_file=output_file)
+
+    def scrape_category_tree(self, urls_file: str = "category_urls.json", concurrency: int = 8,
+                             refresh: bool = False, store: Optional['CategoryResultStore'] = None,
+                             output_file: str = "category_scraping_results.json") -> List[Dict]:
+        """Scrape tout l'arbre de category_urls.json: catégories, sous-catégories et sous-sous-catégories"""
+        entries = load_category_tree(urls_file)
+        if not entries:
+            logger.error(f"❌ Aucune URL de catégorie dans {urls_file}")
+            logger.info("💡 Lancez d'abord le script JavaScript qui génère category_urls.json")
+            return []
+        return self.scrape_entries(entries, concurrency=concurrency, refresh=refresh, store=store,
+                                   output_file=output_file)
+
+    def scrape_entries(self, entries: List[Dict], concurrency: int = 1, refresh: bool = False,
+                       store: Optional['CategoryResultStore'] = None,
+                       output_file: str = "category_scraping_results.json") -> List[Dict]:
+        """
+        Scrape les pages (dictionnaires url / name) avec concurrency requêtes en vol
+        Chaque résultat est ajouté au store dès qu'il est obtenu; à la reprise d'un run interrompu, les URLs
+        déjà réussies sont sautées (sauf refresh). L'espacement des requêtes (delay ou limiteur adaptatif)
+        est partagé par les threads
+        """
+        store = store if store is not None else CategoryResultStore()
+        interrupted_at = store.begin_run()
+        resume = interrupted_at is not None and not refresh
+        pending = [entry for entry in entries if not resume or not store.succeeded(entry['url'], interrupted_at)]
+        total = len(pending)
+        if resume:
+            logger.info(f"♻️ Reprise du run interrompu (commencé le {interrupted_at}): {len(entries) - total} pages "
+                        f"déjà scrapées avec succès sautées (--refresh pour tout reprendre)")
+        rate = 'débit adaptatif' if self.rate_limiter is not None else f"1 requête / {self.delay:g}s"
+        logger.info(f"🚀 Début du scraping de {total} catégories, {concurrency} en parallèle ({rate})...")
+        
+        if pending:
+            self.transport.ensure_pool_size(concurrency)
+            spacing = RequestSpacing(0.0 if self.rate_limiter is not None else self.delay)
+            done = 0
             
-            return results
+            def scrape(entry: Dict) -> Dict:
+                spacing.wait()
+                result = self.scrape_category_page(entry['url'], entry['name'])
+                for key, field in TREE_FIELDS:
+                    if entry.get(key):
+                        result[field] = entry[key]
+                store.put(result)
+                return result
             
-        except Exception as e:
-            logger.error(f"❌ Erreur lors du scraping: {e}")
-            return []
+            pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='category')
+            try:
+                for future in as_completed([pool.submit(scrape, entry) for entry in pending]):
+                    future.result()
+                    done += 1
+                    if done % 25 == 0 or done == total:
+                        logger.info(f"📊 Progression: {done}/{total}")
+            finally:
+                # Interruption: les pages pas encore commencées sont abandonnées (reprises au prochain run)
+                pool.shutdown(wait=True, cancel_futures=True)
+        store.end_run()
+        
+        # Sortie historique: toutes les pages demandées, y compris celles des runs précédents
+        results = [store.results[entry['url']] for entry in entries if entry['url'] in store.results]
+        self.save_results(results, output_file)
+        store.compact()
+        self.print_summary(results)
+        return results
 
+    @metrics.timed('save_results')
     def save_results(self, results: List[Dict], filename: str):
         """Sauvegarde les résultats en JSON"""
         output_data = {
@@ -255,23 +391,81 @@ class CasalSportCategoryScraper:
         print(f"{'='*60}")
 
 
-def main():
+def parse_args(argv=None):
+    """Options de ligne de commande"""
+    parser = argparse.ArgumentParser(description="Scraper de catégories CasalSport")
+    parser.add_argument('--tree', action='store_true',
+                        help="Scrape tout l'arbre de category_urls.json (467 pages) au lieu des 13 catégories")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Pages scrapées en parallèle (défaut: 8 avec --tree, 1 sinon)")
+    parser.add_argument('--host-rate', type=float, default=None,
+                        help=f"Requêtes/s maximum vers le site (défaut: {TREE_HOST_RATE:g} avec --tree, "
+                             f"1 toutes les 2 s sinon)")
+    parser.add_argument('--refresh', action='store_true',
+                        help="À la reprise d'un run interrompu, rescrape aussi les pages déjà réussies")
+    parser.add_argument('--results-store', default="category_content.jsonl",
+                        help="Fichier JSONL des résultats par URL (reprise après interruption)")
+    parser.add_argument('--metrics-file', metavar='FICHIER',
+                        help="Exporte périodiquement les métriques (latences par étape, compteurs)")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json')
+    parser.add_argument('--metrics-interval', type=float, default=30.0,
+                        help="Secondes entre deux exports des métriques")
+    parser.add_argument('--record-corpus', metavar='FICHIER',
+                        help="Archive les pages reçues (URL, en-têtes, corps) dans un corpus compressé")
+    parser.add_argument('--replay-corpus', metavar='FICHIER',
+                        help="Rejoue un corpus enregistré au lieu d'accéder au site")
+    parser.add_argument('--pool-size', type=int, default=10,
+                        help="Connexions keep-alive gardées par hôte (transport HTTP partagé)")
+    parser.add_argument('--http2', action='store_true',
+                        help="HTTP/2 via httpx[http2] si installé (sinon HTTP/1.1 keep-alive)")
+    parser.add_argument('--adaptive-rate', action='store_true',
+                        help="Débit adaptatif: accélère tant que le site répond bien, ralentit sur 429/5xx et Retry-After")
+    parser.add_argument('--min-interval', type=float, default=0.2,
+                        help="Intervalle minimal entre deux requêtes en débit adaptatif (secondes)")
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help="Reprises d'une requête en échec transitoire (connexion, timeout, 429, 5xx)")
+    parser.add_argument('--http-cache', action='store_true',
+                        help="Cache HTTP sur disque (http_cache/) avec revalidation ETag/Last-Modified")
+    parser.add_argument('--cache-ttl', type=float, default=0.0,
+                        help="Secondes pendant lesquelles une page en cache est servie sans requête")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Fonction principale"""
+    args = parse_args(argv)
     print("🚀 Démarrage du scraper de catégories CasalSport...")
     print("📋 Extraction: images hero et textes SEO des pages catégories")
     
     # Initialise le scraper
-    scraper = CasalSportCategoryScraper(delay=2.0)
+    configure_transport(pool_size=args.pool_size, http2=args.http2)
+    http_cache = HttpCache(ttl=args.cache_ttl) if args.http_cache else None
+    host_rate = args.host_rate or (TREE_HOST_RATE if args.tree else None)
+    scraper = CasalSportCategoryScraper(delay=1.0 / host_rate if host_rate else 2.0, http_cache=http_cache)
+    apply_corpus_options(scraper, record=args.record_corpus, replay=args.replay_corpus)
+    apply_rate_options(scraper, adaptive=args.adaptive_rate, min_interval=args.min_interval,
+                       max_retries=args.max_retries)
+    if args.metrics_file:
+        metrics.start_dump(args.metrics_file, fmt=args.metrics_format, interval=args.metrics_interval)
     
     try:
         # Lance le scraping
-        results = scraper.scrape_all_categories()
+        store = CategoryResultStore(args.results_store)
+        if args.tree:
+            results = scraper.scrape_category_tree(concurrency=args.concurrency or 8, refresh=args.refresh, store=store)
+        else:
+            results = scraper.scrape_all_categories(concurrency=args.concurrency or 1, refresh=args.refresh,
+                                                    store=store)
         
         if results:
             print("\n🎉 Scraping terminé avec succès!")
             print("📁 Fichiers générés:")
             print("  - category_scraping_results.json (résultats complets)")
-            print("  - scraping_progress_X.json (sauvegardes progressives)")
+            print(f"  - {args.results_store} (résultats par URL, complété page par page)")
+            print(f"⏱️ Temps par étape: {metrics.summary()}")
+            print(f"🔌 Transport: {scraper.transport.summary()}")
+            if scraper.rate_limiter is not None:
+                print(f"🎚️ Débit adaptatif: {scraper.rate_limiter.summary()}")
         else:
             print("\n❌ Aucun résultat obtenu")
             
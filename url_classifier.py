@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Classifieur d'URLs produit / non-produit pour CasalSport
+Produits et listings partagent l'espace plat /fr/cas/<slug>; le classifieur (Bayes naïf sur
+les mots du slug et quelques indices de forme) est entraîné sur les URLs produits du store et
+les URLs de listing de category_urls.json. Seules les décisions à haute confiance sont
+utilisées; les URLs incertaines retombent sur la vérification de la meta pageGroup.
+
+Usage: python url_classifier.py evaluate [--folds 5]
+"""
+
+import json
+import math
+import os
+import random
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+PRODUCT = 'product'
+NON_PRODUCT = 'non_product'
+UNCERTAIN = 'uncertain'
+
+_TOKEN_SPLIT = re.compile(r'[-_.]+')
+
+
+def url_features(url: str) -> List[str]:
+    """Mots du slug, bigrammes, terminaisons et indices de forme (chiffres, longueur, suffixe -ac123)"""
+    path = urlsplit(url).path.rstrip('/')
+    slug = path.rsplit('/', 1)[-1].lower()
+    tokens = [t for t in _TOKEN_SPLIT.split(slug) if t]
+
+    features = [f"w:{t}" for t in tokens]
+    features += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    features += [f"end:{t[-3:]}" for t in tokens if len(t) > 3]
+    features.append(f"len:{min(len(tokens), 10)}")
+    if tokens:
+        features.append(f"first:{tokens[0]}")
+        features.append(f"last:{tokens[-1]}")
+    if any(ch.isdigit() for ch in slug):
+        features.append("shape:digits")
+    if re.search(r'-ac\d+$', slug):
+        features.append("shape:ac_suffix")
+    if re.search(r'\d+(?:[.,]\d+)?(?:m|cm|mm|kg|g|l|ml)\b', slug):
+        features.append("shape:unit")
+    return features
+
+
+class UrlClassifier:
+    """Bayes naïf multinomial à deux classes avec lissage de Laplace"""
+
+    def __init__(self, product_threshold: float = 0.98, non_product_threshold: float = 0.02):
+        self.product_threshold = product_threshold
+        self.non_product_threshold = non_product_threshold
+        self._counts = {PRODUCT: Counter(), NON_PRODUCT: Counter()}
+        self._totals = {PRODUCT: 0, NON_PRODUCT: 0}
+        self._docs = {PRODUCT: 0, NON_PRODUCT: 0}
+        self._vocabulary = set()
+        self.stats = Counter()
+
+    # ------------------------------------------------------------------ entraînement
+
+    def fit(self, product_urls: Iterable[str], non_product_urls: Iterable[str]) -> 'UrlClassifier':
+        for label, urls in ((PRODUCT, product_urls), (NON_PRODUCT, non_product_urls)):
+            for url in urls:
+                features = url_features(url)
+                self._counts[label].update(features)
+                self._totals[label] += len(features)
+                self._docs[label] += 1
+                self._vocabulary.update(features)
+        return self
+
+    @classmethod
+    def from_files(cls, store=None, category_file: str = 'category_urls.json', **kwargs) -> Optional['UrlClassifier']:
+        """Entraîne sur les URLs du store produits (positifs) et de category_urls.json (négatifs)"""
+        if store is None:
+            from product_store import ProductStore
+            store = ProductStore()
+        product_urls = [p['url'] for p in store.iter_products() if p.get('url')]
+
+        listing_urls = []
+        if os.path.exists(category_file):
+            with open(category_file, 'r', encoding='utf-8') as f:
+                listing_urls = json.load(f).get('flat_urls', [])
+
+        if not product_urls or not listing_urls:
+            return None
+        return cls(**kwargs).fit(product_urls, listing_urls)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._docs[PRODUCT] > 0 and self._docs[NON_PRODUCT] > 0
+
+    # ------------------------------------------------------------------ prédiction
+
+    def product_probability(self, url: str) -> float:
+        """P(produit | URL)"""
+        vocabulary_size = len(self._vocabulary) + 1
+        total_docs = self._docs[PRODUCT] + self._docs[NON_PRODUCT]
+        log_odds = math.log(self._docs[PRODUCT] / total_docs) - math.log(self._docs[NON_PRODUCT] / total_docs)
+        for feature in url_features(url):
+            if feature not in self._vocabulary:
+                continue
+            p_product = (self._counts[PRODUCT][feature] + 1) / (self._totals[PRODUCT] + vocabulary_size)
+            p_other = (self._counts[NON_PRODUCT][feature] + 1) / (self._totals[NON_PRODUCT] + vocabulary_size)
+            log_odds += math.log(p_product) - math.log(p_other)
+        log_odds = max(-50.0, min(50.0, log_odds))
+        return 1.0 / (1.0 + math.exp(-log_odds))
+
+    def classify(self, url: str) -> Tuple[str, float]:
+        """(décision, probabilité produit): product / non_product si confiance suffisante, sinon uncertain"""
+        probability = self.product_probability(url)
+        if probability >= self.product_threshold:
+            label = PRODUCT
+        elif probability <= self.non_product_threshold:
+            label = NON_PRODUCT
+        else:
+            label = UNCERTAIN
+        self.stats[label] += 1
+        return label, probability
+
+    def record_audit(self, predicted: str, actual_is_product: bool) -> None:
+        """Compare une décision confiante à la meta pageGroup quand la page a quand même été lue"""
+        if predicted == UNCERTAIN:
+            return
+        self.stats['audited'] += 1
+        if (predicted == PRODUCT) != actual_is_product:
+            self.stats['audit_errors'] += 1
+
+    def summary(self) -> str:
+        audited = self.stats['audited']
+        error_rate = self.stats['audit_errors'] / audited * 100 if audited else 0.0
+        return (f"{self.stats[PRODUCT]} produits / {self.stats[NON_PRODUCT]} non-produits décidés par URL, "
+                f"{self.stats[UNCERTAIN]} incertains; {self.stats['known']} produits connus et "
+                f"{self.stats['skipped']} non-produits sans requête; erreurs constatées: "
+                f"{self.stats['audit_errors']}/{audited} ({error_rate:.2f}%)")
+
+
+def cross_validate(product_urls: List[str], non_product_urls: List[str], folds: int = 5,
+                   seed: int = 42, **kwargs) -> Dict[str, float]:
+    """Validation croisée: couverture des décisions confiantes et taux d'erreur parmi elles"""
+    labelled = [(url, True) for url in product_urls] + [(url, False) for url in non_product_urls]
+    random.Random(seed).shuffle(labelled)
+
+    confident = errors = uncertain = 0
+    missed_products = dropped_products = 0
+    for fold in range(folds):
+        test = labelled[fold::folds]
+        train = [item for i, item in enumerate(labelled) if i % folds != fold]
+        model = UrlClassifier(**kwargs).fit([u for u, p in train if p], [u for u, p in train if not p])
+        for url, is_product in test:
+            label, _ = model.classify(url)
+            if label == UNCERTAIN:
+                uncertain += 1
+                continue
+            confident += 1
+            if (label == PRODUCT) != is_product:
+                errors += 1
+                if is_product:
+                    dropped_products += 1
+                else:
+                    missed_products += 1
+
+    total = len(labelled)
+    return {
+        'total': total,
+        'coverage': confident / total if total else 0.0,
+        'uncertain': uncertain,
+        'error_rate': errors / confident if confident else 0.0,
+        'errors': errors,
+        'products_dropped': dropped_products,
+        'listings_taken_for_products': missed_products,
+    }
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'evaluate':
+        print(__doc__)
+        return
+    folds = int(sys.argv[sys.argv.index('--folds') + 1]) if '--folds' in sys.argv else 5
+
+    from product_store import ProductStore
+    product_urls = [p['url'] for p in ProductStore().iter_products() if p.get('url')]
+    with open('category_urls.json', 'r', encoding='utf-8') as f:
+        listing_urls = json.load(f).get('flat_urls', [])
+
+    result = cross_validate(product_urls, listing_urls, folds=folds)
+    print(f"📊 Validation croisée ({folds} plis) sur {result['total']} URLs "
+          f"({len(product_urls)} produits, {len(listing_urls)} listings)")
+    print(f"   Décisions à haute confiance: {result['coverage'] * 100:.1f}% des URLs "
+          f"({result['uncertain']} incertaines -> vérification meta)")
+    print(f"   Taux d'erreur parmi ces décisions: {result['error_rate'] * 100:.2f}% ({result['errors']} erreurs: "
+          f"{result['products_dropped']} produits écartés, {result['listings_taken_for_products']} listings pris pour des produits)")
+
+
+if __name__ == "__main__":
+    main()